@@ -0,0 +1,93 @@
+"""
+Async access to the synchronous sqlite3 / pandas / snapshot code.
+
+Endpoint bodies run on a bounded thread pool sized to the connection pool, so a
+slow query never blocks the event loop. Each call has a timeout; when it
+expires, or the request is cancelled, the running SQLite statement is interrupted
+through database.cancel_scope() and the worker is freed.
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+
+from database import POOL_SIZE, cancel_scope
+
+try:
+    import orjson
+except ImportError:  # optional; responses fall back to FastAPI's encoder
+    orjson = None
+
+DB_WORKERS = POOL_SIZE - 1   # one connection stays free for the "meta" lane
+DB_TIMEOUT = 15.0            # seconds per request before the query is interrupted
+
+# Lanes: endpoint bodies share the bounded "query" pool; single-row lookups on the
+# request path (the response cache's data version check) get their own thread so
+# they never queue behind slow searches.
+_executors = {
+    "query": ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="db"),
+    "meta": ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-meta"),
+}
+
+
+class QueryTimeout(Exception):
+    pass
+
+
+def json_response(content):
+    """Encode an endpoint result. Records are plain dicts/lists, so orjson can dump
+    them in one pass; anything it cannot handle goes through jsonable_encoder."""
+    if orjson is not None:
+        try:
+            return Response(orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY),
+                            media_type="application/json")
+        except TypeError:
+            pass
+    return JSONResponse(jsonable_encoder(content))
+
+
+async def run_db(func, *args, timeout=DB_TIMEOUT, lane="query", **kwargs):
+    """Run func(*args, **kwargs) on a DB lane; raises QueryTimeout after `timeout` seconds"""
+    event = threading.Event()
+
+    def work():
+        if event.is_set():
+            # Timed out or cancelled while still queued
+            raise QueryTimeout()
+        with cancel_scope(event):
+            return func(*args, **kwargs)
+
+    future = asyncio.get_running_loop().run_in_executor(_executors[lane], work)
+    try:
+        return await asyncio.wait_for(future, timeout)
+    except asyncio.TimeoutError:
+        event.set()
+        raise QueryTimeout(f"Query exceeded {timeout}s")
+    except asyncio.CancelledError:
+        event.set()
+        raise
+
+
+def offload(timeout=DB_TIMEOUT):
+    """Decorator turning a synchronous endpoint into an async one that runs on the DB pool.
+    The JSON response is rendered on the worker too, so FastAPI has nothing left to
+    encode on the event loop. A timeout becomes a 504 response."""
+    def decorator(func):
+        def render(*args, **kwargs):
+            result = func(*args, **kwargs)
+            if isinstance(result, Response):
+                return result
+            return json_response(result)
+
+        @functools.wraps(func)
+        async def endpoint(*args, **kwargs):
+            try:
+                return await run_db(render, *args, timeout=timeout, **kwargs)
+            except QueryTimeout:
+                raise HTTPException(status_code=504, detail="查询超时, 请缩小查询范围后重试")
+        return endpoint
+    return decorator
@@ -0,0 +1,121 @@
+"""
+Concurrency benchmark: latency of light endpoints while heavy keyword searches run.
+
+Starts the API under uvicorn on a local port and drives it with concurrent
+clients: some loop over short-keyword searches (the LIKE fallback, with the
+response cache bypassed for /positions), the rest poll light endpoints. Reports p50/p99 of
+the light requests and heavy throughput, first with endpoint bodies run inline
+on the event loop (how main.py used to behave) and then on the DB thread pool.
+
+Usage (from backend/):  python bench_concurrency.py [seconds] [heavy clients] [light clients]
+"""
+import asyncio
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+DURATION = 5.0
+HEAVY_CLIENTS = 4
+LIGHT_CLIENTS = 8
+HEAVY_KEYWORDS = ["管理", "财务", "法学", "文秘", "会计", "工程"]
+LIGHT_URLS = ["/stats/dates", "/filters", "/stats/summary", "/stats/momentum"]
+
+
+async def run_inline(func, *args, timeout=None, lane=None, **kwargs):
+    """Legacy behaviour: the synchronous body runs on the event loop thread"""
+    return func(*args, **kwargs)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def serve(mode, port):
+    """Server process: uvicorn with endpoint bodies inline or on the DB pool"""
+    import uvicorn
+    import async_db
+    import response_cache
+    import main
+    if mode == "inline":
+        async_db.run_db = run_inline
+        response_cache.run_db = run_inline
+    response_cache.UNCACHED_PATHS.add("/positions")
+    uvicorn.run(main.app, host="127.0.0.1", port=port, log_level="warning")
+
+
+def start_server(mode):
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, __file__, "--serve", mode, str(port)])
+    while True:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc, port
+        except httpx.TransportError:
+            if proc.poll() is not None:
+                raise RuntimeError("server exited during startup")
+            time.sleep(0.1)
+
+
+async def heavy_client(client, worker, deadline, done):
+    page = worker * 1000
+    while time.perf_counter() < deadline:
+        page += 1
+        keyword = HEAVY_KEYWORDS[page % len(HEAVY_KEYWORDS)]
+        await client.get("/positions", params={"keyword": keyword, "page": page % 40 + 1, "page_size": 200})
+        done.append(1)
+
+
+async def light_client(client, worker, deadline, latencies):
+    i = worker
+    while time.perf_counter() < deadline:
+        url = LIGHT_URLS[i % len(LIGHT_URLS)]
+        i += 1
+        start = time.perf_counter()
+        await client.get(url)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def load(port, duration, heavy, light):
+    latencies, done = [], []
+    limits = httpx.Limits(max_connections=heavy + light)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+        for url in LIGHT_URLS:  # warm the response cache and the snapshot
+            await client.get(url)
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(
+            *(heavy_client(client, w, deadline, done) for w in range(heavy)),
+            *(light_client(client, w, deadline, latencies) for w in range(light)),
+        )
+    return np.array(latencies), len(done)
+
+
+def main_bench():
+    args = sys.argv[1:]
+    duration = float(args[0]) if args else DURATION
+    heavy = int(args[1]) if len(args) > 1 else HEAVY_CLIENTS
+    light = int(args[2]) if len(args) > 2 else LIGHT_CLIENTS
+
+    print(f"{duration:.0f}s, {heavy} heavy + {light} light clients")
+    print(f"{'mode':>10}{'light n':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'heavy/s':>10}")
+    for mode in ("inline", "pool"):
+        proc, port = start_server(mode)
+        try:
+            lat, heavy_done = asyncio.run(load(port, duration, heavy, light))
+        finally:
+            proc.terminate()
+            proc.wait()
+        print(f"{mode:>10}{len(lat):>10}{np.percentile(lat, 50):>10.1f}{np.percentile(lat, 99):>10.1f}"
+              f"{lat.max():>10.1f}{heavy_done / duration:>10.1f}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["--serve"]:
+        serve(sys.argv[2], int(sys.argv[3]))
+    else:
+        main_bench()
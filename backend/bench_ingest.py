@@ -0,0 +1,136 @@
+"""
+Ingest benchmark: save_positions / save_applications time against row count.
+
+Compares the row-wise iterrows() ingest that save_* used to do with the
+current column-wise path, and shows the cost of re-ingesting an unchanged
+sheet and one where 10% of the rows changed. Runs on a throwaway database.
+
+Usage (from backend/):  python bench_ingest.py [rows ...]
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+import database
+
+SIZES = [1000, 5000, 20000, 50000]
+CITIES = ['武汉市', '宜昌市', '襄阳市', '荆州市', '省直']
+
+
+def synthetic_positions(n, seed=0):
+    rng = np.random.default_rng(seed)
+    codes = [f"1423{i:013d}" for i in range(n)]
+    return pd.DataFrame({
+        '职位代码': codes,
+        '职位名称': [f"综合管理岗{i % 7}" for i in range(n)],
+        '招录机关': [f"某某局{i % 300}" for i in range(n)],
+        '用人单位': [f"某某单位{i % 900}" for i in range(n)],
+        '招录人数': rng.integers(1, 5, n).astype(float),
+        '城市': rng.choice(CITIES, n),
+        '区县': '其他',
+        '学历': '本科及以上',
+        '学位': '学士及以上',
+        '研究生专业': '',
+        '本科专业': '0201经济学类,1202工商管理类',
+        '招录对象': '不限',
+        '备注': '',
+        '职位简介': '从事综合管理等工作。',
+    })
+
+
+def synthetic_daily(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '职位代码': [f"1423{i:013d}" for i in range(n)],
+        '报名人数': rng.integers(0, 300, n).astype(float),
+        '审核通过人数': rng.integers(0, 100, n).astype(float),
+    })
+
+
+def legacy_save_positions(df):
+    """The row-wise ingest save_positions used before vectorization"""
+    with database.db_connection() as conn:
+        df['code'] = df['职位代码'].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
+        data = []
+        for _, row in df.iterrows():
+            if row['code'].lower() == 'nan':
+                continue
+            data.append((
+                row['code'], row.get('职位名称', ''), row.get('招录机关', ''), row.get('用人单位', ''),
+                int(row.get('招录人数', 1)), row.get('城市', '未知'), row.get('区县', '其他'),
+                row.get('学历', ''), row.get('学位', ''), row.get('研究生专业', ''), row.get('本科专业', ''),
+                row.get('招录对象', ''), row.get('备注', ''), row.get('职位简介', '')
+            ))
+        conn.executemany("""
+        INSERT OR REPLACE INTO positions
+        (code, name, org, unit, quota, city, district, education, degree, major_pg, major_ug, target, notes, intro)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, data)
+        database.rebuild_positions_fts(conn)
+        conn.commit()
+
+
+def legacy_save_applications(df, report_date):
+    with database.db_connection() as conn:
+        df['code'] = df['职位代码'].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
+        data = []
+        for _, row in df.iterrows():
+            code = row['code']
+            if not code or code.lower() == 'nan' or code == '合计':
+                continue
+            data.append((code, report_date, int(row.get('报名人数', 0)), int(row.get('审核通过人数', 0))))
+        conn.executemany("""
+        INSERT OR REPLACE INTO applications (code, date, applicants, passed)
+        VALUES (?, ?, ?, ?)
+        """, data)
+        conn.commit()
+
+
+def fresh_db(tmp, name):
+    database.use_database(os.path.join(tmp, f"{name}.db"))
+    database.init_db()
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return (time.perf_counter() - start) * 1000
+
+
+def bench(n, tmp):
+    pos, daily = synthetic_positions(n), synthetic_daily(n)
+    changed = daily.copy()
+    idx = changed.sample(frac=0.1, random_state=1).index
+    changed.loc[idx, '报名人数'] += 1
+
+    fresh_db(tmp, f"legacy_{n}")
+    legacy_pos = timed(legacy_save_positions, pos.copy())
+    legacy_app = timed(legacy_save_applications, daily.copy(), '2026-01-13')
+
+    fresh_db(tmp, f"bulk_{n}")
+    bulk_pos = timed(database.save_positions, pos.copy())
+    bulk_app = timed(database.save_applications, daily.copy(), '2026-01-13')
+    same_pos = timed(database.save_positions, pos.copy())
+    same_app = timed(database.save_applications, daily.copy(), '2026-01-13')
+    delta_app = timed(database.save_applications, changed.copy(), '2026-01-13')
+    return [legacy_pos, bulk_pos, same_pos, legacy_app, bulk_app, same_app, delta_app]
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    header = ["rows", "pos legacy", "pos bulk", "pos same", "app legacy", "app bulk", "app same", "app 10%"]
+    print("times in ms")
+    print("".join(f"{h:>12}" for h in header))
+    original = database.DB_PATH
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in sizes:
+            print(f"{n:>12}" + "".join(f"{t:>12.1f}" for t in bench(n, tmp)))
+        database.use_database(original)  # release the throwaway files
+
+
+if __name__ == "__main__":
+    main()
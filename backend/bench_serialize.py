@@ -0,0 +1,90 @@
+"""
+Serialization microbenchmark: position listing to JSON bytes.
+
+Compares the path the endpoints used to take (read_sql_query -> rename ->
+fillna -> to_dict -> jsonable_encoder -> json.dumps) with the current one
+(SQL aliases straight into dicts -> orjson), and the snapshot's record
+builder, for several page sizes. Checks all three produce the same bytes.
+
+Usage (from backend/):  python bench_serialize.py [page sizes ...]
+"""
+import sys
+import time
+
+import pandas as pd
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from async_db import json_response
+from database import db_connection, fetch_records, record_select
+from snapshot import get_snapshot
+
+SIZES = [50, 200, 1000, 5000]
+REPEAT = 20
+
+LEGACY_RENAME = {
+    'code': '职位代码', 'name': '职位名称', 'org': '招录机关', 'unit': '用人单位',
+    'quota': '招录人数', 'city': '城市', 'education': '学历', 'degree': '学位',
+    'major_pg': '研究生专业', 'major_ug': '本科专业', 'target': '招录对象',
+    'notes': '备注', 'intro': '职位简介', 'applicants': '报名人数',
+    'passed': '审核通过人数', 'competition_ratio': '竞争比',
+}
+LEGACY_QUERY = """
+SELECT p.*,
+       COALESCE(a.applicants, 0) as applicants,
+       COALESCE(a.passed, 0) as passed,
+       ROUND(CAST(COALESCE(a.applicants, 0) AS FLOAT) / CASE WHEN p.quota = 0 THEN 1 ELSE p.quota END, 1) as competition_ratio
+FROM positions p
+LEFT JOIN applications a ON p.code = a.code AND a.date = ?
+ORDER BY COALESCE(a.applicants, 0) DESC, p.code ASC
+LIMIT ?
+"""
+RECORD_QUERY = f"""
+SELECT {record_select()}
+FROM positions p
+LEFT JOIN applications a ON p.code = a.code AND a.date = ?
+ORDER BY COALESCE(a.applicants, 0) DESC, p.code ASC
+LIMIT ?
+"""
+
+
+def legacy(conn, date, limit):
+    df = pd.read_sql_query(LEGACY_QUERY, conn, params=[date, limit])
+    result_df = df.rename(columns=LEGACY_RENAME)
+    return JSONResponse(jsonable_encoder({"data": result_df.fillna("").to_dict(orient='records')})).body
+
+
+def records(conn, date, limit):
+    return json_response({"data": fetch_records(conn, RECORD_QUERY, [date, limit])}).body
+
+
+def snapshot_records(snapshot, date, limit):
+    return json_response({"data": snapshot.positions(date=date, limit=limit)[0]}).body
+
+
+def timed(fn, *args):
+    fn(*args)
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        out = fn(*args)
+    return (time.perf_counter() - start) / REPEAT * 1000, out
+
+
+def main():
+    sizes = [int(a) for a in sys.argv[1:]] or SIZES
+    snapshot = get_snapshot()
+    date = snapshot.latest_date()
+    print(f"date {date}, times in ms (mean of {REPEAT})")
+    print(f"{'rows':>8}{'legacy':>10}{'records':>10}{'snapshot':>10}{'speedup':>10}")
+    with db_connection() as conn:
+        for n in sizes:
+            t_legacy, out_legacy = timed(legacy, conn, date, n)
+            t_records, out_records = timed(records, conn, date, n)
+            t_snap, out_snap = timed(snapshot_records, snapshot, date, n)
+            same = out_legacy == out_records == out_snap
+            print(f"{n:>8}{t_legacy:>10.2f}{t_records:>10.2f}{t_snap:>10.2f}{t_legacy / t_records:>9.1f}x"
+                  + ("" if same else "  OUTPUT DIFFERS"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Standardize benchmark: standardize_position_df / standardize_daily_df on a synthetic
+sheet shaped like pd.read_excel(..., dtype=str) output (all-string cells, fuzzy headers).
+
+Compares the previous per-column implementations with the current cached column plan
+and compact dtypes, checks that both produce the same values, and reports time and
+memory. Exits non-zero if the outputs differ.
+
+Usage (from backend/):  python bench_standardize.py [rows]
+"""
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import main
+
+ROWS = 50000
+REPEAT = 3
+ORGS = ['武汉市江岸区人民法院', '省教育厅', '宜昌市夷陵区财政局', '十堰市房县公安局', '潜江市税务局',
+        '市司法局', '恩施州利川市人民政府', '襄阳市樊城区乡镇机关', '黄冈市蕲春县统计局', '某某中心']
+EDUCATION = ['本科及以上', '研究生', '大专及以上', '本科']
+TARGETS = ['不限', '应届毕业生', '服务基层项目人员', '退役军人']
+
+
+def synthetic_position_sheet(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '职位代码 ': [f"1423{i:013d}" for i in range(n)],
+        '招录机关': rng.choice(ORGS, n),
+        '用人单位': [f"某某单位{i % 900}" for i in range(n)],
+        '职位名称': [f"综合管理岗{i % 7}" for i in range(n)],
+        '招录人数（人）': rng.integers(1, 5, n).astype(str),
+        '学历要求': rng.choice(EDUCATION, n),
+        '学位': '学士及以上',
+        '专业': '0201经济学类,1202工商管理类',
+        '招录对象': rng.choice(TARGETS, n),
+        '备注': '',
+        '职位简介': '从事综合管理等工作。',
+    })
+
+
+def synthetic_daily_sheet(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        '序号': np.arange(1, n + 1).astype(str),
+        '职位代码': [f"1423{i:013d}" for i in range(n)],
+        '报考人数': rng.integers(0, 300, n).astype(str),
+        '审核通过人数': rng.integers(0, 100, n).astype(str),
+    })
+
+
+def legacy_standardize_position_df(df: pd.DataFrame) -> pd.DataFrame:
+    """standardize_position_df before the cached column plan (per-column loops, float counts)"""
+    # 清理列名（去除空格、换行符）
+    df.columns = [str(c).strip() for c in df.columns]
+    
+    # 创建新的标准化DataFrame
+    std_df = pd.DataFrame()
+    
+    # 1. 尝试直接映射已知字段
+    for orig_col, std_col in main.POSITION_FIELD_MAP.items():
+        if orig_col in df.columns:
+            std_df[std_col] = df[orig_col]
+        # 模糊匹配
+        else:
+            for actual_col in df.columns:
+                if orig_col in actual_col and std_col not in std_df.columns:
+                    std_df[std_col] = df[actual_col]
+                    break
+    
+    # 2. 特殊处理：如果 std_df 还是缺某些关键列，从 df 中同名列补充
+    for col in ['职位代码', '招录机关', '用人单位', '职位名称', '招录人数', '学历', '学位', '城市', '区县']:
+        if col not in std_df.columns and col in df.columns:
+            std_df[col] = df[col]
+
+    # 3. 确保关键字段存在
+    if '职位代码' not in std_df.columns:
+        std_df['职位代码'] = range(1, len(df) + 1)
+    
+    if '招录人数' not in std_df.columns:
+        std_df['招录人数'] = 1
+    else:
+        std_df['招录人数'] = pd.to_numeric(std_df['招录人数'], errors='coerce').fillna(1)
+    
+    # 4. 提取或填充城市信息
+    missing = pd.Series([None] * len(std_df), index=std_df.index)
+    results = [main.normalize_city_and_district(o, c, d) for o, c, d in zip(
+        std_df.get('招录机关', pd.Series([''] * len(std_df), index=std_df.index)),
+        std_df.get('城市', missing),
+        std_df.get('区县', missing),
+    )]
+    std_df['城市'], std_df['区县'] = [r[0] for r in results], [r[1] for r in results]
+    
+    # 6. 处理专业字段合并
+    if '研究生专业' not in std_df.columns:
+        std_df['研究生专业'] = ""
+    if '本科专业' not in std_df.columns:
+        # 如果有名为“专业”的列，当作本科专业
+        if '专业' in df.columns:
+            std_df['本科专业'] = df['专业']
+        else:
+            std_df['本科专业'] = ""
+            
+    return std_df
+
+
+def legacy_standardize_daily_df(df: pd.DataFrame) -> pd.DataFrame:
+    """standardize_daily_df before the cached column plan"""
+    std_df = pd.DataFrame()
+    
+    # 检查是否需要跳过标题行（第一行是中文描述）
+    if df.columns[0].startswith('湖北省') or '统计表' in str(df.columns[0]):
+        # 使用第一行数据作为列名
+        df.columns = df.iloc[0]
+        df = df.iloc[1:].reset_index(drop=True)
+    
+    # 映射字段
+    for col in df.columns:
+        if '职位代码' in str(col):
+            std_df['职位代码'] = df[col]
+        elif '报考人数' in str(col) or '报名人数' in str(col):
+            std_df['报名人数'] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+        elif '审核' in str(col) and '人数' in str(col):
+            std_df['审核通过人数'] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    
+    if '审核通过人数' not in std_df.columns:
+        std_df['审核通过人数'] = 0
+    
+    return std_df
+
+
+def best_ms(fn, sheet):
+    best = float('inf')
+    for _ in range(REPEAT):
+        df = sheet.copy()
+        start = time.perf_counter()
+        out = fn(df)
+        best = min(best, (time.perf_counter() - start) * 1000)
+    return best, out
+
+
+def same_values(a, b):
+    if list(a.columns) != list(b.columns):
+        return False
+    return all(
+        (a[c].astype(object).where(a[c].notna(), None).tolist()
+         == b[c].astype(object).where(b[c].notna(), None).tolist())
+        or (pd.api.types.is_numeric_dtype(a[c]) and (a[c].astype('int64') == b[c].astype('int64')).all())
+        for c in a.columns
+    )
+
+
+def main_bench():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else ROWS
+    cases = [
+        ("positions", synthetic_position_sheet(rows), legacy_standardize_position_df, main.standardize_position_df),
+        ("daily", synthetic_daily_sheet(rows), legacy_standardize_daily_df, main.standardize_daily_df),
+    ]
+    failed = False
+    print(f"{rows} rows, best of {REPEAT}")
+    for name, sheet, legacy, current in cases:
+        legacy_ms, before = best_ms(legacy, sheet)
+        current_ms, after = best_ms(current, sheet)
+        ok = same_values(before, after)
+        failed |= not ok
+        before_mb = before.memory_usage(deep=True).sum() / 1e6
+        after_mb = after.memory_usage(deep=True).sum() / 1e6
+        print(f"{name:<10} legacy {legacy_ms:8.1f} ms {before_mb:7.1f} MB   "
+              f"current {current_ms:8.1f} ms {after_mb:7.1f} MB   same values: {ok}")
+    print(f"column plans cached: positions {main._resolve_position_columns.cache_info().hits} hits, "
+          f"daily {main._resolve_daily_columns.cache_info().hits} hits")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_bench()
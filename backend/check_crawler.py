@@ -0,0 +1,341 @@
+"""
+Crawler check: run crawler.run() and crawler.backfill() against a local stand-in for
+the official site and assert how many requests, downloads and exports each run causes.
+
+The fixture server serves a listing page, a detail page and an .xlsx attachment
+(copies of the sheets in data/daily) with ETag / Last-Modified validators, answers
+conditional requests with 304, serves byte ranges (Range / If-Range, 206) and can fail
+a path with 503 a given number of times or cut a response off after some bytes.
+With validators switched off the same sheet is fetched again, plainly and re-zipped, to
+check the ingest ledger short-circuits; after a write whose export failed, the next
+run must export even though the ledger already has the sheet. An interrupted download must resume with a
+single 206, and an HTML page at the attachment URL must be rejected. For the backfill, the listing gains two more pages (one reached through the TRS
+createPageHTML script, one through a 下一页 link) with two dates not yet in the DB; a
+first backfill whose batch ingest fails must leave no sheet in the daily dir.
+The database, static output, daily dir and crawler state all go to a temp directory.
+
+Usage (from backend/):  python check_crawler.py
+"""
+import hashlib
+import io
+import os
+import socket
+import sys
+import tempfile
+import threading
+import zipfile
+from collections import Counter
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import crawler
+import database
+import export_static
+
+DAILY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "daily")
+XLSX_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+
+def listing_page(extra="", script=""):
+    return f"""<html><body>{script}<ul>
+    <li><a href="./202601/t20260113_1.shtml">其他通知</a></li>
+    <li><a href="./202601/t20260113_2.html">湖北省2026年度考试录用公务员报名人数统计表（2026.1.13）</a></li>
+    {extra}
+    </ul></body></html>""".encode("utf-8")
+
+
+PAGE_1 = """<html><body><ul>
+    <li><a href="./202601/t20260114_1.html">湖北省2026年度考试录用公务员报名人数统计表（2026.1.14）</a></li>
+    </ul><a href="./index_2.shtml">下一页</a></body></html>""".encode("utf-8")
+
+PAGE_2 = """<html><body><ul>
+    <li><a href="./202601/P020260115_daily.xlsx">湖北省2026年度考试录用公务员报名人数统计表（2026.1.15）</a></li>
+    <li><a href="./202601/t20260113_2.html">湖北省2026年度考试录用公务员报名人数统计表（2026.1.13）</a></li>
+    </ul><a href="./index_1.shtml">上一页</a></body></html>""".encode("utf-8")
+
+DETAIL_PAGE = """<html><body><p>附件:
+<a href="./P020260113_daily.xlsx">报名人数统计表.xlsx</a></p></body></html>""".encode("utf-8")
+
+
+class FixtureSite:
+    """Local stand-in site: path -> (body, content type), with validators and 304s"""
+
+    def __init__(self, pages):
+        self.pages = dict(pages)
+        self.hits = Counter()        # (path, status) -> count
+        self.failures = Counter()    # path -> 503 responses still to send
+        self.cuts = {}               # path -> bytes sent before the next response is cut off
+        self.modified = formatdate(usegmt=True)
+        self.validators = True       # send ETag / Last-Modified and answer 304s
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def set(self, path, body, content_type="text/html; charset=utf-8"):
+        self.pages[path] = (body, content_type)
+
+    def handle(self, request):
+        path = request.path.split("?")[0]
+        if self.failures[path] > 0:
+            self.failures[path] -= 1
+            return self.reply(request, path, 503)
+        if path not in self.pages:
+            return self.reply(request, path, 404)
+        body, content_type = self.pages[path]
+        if not self.validators:
+            return self.reply(request, path, 200, body, {"Content-Type": content_type})
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        if request.headers.get("If-None-Match") == etag:
+            return self.reply(request, path, 304, headers={"ETag": etag})
+        headers = {"Content-Type": content_type, "ETag": etag, "Last-Modified": self.modified}
+        ranged = request.headers.get("Range", "")
+        if ranged.startswith("bytes=") and request.headers.get("If-Range", etag) == etag:
+            start = int(ranged[len("bytes="):].split("-")[0])
+            if start >= len(body):
+                return self.reply(request, path, 416, headers={"Content-Range": f"bytes */{len(body)}"})
+            headers["Content-Range"] = f"bytes {start}-{len(body) - 1}/{len(body)}"
+            return self.reply(request, path, 206, body[start:], headers)
+        self.reply(request, path, 200, body, headers)
+
+    def reply(self, request, path, status, body=b"", headers=None):
+        self.hits[(path, status)] += 1
+        request.send_response(status)
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        request.send_header("Content-Length", str(len(body)))
+        request.end_headers()
+        cut = self.cuts.pop(path, None)
+        if cut is not None:
+            request.wfile.write(body[:cut])
+            request.wfile.flush()
+            request.close_connection = True
+            request.connection.shutdown(socket.SHUT_RDWR)
+            return
+        request.wfile.write(body)
+
+    def count(self, status):
+        return sum(n for (_, s), n in self.hits.items() if s == status)
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def rezip(data):
+    """Same workbook, different bytes: rewrite the .xlsx zip without compression. Entries
+    keep their timestamps, so the output depends only on the input."""
+    out = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as src, zipfile.ZipFile(out, "w", zipfile.ZIP_STORED) as dst:
+        for item in src.infolist():
+            dst.writestr(item, src.read(item.filename), compress_type=zipfile.ZIP_STORED)
+    return out.getvalue()
+
+
+def fixture_pages(sheet):
+    return {
+        "/": (listing_page(), "text/html; charset=utf-8"),
+        "/202601/t20260113_2.html": (DETAIL_PAGE, "text/html; charset=utf-8"),
+        "/202601/P020260113_daily.xlsx": (sheet, XLSX_TYPE),
+    }
+
+
+def main():
+    with open(os.path.join(DAILY, "2026-01-13.xlsx"), "rb") as f:
+        sheet = f.read()
+    with open(os.path.join(DAILY, "2026-01-14.xlsx"), "rb") as f:
+        updated_sheet = f.read()
+    original_db = database.DB_PATH
+    exports = []
+    failing_exports = Counter()   # "next" -> export_all calls still to fail
+    real_export = crawler.export_all
+
+    def counted_export():
+        exports.append(1)
+        if failing_exports["next"] > 0:
+            failing_exports["next"] -= 1
+            print("Export failed: injected by check_crawler")
+            return False
+        return real_export()
+
+    crawler.export_all = counted_export
+    crawler.BACKOFF = 0.01
+    site = FixtureSite(fixture_pages(sheet))
+    failures = []
+
+    def step(name, expect_200, expect_304, expect_exports, expect_ok=True, expect_206=0, expect_bumps=None):
+        """expect_bumps defaults to expect_exports. Runs that download a sheet already in the
+        ledger still call the (incremental) export, with no data-version bump."""
+        site.hits.clear()
+        before = len(exports)
+        with database.db_connection() as conn:
+            version = database.get_data_version(conn)
+        ok = crawler.run(site.url, state_file)
+        with database.db_connection() as conn:
+            bumps = database.get_data_version(conn) - version
+        got = (site.count(200), site.count(304), len(exports) - before, bumps, ok, site.count(206))
+        bumps_wanted = expect_exports if expect_bumps is None else expect_bumps
+        want = (expect_200, expect_304, expect_exports, bumps_wanted, expect_ok, expect_206)
+        status = "ok" if got == want else "FAIL"
+        print(f"{status:<4} {name:<44} 200s {got[0]}  304s {got[1]}  206s {got[5]}  exports {got[2]}  "
+              f"version bumps {got[3]}  success {got[4]}")
+        if got != want:
+            failures.append(f"{name}: expected {want}, got {got}")
+
+    def backfill_step(name, expect_200, expect_exports, expect_dates, expect_bumps=None, expect_ok=True):
+        site.hits.clear()
+        before = len(exports)
+        with database.db_connection() as conn:
+            version = database.get_data_version(conn)
+        ok = crawler.backfill(site.url, workers=2)
+        with database.db_connection() as conn:
+            dates = database.report_dates(conn)
+            bumps = database.get_data_version(conn) - version
+        got = (site.count(200), len(exports) - before, dates, bumps, ok)
+        want = (expect_200, expect_exports, expect_dates,
+                expect_exports if expect_bumps is None else expect_bumps, expect_ok)
+        status = "ok" if got == want else "FAIL"
+        print(f"{status:<4} {name:<44} 200s {got[0]}  exports {got[1]}  version bumps {bumps}  dates {len(dates)}")
+        if got != want:
+            failures.append(f"{name}: expected {want}, got {got}")
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            database.use_database(os.path.join(tmp, "crawler.db"))
+            database.init_db()
+            export_static.OUTPUT_DIR = os.path.join(tmp, "public")
+            os.makedirs(export_static.OUTPUT_DIR)
+            crawler.DOWNLOAD_DIR = os.path.join(tmp, "daily")
+            state_file = os.path.join(tmp, "crawler_state.json")
+
+            site.failures["/"] = 2
+            step("first run (listing fails twice, retried)", 3, 0, 1)
+            step("nothing changed", 0, 1, 0)
+            site.set("/", listing_page('<li><a href="./x.html">招聘公告</a></li>'))
+            step("listing changed, same detail and sheet", 1, 2, 0)
+            site.set("/202601/P020260113_daily.xlsx", updated_sheet, XLSX_TYPE)
+            site.set("/", listing_page('<li><a href="./y.html">另一条公告</a></li>'))
+            site.failures["/202601/P020260113_daily.xlsx"] = crawler.RETRIES + 1
+            step("sheet unavailable (retries exhausted)", 1, 1, 0, expect_ok=False)
+            step("sheet back, validators not committed", 2, 1, 1)
+            step("nothing changed again", 0, 1, 0)
+
+            # No validators from the server: everything is downloaded, the ledger decides
+            site.validators = False
+            step("re-downloaded, byte-identical sheet", 3, 0, 1, expect_bumps=0)
+            site.set("/202601/P020260113_daily.xlsx", rezip(updated_sheet), XLSX_TYPE)
+            step("re-zipped sheet, same rows", 3, 0, 1, expect_bumps=0)
+            with database.db_connection() as conn:
+                recorded = database.read_ledger(conn, "2026-01-13")["source_hash"]
+            if recorded != database.content_hash(rezip(updated_sheet)):
+                failures.append("ledger did not record the re-zipped sheet's hash")
+            step("re-zipped sheet again", 3, 0, 1, expect_bumps=0)
+
+            # The write commits (ledger included) but the export fails: the next run finds the
+            # same bytes in the ledger and must still export
+            site.set("/202601/P020260113_daily.xlsx", sheet, XLSX_TYPE)
+            failing_exports["next"] = 1
+            step("new sheet written, export fails", 3, 0, 1, expect_ok=False)
+            step("same sheet again, export retried", 3, 0, 1, expect_bumps=0)
+            site.validators = True
+
+            # Interrupted download: the .part is kept and the next run fetches only the rest
+            xlsx_path = "/202601/P020260113_daily.xlsx"
+            part = os.path.join(crawler.DOWNLOAD_DIR, "2026-01-13.xlsx.part")
+            resumed_sheet = rezip(updated_sheet)   # bytes the saved validators have not seen
+            site.set(xlsx_path, resumed_sheet, XLSX_TYPE)
+            site.set("/", listing_page('<li><a href="./z.html">第三条公告</a></li>'))
+            # Cut inside the second chunk: the first chunk is on disk, the partial read is lost
+            site.cuts[xlsx_path] = crawler.CHUNK_SIZE + 1000
+            step("sheet cut off mid-download", 2, 1, 0, expect_ok=False)
+            if not os.path.exists(part) or os.path.getsize(part) != crawler.CHUNK_SIZE:
+                failures.append("interrupted download did not leave the partial file")
+            step("download resumed", 1, 1, 1, expect_206=1)
+            with open(os.path.join(crawler.DOWNLOAD_DIR, "2026-01-13.xlsx"), "rb") as f:
+                if f.read() != resumed_sheet or os.path.exists(part):
+                    failures.append("resumed download is not the served sheet, or .part left behind")
+
+            # Unusual but harmless attachment type: accepted, the zip header decides
+            # (the original deflated bytes of the stored rows)
+            site.set(xlsx_path, updated_sheet, "application/x-download")
+            site.set("/", listing_page('<li><a href="./v.html">第四条公告</a></li>'))
+            step("sheet served as application/x-download", 2, 1, 1, expect_bumps=0)
+
+            # Not a spreadsheet: an error page served with 200, then the same bytes as octet-stream
+            site.set(xlsx_path, b"<html>\xe7\xb3\xbb\xe7\xbb\x9f\xe7\xbb\xb4\xe6\x8a\xa4</html>")
+            site.set("/", listing_page('<li><a href="./u.html">第五条公告</a></li>'))
+            step("HTML page instead of the sheet", 2, 1, 0, expect_ok=False)
+            if os.path.exists(part):
+                failures.append("rejected download left a .part file")
+            site.set(xlsx_path, b"<html>\xe7\xb3\xbb\xe7\xbb\x9f\xe7\xbb\xb4\xe6\x8a\xa4</html>!",
+                     "application/octet-stream")
+            site.set("/", listing_page('<li><a href="./w.html">第六条公告</a></li>'))
+            step("HTML bytes as application/octet-stream", 2, 1, 0, expect_ok=False)
+            if os.path.exists(part):
+                failures.append("rejected download left a .part file")
+
+            # New rows but the write fails: the daily dir keeps the last ingested sheet
+            real_save = crawler.save_applications
+
+            def failing_save(*args, **kwargs):
+                raise RuntimeError("injected by check_crawler")
+
+            site.set(xlsx_path, sheet, XLSX_TYPE)
+            site.set("/", listing_page('<li><a href="./t.html">第七条公告</a></li>'))
+            crawler.save_applications = failing_save
+            try:
+                step("new sheet, database write fails", 2, 1, 0, expect_ok=False)
+            finally:
+                crawler.save_applications = real_save
+            with open(os.path.join(crawler.DOWNLOAD_DIR, "2026-01-13.xlsx"), "rb") as f:
+                if f.read() != resumed_sheet or os.path.exists(part):
+                    failures.append("failed write replaced the ingested sheet or left a .part file")
+            site.set(xlsx_path, resumed_sheet, XLSX_TYPE)
+
+            # Backfill: 1.13 is in the DB; 1.14 (detail page) and 1.15 (direct link) are not
+            site.set("/", listing_page(script='<script>createPageHTML(3, 0, "index", "shtml");</script>'))
+            site.set("/index_1.shtml", PAGE_1)
+            site.set("/index_2.shtml", PAGE_2)
+            site.set("/202601/t20260114_1.html", DETAIL_PAGE.replace(b"P020260113", b"P020260114"))
+            site.set("/202601/P020260114_daily.xlsx", updated_sheet, XLSX_TYPE)
+            site.set("/202601/P020260115_daily.xlsx", sheet, XLSX_TYPE)
+            site.failures["/202601/P020260115_daily.xlsx"] = 1
+
+            # The batch ingest fails: nothing is written and no sheet is left in the daily dir
+            real_batch = crawler.save_applications_batch
+
+            def failing_batch(frames, source_hashes=None):
+                raise RuntimeError("injected by check_crawler")
+
+            crawler.save_applications_batch = failing_batch
+            try:
+                backfill_step("backfill, batch ingest fails", 6, 0, ["2026-01-13"], expect_ok=False)
+            finally:
+                crawler.save_applications_batch = real_batch
+            leftovers = sorted(set(os.listdir(crawler.DOWNLOAD_DIR)) - {"2026-01-13.xlsx"})
+            if leftovers:
+                failures.append(f"failed backfill left files in the daily dir: {leftovers}")
+            backfill_step("backfill two missing dates", 6, 1, ["2026-01-13", "2026-01-14", "2026-01-15"])
+            backfill_step("backfill with nothing missing", 3, 1, ["2026-01-13", "2026-01-14", "2026-01-15"],
+                          expect_bumps=0)
+            database.use_database(original_db)
+    finally:
+        site.close()
+        crawler.export_all = real_export
+
+    if failures:
+        print("\n".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
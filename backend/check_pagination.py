@@ -0,0 +1,66 @@
+"""
+Pagination check: page through /positions and /positions/wuhan with `after` cursors
+against the local database, and make sure malformed or stale cursors are answered
+with 400 rather than a 500 "查询失败".
+
+A keyword search pages through a different ordering (its cursor has three keys), so
+reusing its cursor for the plain listing is the usual way to end up with a stale one.
+
+Usage (from backend/):  python check_pagination.py
+"""
+import sys
+
+from fastapi.testclient import TestClient
+
+import main
+from database import encode_cursor
+
+PAGE_SIZE = 20
+
+
+def main_check():
+    failures = []
+
+    def expect(name, response, status):
+        ok = response.status_code == status
+        print(f"{'ok' if ok else 'FAIL':<4} {name:<52} -> {response.status_code}")
+        if not ok:
+            failures.append(f"{name}: expected {status}, got {response.status_code} {response.text[:200]}")
+        return response
+
+    with TestClient(main.app) as client:
+        first = expect("/positions first page", client.get(f"/positions?page_size={PAGE_SIZE}"), 200).json()
+        token = first.get("next_after")
+        if not token:
+            failures.append("/positions first page returned no next_after cursor")
+        else:
+            second = expect("/positions after cursor", client.get(f"/positions?page_size={PAGE_SIZE}&after={token}"), 200).json()
+            by_offset = client.get(f"/positions?page_size={PAGE_SIZE}&page=2").json()
+            codes = [row["职位代码"] for row in second["data"]]
+            if codes != [row["职位代码"] for row in by_offset["data"]]:
+                failures.append("cursor page 2 differs from offset page 2")
+            if set(codes) & {row["职位代码"] for row in first["data"]}:
+                failures.append("cursor page 2 repeats rows from page 1")
+
+        search = client.get("/positions?keyword=计算机&page_size=5").json()
+        stale = search.get("next_after")
+        if not stale:
+            failures.append("keyword search returned no next_after cursor")
+        else:
+            expect("/positions with a keyword-search cursor", client.get(f"/positions?after={stale}"), 400)
+            expect("/positions/wuhan with a keyword-search cursor", client.get(f"/positions/wuhan?after={stale}"), 400)
+
+        for label, bad in [("not base64", "!!!"), ("not JSON", "bm90IGpzb24"),
+                           ("wrong types", encode_cursor(["x", "y"]))]:
+            expect(f"/positions cursor {label}", client.get(f"/positions?after={bad}"), 400)
+            expect(f"/positions/wuhan cursor {label}", client.get(f"/positions/wuhan?after={bad}"), 400)
+
+    if failures:
+        print("\n".join(failures))
+        return 1
+    print("OK")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_check())
@@ -0,0 +1,161 @@
+"""
+Query plan check: replay the API endpoints and the static export against the
+local database, capture every SELECT they issue and run EXPLAIN QUERY PLAN on it.
+Exits non-zero if a query scans a table, unless the query and table are listed in
+INTENTIONAL_SCANS.
+
+Usage (from backend/):  python check_query_plans.py
+"""
+import re
+import sys
+import tempfile
+
+import database
+from database import db_connection
+
+# Endpoint requests to replay
+ENDPOINTS = [
+    ("GET", "/stats/dates", None),
+    ("GET", "/positions", None),
+    ("GET", "/positions?city=武汉市&education=本科&target=应届&page=2", None),
+    ("GET", "/positions?keyword=计算机", None),
+    ("GET", "/positions?keyword=会计", None),
+    ("GET", "/positions/wuhan?keyword=综合管理", None),
+    ("GET", "/positions/wuhan?district=江岸区", None),
+    ("GET", "/stats/by-region", None),
+    ("GET", "/stats/wuhan-districts", None),
+    ("GET", "/stats/trend", None),
+    ("GET", "/stats/trend?city=武汉市", None),
+    ("GET", "/stats/trend?position_code=14230201003000001", None),
+    ("GET", "/stats/hot-positions", None),
+    ("GET", "/stats/cold-positions", None),
+    ("GET", "/stats/summary", None),
+    ("GET", "/filters", None),
+    ("GET", "/stats/momentum", None),
+    ("POST", "/positions/by-codes", ["14230201003000001", "14230201003000002"]),
+    ("POST", "/positions/trend-by-codes", ["14230201003000001", "14230201003000002"]),
+]
+
+# Every SCAN counts, including "SCAN x USING [COVERING] INDEX" (a full index scan); only
+# "SCAN x VIRTUAL TABLE INDEX ..." is an FTS5 index lookup. SEARCH plans never match.
+SCAN_RE = re.compile(r"\bSCAN (\w+)\b(?! VIRTUAL TABLE)")
+INTERNAL_RE = re.compile(r"\bsqlite_master\b|'?\w+_fts_(?:config|data|idx|docsize|content)\b")
+
+# Queries that scan on purpose: (pattern matched against the normalized SQL, table or
+# alias it may scan, why). Any other SCAN fails the check.
+INTENTIONAL_SCANS = [
+    (r"^SELECT code, name, org, unit, quota, city, district, education, degree, major_pg, major_ug, "
+     r"target, notes, intro FROM positions$", "positions", "snapshot.py loads the whole table"),
+    (r"^SELECT code, date, applicants, passed FROM applications$", "applications",
+     "snapshot.py loads the whole table"),
+    (r"\(\s*p\.code LIKE '%[^%']{1,2}%' OR", "p",
+     "keywords under 3 characters cannot use the trigram index and fall back to LIKE"),
+    (r"COALESCE\(a_today\.applicants, 0\) - COALESCE\(a_prev\.applicants, 0\) as delta FROM positions p ",
+     "p", "surge ranks every position by its change since the previous day"),
+    (r"^SELECT p\.city, p\.district, a\.date, SUM\(a\.applicants\), SUM\(a\.passed\) FROM applications a ", "a",
+     "the trend cube aggregates every application row"),
+    (r"FROM rollup_date ORDER BY date$", "rollup_date", "one row per report date"),
+    (r"^SELECT DISTINCT (?:city|education|degree|target) FROM positions WHERE ", "positions",
+     "filter options: distinct values read from the covering index"),
+    (r"^SELECT code FROM positions ORDER BY code$", "positions", "export: catalog key over every code"),
+    (r"^SELECT code as \"职位代码\", .* FROM positions ORDER BY code$", "positions",
+     "export: positions_catalog.json holds every position"),
+    (r"^SELECT code, date, applicants FROM applications ORDER BY date$", "applications",
+     "export: the granular trend shards cover every application row"),
+    (r"^SELECT COALESCE\(a\.applicants, 0\), COALESCE\(a\.passed, 0\) FROM positions p LEFT JOIN applications a "
+     r"ON p\.code = a\.code AND a\.date = '[\d-]+' ORDER BY p\.code$", "p",
+     "export: per-date counts for every position, in catalog order"),
+]
+
+
+def capture_statements():
+    """Run the endpoints and the exporter with a trace callback on every pooled connection"""
+    statements = []
+    original_acquire = database._pool.acquire
+
+    def traced_acquire():
+        conn = original_acquire()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    database._pool.acquire = traced_acquire
+    try:
+        from fastapi.testclient import TestClient
+        import main
+        client = TestClient(main.app)
+        for method, url, body in ENDPOINTS:
+            resp = client.request(method, url, json=body)
+            if resp.status_code != 200:
+                print(f"  ! {method} {url} -> {resp.status_code}")
+
+        import export_static
+        # The exporter reads from per-thread clones of an in-memory snapshot, not the pool
+        original_connect = export_static.ExportSnapshot.connect
+
+        def traced_connect(snap):
+            conn = original_connect(snap)
+            conn.set_trace_callback(statements.append)
+            return conn
+
+        export_static.ExportSnapshot.connect = traced_connect
+        try:
+            with tempfile.TemporaryDirectory() as tmp:
+                export_static.OUTPUT_DIR = tmp
+                export_static.export_all(force=True)
+        finally:
+            export_static.ExportSnapshot.connect = original_connect
+    finally:
+        database._pool.acquire = original_acquire
+
+    seen = set()
+    selects = []
+    for sql in statements:
+        norm = " ".join(sql.split())
+        # Schema lookups and FTS5's own shadow-table reads are not endpoint queries
+        if INTERNAL_RE.search(norm):
+            continue
+        if norm.upper().startswith(("SELECT", "WITH")) and norm not in seen:
+            seen.add(norm)
+            selects.append(norm)
+    return selects
+
+
+def full_scans(conn, sql, used):
+    """Return the plan and the scans not covered by INTENTIONAL_SCANS; adds the index of
+    every INTENTIONAL_SCANS entry that covered a scan to `used`"""
+    plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}").fetchall()]
+    bad = []
+    for detail in plan:
+        for table in SCAN_RE.findall(detail):
+            allowed = [i for i, (pattern, scanned, _) in enumerate(INTENTIONAL_SCANS)
+                       if scanned == table and re.search(pattern, sql)]
+            if allowed:
+                used.update(allowed)
+            else:
+                bad.append((table, detail))
+    return plan, bad
+
+
+def main():
+    database.init_db()
+    selects = capture_statements()
+    failures = 0
+    used = set()
+    with db_connection() as conn:
+        for sql in selects:
+            plan, bad = full_scans(conn, sql, used)
+            status = "FAIL" if bad else "ok"
+            print(f"[{status}] {sql[:110]}")
+            for detail in plan:
+                print(f"        {detail}")
+            failures += bool(bad)
+    for i, (pattern, table, reason) in enumerate(INTENTIONAL_SCANS):
+        if i not in used:
+            print(f"  ! intentional scan of {table} never seen ({reason}); remove it if the query is gone")
+    print(f"\n{len(selects)} queries checked, {failures} with unexpected full table scans, "
+          f"{len(used)} intentional scans")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+"""
+Region matcher check: compare region_matcher.RegionNormalizer with the original
+nested-loop normalize_city_and_district on real and randomized inputs, and time both.
+Inputs are the rows of a positions sheet when one is given (or data/positions.xlsx
+exists), the org / city / district triples of the positions table, and seeded random
+triples assembled from CITY_DISTRICT_MAP names. Exits non-zero on any mismatch.
+
+Usage (from backend/):  python check_region_match.py [positions.xlsx]
+"""
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+from database import db_connection
+from main import CITY_DISTRICT_MAP
+from region_matcher import RegionNormalizer
+
+DEFAULT_SHEET = os.path.join(os.path.dirname(__file__), "data", "positions.xlsx")
+RANDOM_TRIPLES = 50000
+SEED = 18
+
+
+def legacy_normalize(org_name: str, raw_city: str = None, raw_district: str = None):
+    """normalize_city_and_district before region_matcher.py, kept verbatim as the reference"""
+    org = str(org_name) if not pd.isna(org_name) else ""
+    city = str(raw_city) if not pd.isna(raw_city) else ""
+    district = str(raw_district) if not pd.isna(raw_district) else ""
+    
+    # 1. 识别省直
+    if "省" in org[:4] or org.startswith("省") or city == "省直":
+        return "省直", "其他"
+    
+    # 2. 如果原始城市名已经在 CITY_DISTRICT_MAP 的 key 里，保持原样
+    if city in CITY_DISTRICT_MAP:
+        # 如果 raw_city 是武汉市，但 raw_district 为空，尝试从 org 提取
+        if not district or district == "其他":
+            for d in CITY_DISTRICT_MAP[city]:
+                if d in org:
+                    district = d
+                    break
+        return city, district or "其他"
+
+    # 3. 如果 org 或 city 中包含明确的市名
+    for main_city in CITY_DISTRICT_MAP.keys():
+        short_city = main_city.replace("市", "").replace("州", "").replace("林区", "")
+        if short_city in city or short_city in org:
+            # 进一步细化区县
+            for d in CITY_DISTRICT_MAP[main_city]:
+                if d in district or d in org or d in city:
+                    return main_city, d
+            return main_city, district or "其他"
+            
+    # 4. 反向搜索：如果 org, city, district 中包含任何已知的区县关键词
+    for main_city, districts in CITY_DISTRICT_MAP.items():
+        for d in districts:
+            # 先尝试全名匹配
+            if d in org or d in city or d in district:
+                 return main_city, d
+            # 再尝试去后缀匹配（仅限长度 >= 2 的词，防止误伤，如“房”县不宜去后缀匹配）
+            short_d = d.replace("区", "").replace("县", "").replace("市", "")
+            if len(short_d) >= 2:
+                if short_d in org or short_d in city or short_d in district:
+                    return main_city, d
+                    
+    # 5. 特殊处理：以“市”开头的机关（通常是武汉市直）
+    if org.startswith("市") or city.startswith("市"):
+        return "武汉市", "市直"
+        
+    # 6. 最后保底模糊识别
+    if "武汉" in org or "武汉" in city: return "武汉市", "市直"
+    if "黄石" in org: return "黄石市", "其他"
+    if "十堰" in org: return "十堰市", "其他"
+    if "宜昌" in org: return "宜昌市", "其他"
+    if "襄阳" in org: return "襄阳市", "其他"
+    if "荆门" in org: return "荆门市", "其他"
+    if "荆州" in org: return "荆州市", "其他"
+    if "黄冈" in org: return "黄冈市", "其他"
+    if "孝感" in org: return "孝感市", "其他"
+    if "咸宁" in org: return "咸宁市", "其他"
+    if "随州" in org: return "随州市", "其他"
+    if "恩施" in org: return "恩施土家族苗族自治州", "其他"
+    if "仙桃" in org or "仙桃" in city: return "仙桃市", "仙桃"
+    if "潜江" in org or "潜江" in city: return "潜江市", "潜江"
+    if "天门" in org or "天门" in city: return "天门市", "天门"
+    if "神农架" in org or "神农架" in city: return "神农架林区", "神农架"
+    
+    return city or "未知", district or "其他"
+
+
+def sheet_triples(path):
+    raw = pd.read_excel(path)
+    missing = pd.Series([None] * len(raw))
+    return list(zip(raw.get("招录机关", missing), raw.get("城市", missing), raw.get("区县", missing)))
+
+
+def db_triples():
+    with db_connection() as conn:
+        rows = conn.execute("SELECT org, city, district FROM positions").fetchall()
+    # As uploaded (sheet without city columns) and as stored
+    return [(org, None, None) for org, _, _ in rows] + [tuple(row) for row in rows]
+
+
+def random_triples(n, seed=SEED):
+    rng = random.Random(seed)
+    words = ["省", "市", "县", "区", "人民政府", "公安局", "办公室", "乡镇", "街道", "直属", ""]
+    for city, districts in CITY_DISTRICT_MAP.items():
+        words += [city, city.replace("市", "").replace("州", "").replace("林区", "")]
+        for d in districts:
+            words += [d, d.replace("区", "").replace("县", "").replace("市", "")]
+    fields = words + [None, "其他", "省直", "未知"]
+
+    def text(k):
+        return "".join(rng.choice(words) for _ in range(rng.randint(0, k)))
+
+    return [(text(4), rng.choice(fields) if rng.random() < 0.5 else text(2),
+             rng.choice(fields) if rng.random() < 0.5 else text(1)) for _ in range(n)]
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SHEET
+    cases = {}
+    if os.path.exists(path):
+        cases["sheet"] = sheet_triples(path)
+    else:
+        print(f"{path} not found, skipping sheet rows")
+    cases["db"] = db_triples()
+    cases["random"] = random_triples(RANDOM_TRIPLES)
+
+    failures = 0
+    for name, triples in cases.items():
+        start = time.perf_counter()
+        expected = [legacy_normalize(*t) for t in triples]
+        legacy_ms = (time.perf_counter() - start) * 1000
+
+        normalizer = RegionNormalizer(CITY_DISTRICT_MAP)
+        start = time.perf_counter()
+        cities, districts = normalizer.normalize_many(*zip(*triples))
+        fast_ms = (time.perf_counter() - start) * 1000
+
+        mismatches = [(t, e, (c, d)) for t, e, c, d in zip(triples, expected, cities, districts)
+                      if e != (c, d)]
+        failures += len(mismatches)
+        print(f"{name:<7} {len(triples):>7} rows  legacy {legacy_ms:8.1f} ms  "
+              f"matcher {fast_ms:7.1f} ms  ({legacy_ms / max(fast_ms, 1e-3):.1f}x)  "
+              f"mismatches {len(mismatches)}")
+        for triple, want, got in mismatches[:10]:
+            print(f"  {triple}: expected {want}, got {got}")
+
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Columnar (struct-of-arrays) encoding for position listings.
+
+Shared by the API (`format=columnar`) and the static export. A table is
+
+    {"columns": [name, ...], "length": n, "values": [column, ...]}
+
+where each column is either a plain array of n values or, for low-cardinality
+string columns (城市, 学历, 招录对象, ...), a dictionary encoding
+{"dictionary": [distinct values], "indices": [n ints]}. Key names are sent once
+instead of on every row. frontend/src/utils/columnar.ts decodes it back to rows.
+"""
+
+# Dictionary-encode a string column when distinct values are at most this share of rows
+DICTIONARY_MAX_RATIO = 0.25
+
+
+def _dictionary_encode(values):
+    """{"dictionary", "indices"} if the column is low-cardinality strings, else None"""
+    limit = max(1, int(len(values) * DICTIONARY_MAX_RATIO))
+    positions = {}
+    indices = []
+    for value in values:
+        if not isinstance(value, str):
+            return None
+        index = positions.get(value)
+        if index is None:
+            index = positions[value] = len(positions)
+            if index >= limit:
+                return None
+        indices.append(index)
+    return {"dictionary": list(positions), "indices": indices}
+
+
+def encode_columns(columns):
+    """Encode {name: list of values}; all lists must have the same length"""
+    names = list(columns)
+    length = len(columns[names[0]]) if names else 0
+    values = []
+    for name in names:
+        column = columns[name]
+        encoded = _dictionary_encode(column) if length > 1 else None
+        values.append(encoded or column)
+    return {"columns": names, "length": length, "values": values}
+
+
+def encode_columnar(records, columns=None):
+    """Encode a list of dicts (API records). `columns` fixes the column order for
+    empty listings; by default it is taken from the first record."""
+    names = columns or (list(records[0]) if records else [])
+    return encode_columns({name: [record[name] for record in records] for name in names})
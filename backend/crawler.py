@@ -1,70 +1,177 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+import hashlib
+import json
 import os
 import re
-import pandas as pd
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from urllib.parse import urljoin
 import time
 from main import standardize_daily_df, save_applications
+from database import (close_pool, db_connection, report_dates, save_applications_batch, daily_rows_hash,
+                      read_ledger, record_source_hash)
 from export_static import export_all
+from sheet_cache import load_standardized
 
 # 配置
 BASE_URL = "https://rst.hubei.gov.cn/hbrsksw/zlplks/jglyks/hbsgwyks/zytz/"
 DOWNLOAD_DIR = "backend/data/daily"
 USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
 
-def get_latest_excel_link():
-    """获取最新的报名人数统计表链接"""
+# 每个请求的 (连接, 读取) 超时秒数
+TIMEOUT = (10, 60)
+# 连接错误与 429/5xx 的重试次数, 间隔 BACKOFF * 2^n 秒
+RETRIES = 3
+BACKOFF = 2.0
+# ETag / Last-Modified 与详情页附件链接, 跨运行保存 (随 exam.db 一起提交)
+STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "crawler_state.json")
+# 补抓模式: 并发下载数与最多翻阅的列表页数
+BACKFILL_WORKERS = 4
+MAX_LISTING_PAGES = 30
+# 流式下载: 每块字节数与单个统计表的大小上限
+CHUNK_SIZE = 1 << 16
+MAX_DOWNLOAD_BYTES = 100 * 1024 * 1024
+# 附件的 Content-Type 各站点不一 (octet-stream、x-download 等), 只拒绝明显是网页的响应;
+# 内容是否为 xlsx (zip) 由文件头判断
+REJECTED_TYPES = ("text/html", "application/xhtml+xml")
+XLSX_MAGIC = b"PK\x03\x04"
+
+TITLE_KEYWORD = "报名人数统计表"
+TITLE_DATE = re.compile(r'(\d{4})\.(\d{1,2})\.(\d{1,2})')
+# 分页链接: index_1.shtml 等, 或 TRS 页面脚本 createPageHTML(总页数, 当前页, "index", "shtml")
+PAGE_HREF = re.compile(r'(^|/)index_\d+\.s?html?$')
+PAGE_SCRIPT = re.compile(r'createPageHTML\(\s*(\d+)\s*,\s*(\d+)\s*,\s*["\'](\w+)["\']\s*,\s*["\'](\w+)["\']')
+PAGE_TEXTS = ("下一页", "下页", "尾页", "末页")
+
+
+def make_session(pool_size=BACKFILL_WORKERS):
+    """共享会话: 连接复用 (keep-alive), 失败时按指数退避重试"""
+    session = requests.Session()
+    session.headers["User-Agent"] = USER_AGENT
+    retry = Retry(total=RETRIES, backoff_factor=BACKOFF, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=("GET", "HEAD"))
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class CrawlState:
+    """
+    条件请求的校验值 (ETag / Last-Modified) 与详情页 → 附件链接。
+    本次运行得到的新值先暂存, 整次运行成功后 commit() 才写回文件,
+    中途失败时下次运行仍会完整重新下载。
+    """
+
+    def __init__(self, path=STATE_FILE):
+        self.path = path
+        self.saved = {"validators": {}, "attachments": {}}
+        if os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self.saved.update(json.load(f))
+            except (OSError, ValueError) as e:
+                print(f"状态文件无法读取, 忽略: {e}")
+        self.staged = {"validators": {}, "attachments": {}}
+        self.not_modified = set()   # 本次运行中返回 304 的 URL
+
+    def conditional_headers(self, url):
+        validators = self.saved["validators"].get(url, {})
+        headers = {}
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+        return headers
+
+    def remember(self, url, response):
+        etag, modified = response.headers.get("ETag"), response.headers.get("Last-Modified")
+        if etag or modified:
+            self.staged["validators"][url] = {"etag": etag, "last_modified": modified}
+
+    def attachment(self, page_url):
+        return self.staged["attachments"].get(page_url) or self.saved["attachments"].get(page_url)
+
+    def remember_attachment(self, page_url, url):
+        self.staged["attachments"][page_url] = url
+
+    def commit(self):
+        for key, values in self.staged.items():
+            self.saved[key].update(values)
+            values.clear()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.saved, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+
+def fetch(session, url, state=None):
+    """
+    GET 请求 (带超时); 有 state 时发送条件请求, 内容未变化 (304) 时返回 None。
+    非 2xx 状态抛出 requests.HTTPError。
+    """
+    headers = state.conditional_headers(url) if state is not None else {}
+    response = session.get(url, headers=headers, timeout=TIMEOUT)
+    if response.status_code == 304 and state is not None:
+        state.not_modified.add(url)
+        return None
+    response.raise_for_status()
+    if state is not None:
+        state.remember(url, response)
+    return response
+
+
+def parse_listing(soup, page_url):
+    """列表页中所有统计表链接: [(日期, 标题, 绝对链接)], 按页面顺序"""
+    found = []
+    for link in soup.find_all('a', href=True):
+        title = link.get_text().strip()
+        if TITLE_KEYWORD not in title:
+            continue
+        print(f"找到潜在链接: {title} -> {link['href']}")
+        # 尝试从标题提取日期 (例如: 2026.1.13)
+        date_match = TITLE_DATE.search(title)
+        if date_match:
+            year, month, day = date_match.groups()
+            # 相对路径 (./202601/P... 或 202601/P...) 相对于列表页补全
+            found.append((datetime(int(year), int(month), int(day)), title, urljoin(page_url, link['href'])))
+    return found
+
+
+def pagination_links(soup, html, page_url, base_url):
+    """列表页上指向其他分页的链接 (只保留 base_url 目录下的)"""
+    urls = [urljoin(page_url, a['href']) for a in soup.find_all('a', href=True)
+            if a.get_text().strip() in PAGE_TEXTS or PAGE_HREF.search(a['href'])]
+    script = PAGE_SCRIPT.search(html)
+    if script:
+        total, _, prefix, ext = script.groups()
+        urls += [urljoin(page_url, f"{prefix}_{i}.{ext}") for i in range(1, int(total))]
+    return [url for url in urls if url.startswith(base_url)]
+
+
+def get_latest_excel_link(session=None, state=None, base_url=BASE_URL):
+    """获取最新的报名人数统计表链接; 首页未变化时返回 (None, None, None)"""
+    session = session or make_session()
     try:
-        print(f"正在访问首页: {BASE_URL}")
-        headers = {"User-Agent": USER_AGENT}
-        response = requests.get(BASE_URL, headers=headers, timeout=10)
+        print(f"正在访问首页: {base_url}")
+        response = fetch(session, base_url, state)
+        if response is None:
+            print("首页自上次运行以来没有变化。")
+            return None, None, None
         response.encoding = 'utf-8' # 或者是 'gbk', 根据实际情况调整
-        
-        if response.status_code != 200:
-            print(f"访问失败，状态码: {response.status_code}")
-            return None
 
         soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 查找所有包含 "报名人数统计表" 的链接
-        # 这是一个简单的查找逻辑，可能需要根据实际网页结构调整
-        links = soup.find_all('a', href=True)
-        
-        target_link = None
-        latest_date = None
-        target_title = None
-
-        print("正在搜索包含 '报名人数统计表' 的链接...")
-        for link in links:
-            title = link.get_text().strip()
-            href = link['href']
-            
-            if "报名人数统计表" in title:
-                print(f"找到潜在链接: {title} -> {href}")
-                # 尝试从标题提取日期 (例如: 2026.1.13)
-                date_match = re.search(r'(\d{4})\.(\d{1,2})\.(\d{1,2})', title)
-                if date_match:
-                    year, month, day = date_match.groups()
-                    current_date_obj = datetime(int(year), int(month), int(day))
-                    
-                    # 寻找最新的日期
-                    if latest_date is None or current_date_obj > latest_date:
-                        latest_date = current_date_obj
-                        target_link = href
-                        target_title = title
-        
-        if target_link:
-            # 补全相对路径
-            if not target_link.startswith('http'):
-                # 注意：这里可能需要处理 ../ 或者是 ./ 的情况
-                # 简单拼接，假设是在当前目录下
-                 # 有时候 href 是 ./202601/P...，有时候是 202601/P...
-                if target_link.startswith('./'):
-                    target_link = BASE_URL + target_link[2:]
-                else:
-                    target_link = BASE_URL + target_link
-            
+
+        # 查找所有包含 "报名人数统计表" 的链接, 取日期最新的 (同一日期取先出现的)
+        print(f"正在搜索包含 '{TITLE_KEYWORD}' 的链接...")
+        links = parse_listing(soup, base_url)
+        if links:
+            latest_date, target_title, target_link = max(links, key=lambda link: link[0])
             print(f"锁定最新文件: {target_title}")
             print(f"下载链接: {target_link}")
             return target_link, target_title, latest_date
@@ -76,92 +183,336 @@ def get_latest_excel_link():
         print(f"获取链接时出错: {e}")
         return None, None, None
 
-def download_and_process(url, title, date_obj):
-    """下载 Excel 并处理"""
-    if not url: return
 
+def resolve_attachment(session, url, state=None):
+    """
+    统计表文件链接: url 本身是文件时直接返回, 是新闻详情页时从页面中找 xlsx 附件。
+    详情页未变化 (304) 时沿用上次记录的附件链接; 找不到时返回 None
+    """
+    # 观察用户提供的直接链接是 .xlsx，说明可能是在列表页直接链接了文件，或者需要进详情页找附件。
+    if not (url.endswith('.html') or url.endswith('.htm')):
+        return url
+
+    print(f"进入详情页查找附件: {url}")
+    resp = fetch(session, url, state)
+    if resp is None:
+        attachment = state.attachment(url)
+        if attachment:
+            print(f"详情页未变化, 附件链接: {attachment}")
+        else:
+            print("详情页未变化, 但没有记录附件链接。")
+        return attachment
+
+    resp.encoding = 'utf-8'
+    soup = BeautifulSoup(resp.text, 'html.parser')
+    # 找附件链接, 通常是在 <a href="...xlsx">; 相对路径相对于详情页 URL
+    att_links = soup.find_all('a', href=re.compile(r'\.xlsx$', re.I))
+    if not att_links:
+        print("详情页未找到 xlsx 附件。")
+        return None
+    attachment = urljoin(url, att_links[0]['href'])
+    if state is not None:
+        state.remember_attachment(url, attachment)
+    print(f"找到附件链接: {attachment}")
+    return attachment
+
+
+def _discard(*paths):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _resume_offset(part_path, meta_path, url):
+    """上次中断留下的 .part: 同一 URL 且记录了校验值时返回 (已下载字节数, 校验值), 否则删除并返回 (0, None)"""
     try:
-        # 1. 访问具体的新闻页面（如果 Excel 链接是在新闻详情页里，需要多一步）
-        # 观察用户提供的直接链接是 .xlsx，说明可能是在列表页直接链接了文件，或者需要进详情页找附件。
-        # 如果首页链接直接是 xlsx，可以直接下载。
-        # 如果首页链接是 html (新闻详情)，则需要点进去再找 xlsx。
-        
-        final_xlsx_url = url
-        
-        if url.endswith('.html') or url.endswith('.htm'):
-            print(f"进入详情页查找附件: {url}")
-            headers = {"User-Agent": USER_AGENT}
-            resp = requests.get(url, headers=headers)
-            resp.encoding = 'utf-8'
-            soup = BeautifulSoup(resp.text, 'html.parser')
-            # 找附件链接
-            # 通常是在 <a href="...xlsx">
-            att_links = soup.find_all('a', href=re.compile(r'\.xlsx$', re.I))
-            if att_links:
-                att_href = att_links[0]['href']
-                # 补全附件链接
-                # 注意：详情页里的相对路径是相对于详情页 URL 的
-                if not att_href.startswith('http'):
-                    # 获取详情页的 base url (去掉文件名)
-                    page_base = url.rsplit('/', 1)[0] + '/'
-                    # 处理 ./
-                    if att_href.startswith('./'):
-                        final_xlsx_url = page_base + att_href[2:]
-                    else:
-                        final_xlsx_url = page_base + att_href
-                else:
-                    final_xlsx_url = att_href
-                print(f"找到附件链接: {final_xlsx_url}")
-            else:
-                print("详情页未找到 xlsx 附件。")
-                return
-
-        # 2. 下载文件
-        print(f"开始下载: {final_xlsx_url}")
-        file_resp = requests.get(final_xlsx_url, headers={"User-Agent": USER_AGENT})
-        
-        if file_resp.status_code == 200:
-            # 格式化日期为 YYYY-MM-DD
-            date_str = date_obj.strftime('%Y-%m-%d')
-            filename = f"{date_str}.xlsx"
-            save_path = os.path.join(DOWNLOAD_DIR, filename)
-            
-            # 确保目录存在
-            os.makedirs(DOWNLOAD_DIR, exist_ok=True)
-            
-            with open(save_path, 'wb') as f:
-                f.write(file_resp.content)
-            print(f"文件已保存至: {save_path}")
-            
-            # 3. 处理数据 (复用 main.py 的逻辑)
-            print("正在处理数据并存入数据库...")
-            df = pd.read_excel(save_path, dtype=str)
-            std_df = standardize_daily_df(df)
-            save_applications(std_df, date_str)
-            print("数据库更新成功！")
-            
-            # 4. 触发静态导出
-            print("正在更新静态 JSON 数据...")
-            if export_all():
-                print("所有步骤完成！你可以提交代码并 push 到 GitHub 了。")
-            else:
-                print("静态导出失败。")
-                
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("url") == url and meta.get("validator") and os.path.exists(part_path):
+            return os.path.getsize(part_path), meta["validator"]
+    except (OSError, ValueError):
+        pass
+    _discard(part_path, meta_path)
+    return 0, None
+
+
+def stream_download(session, url, date_str, state=None):
+    """
+    流式下载统计表到 DOWNLOAD_DIR/<日期>.xlsx.part, 边写边计算 SHA-256, 内存占用与文件大小无关。
+    上次中断留下的同一 URL 的 .part 用 Range + If-Range 续传 (文件已变化时服务器返回完整内容)。
+    校验大小 (Content-Length 与上限) 和 xlsx 文件头, 并拒绝网页 (Content-Type 为 HTML)。
+    返回 (.part 路径, 哈希); 有 state 且内容未变化 (304) 时返回 None。
+    下载中断时保留 .part 供下次续传, 内容不是统计表时删除
+    """
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    part_path = os.path.join(DOWNLOAD_DIR, f"{date_str}.xlsx.part")
+    meta_path = part_path + ".json"
+    offset, validator = _resume_offset(part_path, meta_path, url)
+    # 不接受压缩传输, Content-Length 与 Range 都按文件字节计算 (xlsx 本身已压缩)
+    headers = {"Accept-Encoding": "identity"}
+    if state is not None:
+        headers.update(state.conditional_headers(url))
+    if offset:
+        headers.update({"Range": f"bytes={offset}-", "If-Range": validator})
+
+    with session.get(url, headers=headers, timeout=TIMEOUT, stream=True) as response:
+        if response.status_code == 304 and state is not None:
+            state.not_modified.add(url)
+            _discard(part_path, meta_path)
+            return None
+        if response.status_code == 416:
+            # 本地的部分文件已不对应服务器上的文件, 重新完整下载
+            _discard(part_path, meta_path)
+            return stream_download(session, url, date_str, state)
+        response.raise_for_status()
+
+        content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if content_type in REJECTED_TYPES:
+            _discard(part_path, meta_path)
+            raise ValueError(f"{url} 返回的不是统计表 (Content-Type: {content_type})")
+
+        digest = hashlib.sha256()
+        content_range = re.match(r'bytes (\d+)-\d+/(\d+)', response.headers.get("Content-Range", ""))
+        if response.status_code == 206 and content_range and int(content_range.group(1)) == offset:
+            expected = int(content_range.group(2))
+            mode = "ab"
+            with open(part_path, "rb") as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            print(f"从第 {offset} 字节续传 (共 {expected} 字节)")
+        elif response.status_code == 206:
+            _discard(part_path, meta_path)
+            raise ValueError(f"{url} 返回了无法续传的 Content-Range: {response.headers.get('Content-Range')}")
+        else:
+            length = response.headers.get("Content-Length")
+            expected = int(length) if length and length.isdigit() else None
+            mode, offset = "wb", 0
+        if expected is not None and expected > MAX_DOWNLOAD_BYTES:
+            _discard(part_path, meta_path)
+            raise ValueError(f"{url} 大小 {expected} 字节, 超过上限 {MAX_DOWNLOAD_BYTES}")
+
+        # 记下校验值才能在中断后续传 (弱 ETag 不能用于 If-Range)
+        etag = response.headers.get("ETag")
+        validator = etag if etag and not etag.startswith("W/") else response.headers.get("Last-Modified")
+        if validator:
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"url": url, "validator": validator}, f)
         else:
-            print(f"下载失败，状态码: {file_resp.status_code}")
+            _discard(meta_path)
+
+        size = offset
+        with open(part_path, mode) as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                size += len(chunk)
+                if size > MAX_DOWNLOAD_BYTES:
+                    f.close()
+                    _discard(part_path, meta_path)
+                    raise ValueError(f"{url} 超过大小上限 {MAX_DOWNLOAD_BYTES} 字节")
+                f.write(chunk)
+                digest.update(chunk)
+
+    if expected is not None and size != expected:
+        raise IOError(f"{url} 下载不完整: {size}/{expected} 字节, 下次运行续传")
+    with open(part_path, "rb") as f:
+        if f.read(len(XLSX_MAGIC)) != XLSX_MAGIC:
+            _discard(part_path, meta_path)
+            raise ValueError(f"{url} 的内容不是 xlsx 文件")
+    _discard(meta_path)
+    if state is not None:
+        state.remember(url, response)
+    print(f"下载完成: {size} 字节")
+    return part_path, digest.hexdigest()
+
+
+def finalize_download(part_path, date_str):
+    """把下载完成的 .part 原子地改名为 DOWNLOAD_DIR/<日期>.xlsx"""
+    save_path = os.path.join(DOWNLOAD_DIR, f"{date_str}.xlsx")
+    os.replace(part_path, save_path)
+    print(f"文件已保存至: {save_path}")
+    return save_path
+
+
+def publish():
+    """增量静态导出 (只重新生成数据有变化的产物); 返回是否成功"""
+    print("正在更新静态 JSON 数据...")
+    if export_all():
+        return True
+    print("静态导出失败。")
+    return False
+
+
+def download_and_process(url, title, date_obj, session=None, state=None):
+    """下载 Excel 并处理; 返回是否成功 (文件未变化也算成功)"""
+    if not url: return False
+    session = session or make_session()
+
+    try:
+        # 1. 列表页链接可能直接是 xlsx, 也可能是新闻详情页 (需要再找附件)
+        final_xlsx_url = resolve_attachment(session, url, state)
+        if not final_xlsx_url:
+            return False
+
+        # 格式化日期为 YYYY-MM-DD
+        date_str = date_obj.strftime('%Y-%m-%d')
+
+        # 2. 流式下载到 .part 文件 (未变化时服务器返回 304, 不下载也不重新导出)
+        print(f"开始下载: {final_xlsx_url}")
+        download = stream_download(session, final_xlsx_url, date_str, state)
+        if download is None:
+            print("统计表自上次下载以来没有变化, 跳过入库与导出。")
+            return True
+        part_path, source_hash = download
+
+        # 3. 与入库记录比对: 文件字节相同, 或解析后的数据行相同, 都不再写库。
+        # 仍然调用一次增量导出 (无变化时几乎不耗时): 上次入库后若导出失败, 这里补上
+        with db_connection() as conn:
+            ledger = read_ledger(conn, date_str)
+        if ledger and ledger['source_hash'] == source_hash:
+            _discard(part_path)
+            print(f"{date_str} 的统计表与已入库的文件相同, 跳过解析与入库。")
+            return publish()
+
+        print("正在处理数据并存入数据库...")
+        std_df = load_standardized(part_path, standardize_daily_df, digest=source_hash)
+        if ledger and ledger['rows_hash'] == daily_rows_hash(std_df):
+            _discard(part_path)
+            record_source_hash(date_str, source_hash)
+            print(f"{date_str} 的统计表文件有变化, 但数据与已入库的相同, 跳过入库。")
+            return publish()
+
+        try:
+            save_applications(std_df, date_str, source_hash=source_hash)
+        except Exception:
+            # 入库失败时丢弃下载: DOWNLOAD_DIR 里只出现已入库的日期
+            _discard(part_path)
+            raise
+        finalize_download(part_path, date_str)
+        print("数据库更新成功！")
+
+        # 4. 触发静态导出
+        if publish():
+            print("所有步骤完成！你可以提交代码并 push 到 GitHub 了。")
+            return True
+        return False
 
     except Exception as e:
         print(f"下载处理过程中出错: {e}")
+        return False
+
+
+def run(base_url=BASE_URL, state_file=STATE_FILE):
+    """一次抓取: 共享会话与条件请求; 成功后才保存新的校验值, 返回是否成功 (无变化也算成功)"""
+    session = make_session()
+    state = CrawlState(state_file)
+    try:
+        link, title, date_val = get_latest_excel_link(session, state, base_url)
+        if not link:
+            print("没有可处理的任务。")
+            # 首页未变化是正常结束; 出错或找不到链接时返回 False
+            return base_url in state.not_modified
+        # 检查是否已经下载过: 条件请求, 未变化时不下载
+        if download_and_process(link, title, date_val, session, state):
+            state.commit()
+            return True
+        return False
+    finally:
+        session.close()
+
+
+def collect_links(session, base_url=BASE_URL):
+    """遍历首页及其全部分页, 返回 {日期: (标题, 链接)}; 同一日期取最先出现的"""
+    found, seen, queue = {}, set(), [base_url]
+    while queue and len(seen) < MAX_LISTING_PAGES:
+        page_url = queue.pop(0)
+        if page_url in seen:
+            continue
+        seen.add(page_url)
+        print(f"正在访问列表页: {page_url}")
+        response = fetch(session, page_url)
+        response.encoding = 'utf-8'
+        soup = BeautifulSoup(response.text, 'html.parser')
+        for date_obj, title, url in parse_listing(soup, page_url):
+            found.setdefault(date_obj.strftime('%Y-%m-%d'), (title, url))
+        queue += [url for url in pagination_links(soup, response.text, page_url, base_url) if url not in seen]
+    return found
+
+
+def fetch_sheet(session, date_str, url):
+    """
+    补抓一个日期: 找附件、下载并解析 (在线程池中运行); 返回 (标准化的 DataFrame, 文件哈希, .part 路径)。
+    .part 在批量入库提交后才改名进 DOWNLOAD_DIR
+    """
+    xlsx_url = resolve_attachment(session, url)
+    if not xlsx_url:
+        raise ValueError(f"{url} 中没有 xlsx 附件")
+    part_path, source_hash = stream_download(session, xlsx_url, date_str)
+    try:
+        std_df = load_standardized(part_path, standardize_daily_df, digest=source_hash)
+    except Exception:
+        _discard(part_path)
+        raise
+    return std_df, source_hash, part_path
+
+
+def backfill(base_url=BASE_URL, workers=BACKFILL_WORKERS):
+    """
+    补抓模式: 收集列表页 (含分页) 上的全部统计表, 与 applications 中已有的日期比对,
+    缺失的日期并发下载解析, 在一个事务中入库, 最后只导出一次。返回是否全部成功
+    """
+    session = make_session(pool_size=workers)
+    try:
+        links = collect_links(session, base_url)
+        with db_connection() as conn:
+            existing = set(report_dates(conn))
+        missing = sorted(date for date in links if date not in existing)
+        print(f"列表中共 {len(links)} 个日期, 数据库已有 {len(existing & set(links))} 个, 需要补抓: {missing}")
+        if not missing:
+            # 没有缺失日期时仍做一次增量导出, 补上之前失败的导出
+            return publish()
+
+        frames, hashes, parts, failed = {}, {}, {}, []
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="backfill") as pool:
+            futures = {date: pool.submit(fetch_sheet, session, date, links[date][1]) for date in missing}
+            for date, future in futures.items():
+                try:
+                    frames[date], hashes[date], parts[date] = future.result()
+                except Exception as e:
+                    failed.append(date)
+                    print(f"{date} 补抓失败: {e}")
+
+        if frames:
+            print(f"正在入库 {len(frames)} 个日期 (单个事务)...")
+            try:
+                written = save_applications_batch(frames, hashes)
+            except Exception:
+                # 入库失败时丢弃下载: DOWNLOAD_DIR 里只出现已入库的日期 (migrate.py 会导入其中全部文件)
+                _discard(*parts.values())
+                raise
+            print("写入行数: " + ", ".join(f"{date} {count}" for date, count in written.items()))
+            for date, part_path in parts.items():
+                finalize_download(part_path, date)
+            if not publish():
+                return False
+        return not failed
+    except Exception as e:
+        print(f"补抓过程中出错: {e}")
+        return False
+    finally:
+        session.close()
+
 
 if __name__ == "__main__":
     # 为了让脚本能运行，需要把根目录加入 sys.path 或者把脚本放在根目录下运行
     # 这里假设用户在根目录下运行： python backend/crawler.py
+    # 补抓历史缺失日期: python backend/crawler.py --backfill
     import sys
     sys.path.append(os.getcwd())
-    
-    link, title, date_val = get_latest_excel_link()
-    if link:
-        # 检查是否已经下载过（可选，这里强制更新）
-        download_and_process(link, title, date_val)
-    else:
-        print("没有可处理的任务。")
+
+    try:
+        if "--backfill" in sys.argv[1:]:
+            backfill()
+        else:
+            run()
+    finally:
+        # 把 WAL 合并回 exam.db 再退出, 提交的数据库文件才是完整的
+        close_pool()
@@ -1,271 +1,926 @@
 import sqlite3
 import os
+import json
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 import pandas as pd
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "data", "exam.db")
 
+# Connection pool settings
+POOL_SIZE = 8             # max connections open at the same time
+POOL_TIMEOUT = 30.0       # seconds to wait for a free connection
+# Cached COUNT(*) results for filtered listings, valid for one data version
+TOTAL_CACHE_SIZE = 512
+_total_cache = OrderedDict()
+_total_cache_lock = threading.Lock()
+_total_cache_version = None
+# VM instructions between checks of a cancel_scope() event
+CANCEL_CHECK_STEPS = 10000
+
+_cancel_scope = threading.local()
+
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA cache_size=-65536",      # 64 MB page cache
+    "PRAGMA mmap_size=268435456",    # 256 MB memory-mapped I/O
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+
+class PooledConnection(sqlite3.Connection):
+    """sqlite3 connection whose close() hands it back to the pool"""
+    pool = None
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.release(self)
+        else:
+            super().close()
+
+    def _really_close(self):
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    """Bounded pool of reusable, pre-tuned SQLite connections"""
+
+    def __init__(self, db_path, size=POOL_SIZE, timeout=POOL_TIMEOUT):
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {"created": 0, "reused": 0, "released": 0, "waits": 0, "timeouts": 0, "peak_in_use": 0}
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, factory=PooledConnection, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        conn = self._checkout()
+        event = getattr(_cancel_scope, "event", None)
+        if event is not None:
+            # SQLite polls the handler every N VM steps and aborts the statement
+            # with "interrupted" once it returns True
+            conn.set_progress_handler(event.is_set, CANCEL_CHECK_STEPS)
+        return conn
+
+    def _checkout(self):
+        with self._cond:
+            while not self._idle and self._open >= self.size:
+                self._stats["waits"] += 1
+                if not self._cond.wait(self.timeout):
+                    self._stats["timeouts"] += 1
+                    raise TimeoutError(f"No free database connection after {self.timeout}s")
+            if self._idle:
+                conn = self._idle.pop()
+                self._stats["reused"] += 1
+            else:
+                conn = None
+                self._open += 1
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._open - len(self._idle))
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._open -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._stats["created"] += 1
+        return conn
+
+    def release(self, conn):
+        try:
+            conn.set_progress_handler(None, 0)
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            conn._really_close()
+            with self._cond:
+                self._open -= 1
+                self._cond.notify()
+            return
+        with self._cond:
+            if conn in self._idle:
+                return
+            self._idle.append(conn)
+            self._stats["released"] += 1
+            self._cond.notify()
+
+    def close_all(self, checkpoint=False):
+        """Close idle connections (e.g. before replacing the database file).
+
+        With checkpoint=True the WAL is first folded back into the database
+        file and truncated, so exam.db is complete on its own afterwards.
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        if checkpoint:
+            if not idle:
+                idle.append(self._connect())
+            idle[0].execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        for conn in idle:
+            conn._really_close()
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "size": self.size,
+                "open": self._open,
+                "idle": len(self._idle),
+                "in_use": self._open - len(self._idle),
+            }
+
+
+_pool = ConnectionPool(DB_PATH)
+
+
+@contextmanager
+def cancel_scope(event):
+    """Connections acquired on this thread inside the block abort their
+    running statement once `event` (a threading.Event) is set."""
+    previous = getattr(_cancel_scope, "event", None)
+    _cancel_scope.event = event
+    try:
+        yield
+    finally:
+        _cancel_scope.event = previous
+
+
 def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+    """Borrow a pooled connection; conn.close() returns it to the pool"""
+    return _pool.acquire()
+
+
+@contextmanager
+def db_connection():
+    """Context manager form of get_db_connection that always releases the connection"""
+    conn = _pool.acquire()
+    try:
+        yield conn
+    finally:
+        _pool.release(conn)
+
+
+def get_pool_stats():
+    return _pool.stats()
+
+
+def close_pool():
+    """Checkpoint the WAL and close pooled connections; call at the end of
+    scripts that write exam.db so no changes are left behind in exam.db-wal"""
+    _pool.close_all(checkpoint=True)
+
+
+def use_database(path):
+    """Point the pool at another database file (scripts, benchmarks)"""
+    global DB_PATH, _pool
+    _pool.close_all()
+    DB_PATH = path
+    _pool = ConnectionPool(path)
 
 def init_db():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Position table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS positions (
-        code TEXT PRIMARY KEY,
-        name TEXT,
-        org TEXT,
-        unit TEXT,
-        quota INTEGER,
-        city TEXT,
-        district TEXT,
-        education TEXT,
-        degree TEXT,
-        major_pg TEXT,
-        major_ug TEXT,
-        target TEXT,
-        notes TEXT,
-        intro TEXT
-    )
-    """)
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    # Application statistics table
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS applications (
-        code TEXT,
-        date TEXT,
-        applicants INTEGER,
-        passed INTEGER,
-        PRIMARY KEY (code, date)
-    )
-    """)
+        # Position table
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS positions (
+            code TEXT PRIMARY KEY,
+            name TEXT,
+            org TEXT,
+            unit TEXT,
+            quota INTEGER,
+            city TEXT,
+            district TEXT,
+            education TEXT,
+            degree TEXT,
+            major_pg TEXT,
+            major_ug TEXT,
+            target TEXT,
+            notes TEXT,
+            intro TEXT
+        )
+        """)
     
-    conn.commit()
+        # Application statistics table
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS applications (
+            code TEXT,
+            date TEXT,
+            applicants INTEGER,
+            passed INTEGER,
+            PRIMARY KEY (code, date)
+        )
+        """)
     
-    # Check for migration
-    _migrate_db(conn)
+        conn.commit()
     
-    conn.close()
+        # Bring the schema up to date
+        run_migrations(conn)
+
+def _add_target_column(conn):
+    columns = [row['name'] for row in conn.execute("PRAGMA table_info(positions)").fetchall()]
+    if 'target' not in columns:
+        conn.execute("ALTER TABLE positions ADD COLUMN target TEXT")
+        conn.execute("UPDATE positions SET target = ''")
+
+
+# Columns covered by keyword search, in positions_fts column order
+SEARCH_COLUMNS = ('code', 'name', 'org', 'unit', 'city', 'district', 'education', 'degree',
+                  'major_pg', 'major_ug', 'target', 'intro', 'notes')
+# bm25 column weights: matches in code / name / org / unit rank above matches in long text
+FTS_WEIGHTS = "10.0, 5.0, 3.0, 3.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 1.0, 0.5, 0.5"
+# The trigram tokenizer cannot match anything shorter than 3 characters
+FTS_MIN_KEYWORD = 3
+
 
-def _migrate_db(conn):
-    """Check and update schema if needed"""
+def _create_positions_fts(conn):
     try:
-        cursor = conn.cursor()
-        
-        # Check positions table columns
-        cursor.execute("PRAGMA table_info(positions)")
-        columns = [row['name'] for row in cursor.fetchall()]
-        
-        if 'positions' in [t[0] for t in cursor.execute("SELECT name FROM sqlite_master WHERE type='table'").fetchall()]:
-             if 'target' not in columns:
-                print("Migrating schema: Adding 'target' column to positions table...")
-                cursor.execute("ALTER TABLE positions ADD COLUMN target TEXT")
-                cursor.execute("UPDATE positions SET target = ''")
-                conn.commit()
-    except Exception as e:
-        print(f"Schema migration warning: {e}")
+        conn.execute(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS positions_fts USING fts5(
+            {', '.join(SEARCH_COLUMNS)},
+            content='positions', tokenize='trigram'
+        )
+        """)
+    except sqlite3.OperationalError as e:
+        print(f"Full-text search unavailable ({e}), keyword search falls back to LIKE")
+        return
+    rebuild_positions_fts(conn)
 
-def save_positions(df):
-    """Save/update positions from dataframe"""
-    conn = get_db_connection()
-    # Ensure codes are strings and remove any trailing .0 from Excel conversion
-    df['code'] = df['职位代码'].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
-    
-    # Mapping
-    data = []
-    for _, row in df.iterrows():
-        # Skip invalid codes
-        if row['code'].lower() == 'nan':
+
+def rebuild_positions_fts(conn):
+    """Re-index positions_fts from the positions table (call inside the writing transaction)"""
+    if has_fts(conn):
+        conn.execute("INSERT INTO positions_fts(positions_fts) VALUES('rebuild')")
+
+
+# Per-date rollups of positions x applications: table -> (group columns, GROUP BY expression).
+# Each row holds positions, quota, applicants and passed for one group on one date, with
+# the same semantics as positions LEFT JOIN applications ON date; rollup_date holds the
+# day's totals, where applicants / passed sum every applications row like /stats/summary.
+ROLLUP_GROUPS = {
+    "rollup_city": ("city", "p.city"),
+    "rollup_district": ("city, district", "p.city, p.district"),
+    "rollup_education": ("education", "p.education"),
+}
+
+
+def _create_rollups(conn):
+    for table, (columns, _) in ROLLUP_GROUPS.items():
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            date TEXT, {', '.join(f'{c} TEXT' for c in columns.split(', '))},
+            positions INTEGER, quota INTEGER, applicants INTEGER, passed INTEGER,
+            PRIMARY KEY (date, {columns})
+        )
+        """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_date (
+        date TEXT PRIMARY KEY, positions INTEGER, quota INTEGER, applicants INTEGER, passed INTEGER
+    )
+    """)
+    refresh_rollups(conn)
+
+
+def _create_ingest_ledger(conn):
+    # source_hash: SHA-256 of the downloaded file; rows_hash: hash of the stored rows.
+    # Existing dates get their rows_hash from the table, so an identical re-download short-circuits.
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_ledger (
+        date TEXT PRIMARY KEY, source_hash TEXT, rows_hash TEXT, updated_at TEXT
+    )
+    """)
+    for (date,) in conn.execute("SELECT DISTINCT date FROM applications").fetchall():
+        rows = pd.read_sql_query(
+            "SELECT code, applicants, passed FROM applications WHERE date = ?", conn, params=[date]
+        )
+        conn.execute(
+            "INSERT OR REPLACE INTO ingest_ledger (date, rows_hash, updated_at) VALUES (?, ?, datetime('now'))",
+            (date, _rows_hash(rows)),
+        )
+
+
+def refresh_rollups(conn, dates=None):
+    """Recompute the rollups of the given report dates (all of them when None); call
+    inside the writing transaction so readers never see them disagree with the data"""
+    if dates is None:
+        conn.execute("DELETE FROM rollup_date")
+        for table in ROLLUP_GROUPS:
+            conn.execute(f"DELETE FROM {table}")
+        dates = [row[0] for row in conn.execute("SELECT DISTINCT date FROM applications")]
+    for date in dates:
+        for table, (columns, group) in ROLLUP_GROUPS.items():
+            conn.execute(f"DELETE FROM {table} WHERE date = ?", (date,))
+            conn.execute(f"""
+            INSERT INTO {table} (date, {columns}, positions, quota, applicants, passed)
+            SELECT ?, {group}, COUNT(p.code), SUM(p.quota),
+                   SUM(COALESCE(a.applicants, 0)), SUM(COALESCE(a.passed, 0))
+            FROM positions p
+            LEFT JOIN applications a ON p.code = a.code AND a.date = ?
+            GROUP BY {group}
+            """, (date, date))
+        conn.execute("DELETE FROM rollup_date WHERE date = ?", (date,))
+        conn.execute("""
+        INSERT INTO rollup_date (date, positions, quota, applicants, passed)
+        SELECT ?, (SELECT COUNT(*) FROM positions), (SELECT SUM(quota) FROM positions),
+               SUM(applicants), SUM(passed)
+        FROM applications WHERE date = ?
+        GROUP BY date
+        """, (date, date))
+
+
+def has_fts(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'positions_fts'"
+    ).fetchone() is not None
+
+
+def fts_phrase(keyword):
+    """Quote a keyword as a single FTS5 phrase so it is matched as a literal substring"""
+    return '"' + keyword.replace('"', '""') + '"'
+
+
+# Versioned schema migrations: (version, description, step).
+# A step is either a list of SQL statements or a callable taking the connection.
+# Each step runs once in its own transaction and records its version in PRAGMA user_version.
+MIGRATIONS = [
+    (1, "add positions.target", _add_target_column),
+    (2, "indexes for date, region and filter queries", [
+        # Covers MAX(date), DISTINCT date, SUM(...) WHERE date = ? and GROUP BY date
+        "CREATE INDEX IF NOT EXISTS idx_applications_date ON applications (date, code, applicants, passed)",
+        # city = ? lookups and per-city GROUP BY district
+        "CREATE INDEX IF NOT EXISTS idx_positions_city_district ON positions (city, district)",
+        "CREATE INDEX IF NOT EXISTS idx_positions_district ON positions (district)",
+        # DISTINCT education / degree / target for the filter lists
+        "CREATE INDEX IF NOT EXISTS idx_positions_education ON positions (education)",
+        "CREATE INDEX IF NOT EXISTS idx_positions_degree ON positions (degree)",
+        "CREATE INDEX IF NOT EXISTS idx_positions_target ON positions (target)",
+    ]),
+    (3, "trigram full-text index for keyword search", _create_positions_fts),
+    (4, "data version counter", [
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)",
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('data_version', 1)",
+    ]),
+    (5, "per-scope data versions for incremental export", [
+        # 'version:positions' and one 'version:<report date>' counter per applications date
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('version:positions', 1)",
+        "INSERT OR IGNORE INTO meta (key, value) SELECT 'version:' || date, 1 FROM applications GROUP BY date",
+    ]),
+    (6, "per-date rollup tables maintained at ingest", _create_rollups),
+    (7, "ingest ledger of source file and row hashes per report date", _create_ingest_ledger),
+    (8, "random database id for export fingerprints", [
+        # Scope versions restart at 1 in a rebuilt database; the id tells the export apart
+        "INSERT OR IGNORE INTO meta (key, value) VALUES ('db_id', abs(random() % 1000000000000000))",
+    ]),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def run_migrations(conn):
+    """Apply pending migrations in order"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, step in MIGRATIONS:
+        if version <= current:
             continue
-            
-        data.append((
-            row['code'],
-            row.get('职位名称', ''),
-            row.get('招录机关', ''),
-            row.get('用人单位', ''),
-            int(row.get('招录人数', 1)),
-            row.get('城市', '未知'),
-            row.get('区县', '其他'),
-            row.get('学历', ''),
-            row.get('学位', ''),
-            row.get('研究生专业', ''),
-            row.get('本科专业', ''),
-            row.get('招录对象', ''),
-            row.get('备注', ''),
-            row.get('职位简介', '')
-        ))
-    
-    cursor = conn.cursor()
-    cursor.executemany("""
-    INSERT OR REPLACE INTO positions 
-    (code, name, org, unit, quota, city, district, education, degree, major_pg, major_ug, target, notes, intro)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, data)
+        print(f"Migrating schema to v{version}: {description}...")
+        try:
+            conn.execute("BEGIN")
+            if callable(step):
+                step(conn)
+            else:
+                for sql in step:
+                    conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        current = version
+    return current
+
+def get_data_version(conn):
+    """Monotonic counter bumped by every write to positions / applications"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'data_version'").fetchone()
+    return row[0] if row else 0
+
+def bump_data_version(conn, *scopes):
+    """Bump the global counter and the counter of each scope ('positions' or a report date)"""
+    conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'data_version'")
+    for scope in scopes:
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET value = value + 1",
+            (f"version:{scope}",),
+        )
+
+def get_scope_versions(conn):
+    """{scope: version} for 'positions' and every report date"""
+    rows = conn.execute("SELECT key, value FROM meta WHERE key LIKE 'version:%'").fetchall()
+    return {key[len("version:"):]: value for key, value in rows}
+
+def get_db_id(conn):
+    """Random id assigned when the database was created (or migrated to v8)"""
+    row = conn.execute("SELECT value FROM meta WHERE key = 'db_id'").fetchone()
+    return row[0] if row else None
+
+# positions column -> (standardized dataframe column, default when the column is missing)
+POSITION_COLUMNS = {
+    'name': ('职位名称', ''),
+    'org': ('招录机关', ''),
+    'unit': ('用人单位', ''),
+    'quota': ('招录人数', 1),
+    'city': ('城市', '未知'),
+    'district': ('区县', '其他'),
+    'education': ('学历', ''),
+    'degree': ('学位', ''),
+    'major_pg': ('研究生专业', ''),
+    'major_ug': ('本科专业', ''),
+    'target': ('招录对象', ''),
+    'notes': ('备注', ''),
+    'intro': ('职位简介', ''),
+}
+
+def _normalize_codes(series):
+    """Ensure codes are strings and remove any trailing .0 from Excel conversion"""
+    return series.astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
+
+def _int_column(df, col, default):
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype='int64')
+    return pd.to_numeric(df[col], errors='coerce').fillna(default).astype('int64')
+
+def _text_column(df, col, default):
+    if col not in df.columns:
+        return pd.Series(default, index=df.index, dtype=object)
+    return df[col].astype(object)
+
+def _changed_rows(new, existing, key, columns):
+    """Rows of `new` that are missing from `existing` or differ in any of `columns`"""
+    merged = new.merge(existing, on=key, how='left', suffixes=('', '_old'), indicator=True)
+    changed = merged['_merge'] == 'left_only'
+    for col in columns:
+        a, b = merged[col], merged[f'{col}_old']
+        same = (a == b) | (a.isna() & b.isna())
+        changed |= ~same.fillna(False).astype(bool)
+    return new[changed.to_numpy()]
+
+def _to_params(frame):
+    """DataFrame -> list of tuples of plain Python values (NaN -> NULL)"""
+    columns = []
+    for col in frame.columns:
+        values = frame[col]
+        if values.dtype == object or not pd.api.types.is_numeric_dtype(values):
+            values = values.astype(object).where(values.notna(), None)
+        columns.append(values.tolist())
+    return list(zip(*columns))
+
+def save_positions(df):
+    """Save/update positions from dataframe; returns the number of rows written"""
+    df['code'] = _normalize_codes(df['职位代码'])
     
-    conn.commit()
-    conn.close()
-
-def save_applications(df, report_date):
-    """Save applications for a specific date"""
-    conn = get_db_connection()
-    # Ensure codes are strings and remove any trailing .0 from Excel conversion
-    df['code'] = df['职位代码'].astype(str).str.replace(r'\.0$', '', regex=True).str.strip()
+    rows = pd.DataFrame({'code': df['code']})
+    for column, (source, default) in POSITION_COLUMNS.items():
+        if column == 'quota':
+            rows[column] = _int_column(df, source, default)
+        else:
+            rows[column] = _text_column(df, source, default)
+    # Skip invalid codes; the last occurrence of a duplicated code wins
+    valid = rows['code'].notna() & (rows['code'].str.lower() != 'nan')
+    rows = rows[valid].drop_duplicates('code', keep='last')
     
-    data = []
-    for _, row in df.iterrows():
-        code = row['code']
-        # Skip invalid codes or "Total" rows
-        if not code or code.lower() == 'nan' or code == '合计':
-            continue
-            
-        data.append((
-            code,
-            report_date,
-            int(row.get('报名人数', 0)),
-            int(row.get('审核通过人数', 0))
-        ))
+    columns = list(POSITION_COLUMNS)
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        existing = pd.read_sql_query(f"SELECT code, {', '.join(columns)} FROM positions", conn)
+        changed = _changed_rows(rows, existing, 'code', columns)
+        if len(changed):
+            conn.executemany(f"""
+            INSERT INTO positions (code, {', '.join(columns)})
+            VALUES ({', '.join(['?'] * (len(columns) + 1))})
+            ON CONFLICT(code) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in columns)}
+            """, _to_params(changed))
+            rebuild_positions_fts(conn)
+            # Position attributes feed the rollups of every date
+            refresh_rollups(conn)
+            bump_data_version(conn, "positions")
+        conn.commit()
+    return len(changed)
+
+def _application_rows(df):
+    """Standardized daily sheet -> the (code, applicants, passed) rows that get stored"""
+    rows = pd.DataFrame({
+        'code': _normalize_codes(df['职位代码']),
+        'applicants': _int_column(df, '报名人数', 0),
+        'passed': _int_column(df, '审核通过人数', 0),
+    })
+    # Skip invalid codes or "Total" rows; the last occurrence of a duplicated code wins
+    valid = rows['code'].notna() & (rows['code'] != '') & (rows['code'].str.lower() != 'nan') & (rows['code'] != '合计')
+    return rows[valid].drop_duplicates('code', keep='last')
+
+def _rows_hash(rows):
+    """Order-independent hash of (code, applicants, passed) rows"""
+    rows = rows.sort_values('code')
+    text = "\n".join(f"{code}\t{applicants}\t{passed}" for code, applicants, passed
+                     in zip(rows['code'], rows['applicants'], rows['passed']))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def daily_rows_hash(df):
+    """Hash of the rows a standardized daily sheet would store; equal hashes mean equal data"""
+    return _rows_hash(_application_rows(df))
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def read_ledger(conn, report_date):
+    """{'source_hash', 'rows_hash'} last ingested for a date, or None"""
+    row = conn.execute(
+        "SELECT source_hash, rows_hash FROM ingest_ledger WHERE date = ?", (report_date,)
+    ).fetchone()
+    return {'source_hash': row[0], 'rows_hash': row[1]} if row else None
+
+def record_source_hash(report_date, source_hash):
+    """A new source file whose rows match the ledger: remember its hash, data untouched"""
+    with db_connection() as conn:
+        conn.execute(
+            "UPDATE ingest_ledger SET source_hash = ?, updated_at = datetime('now') WHERE date = ? AND source_hash IS NOT ?",
+            (source_hash, report_date, source_hash),
+        )
+        conn.commit()
+
+def _write_applications(conn, df, report_date, source_hash=None):
+    """Upsert one date's rows and its ledger entry inside the caller's transaction;
+    returns the number of rows written. Without a source_hash (e.g. /upload/daily) the
+    recorded one is kept while the rows are unchanged and cleared once they differ, since
+    that file no longer matches what is stored."""
+    rows = _application_rows(df)
+    conn.execute("""
+    INSERT INTO ingest_ledger (date, source_hash, rows_hash, updated_at) VALUES (?, ?, ?, datetime('now'))
+    ON CONFLICT(date) DO UPDATE SET
+        source_hash = CASE WHEN excluded.source_hash IS NULL AND rows_hash = excluded.rows_hash
+                           THEN source_hash ELSE excluded.source_hash END,
+        rows_hash = excluded.rows_hash, updated_at = excluded.updated_at
+    WHERE rows_hash IS NOT excluded.rows_hash
+       OR (excluded.source_hash IS NOT NULL AND source_hash IS NOT excluded.source_hash)
+    """, (report_date, source_hash, _rows_hash(rows)))
     
+    existing = pd.read_sql_query(
+        "SELECT code, applicants, passed FROM applications WHERE date = ?", conn, params=[report_date]
+    )
+    changed = _changed_rows(rows, existing, 'code', ['applicants', 'passed'])
+    if len(changed):
+        params = _to_params(changed[['code', 'applicants', 'passed']])
+        conn.executemany("""
+        INSERT OR REPLACE INTO applications (code, date, applicants, passed)
+        VALUES (?, ?, ?, ?)
+        """, [(code, report_date, applicants, passed) for code, applicants, passed in params])
+    return len(changed)
+
+def save_applications(df, report_date, source_hash=None):
+    """Save applications for a specific date; returns the number of rows written.
+    source_hash (content_hash of the downloaded file) goes into the ingest ledger."""
+    return save_applications_batch({report_date: df}, {report_date: source_hash})[report_date]
+
+def save_applications_batch(frames, source_hashes=None):
+    """Save several report dates ({report_date: df}) in one transaction, so readers and
+    the next export see all of them or none; returns {report_date: rows written}"""
+    source_hashes = source_hashes or {}
+    with db_connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        written = {report_date: _write_applications(conn, df, report_date, source_hashes.get(report_date))
+                   for report_date, df in frames.items()}
+        changed = [report_date for report_date, count in written.items() if count]
+        if changed:
+            refresh_rollups(conn, changed)
+            bump_data_version(conn, *changed)
+        conn.commit()
+    return written
+
+def encode_cursor(values):
+    """Opaque `after` token for keyset pagination"""
+    raw = json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+class InvalidCursor(ValueError):
+    """Malformed `after` token, or one from a different listing (e.g. a keyword search)"""
+
+def decode_cursor(token, n_keys):
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw.decode('utf-8'))
+    except (ValueError, UnicodeDecodeError):
+        values = None
+    if not isinstance(values, list) or len(values) != n_keys:
+        raise InvalidCursor("Invalid pagination cursor")
+    return values
+
+def _keyset_condition(order_keys, values):
+    """WHERE clause selecting rows strictly after `values` in ORDER BY `order_keys`"""
+    clauses, params = [], []
+    for i, (expr, direction) in enumerate(order_keys):
+        parts = [f"{e} = ?" for e, _ in order_keys[:i]]
+        parts.append(f"{expr} {'<' if direction == 'DESC' else '>'} ?")
+        clauses.append("(" + " AND ".join(parts) + ")")
+        params.extend(values[:i + 1])
+    return "(" + " OR ".join(clauses) + ")", params
+
+def _cached_total(conn, key, count_query, params):
+    """COUNT(*) for a filtered listing, cached until the data version changes"""
+    global _total_cache_version
+    version = get_data_version(conn)
+    with _total_cache_lock:
+        if version != _total_cache_version:
+            _total_cache.clear()
+            _total_cache_version = version
+        if key in _total_cache:
+            _total_cache.move_to_end(key)
+            return _total_cache[key]
+    total = conn.execute(count_query, params).fetchone()[0]
+    with _total_cache_lock:
+        if version == _total_cache_version:
+            _total_cache[key] = total
+            if len(_total_cache) > TOTAL_CACHE_SIZE:
+                _total_cache.popitem(last=False)
+    return total
+
+# Position records as the API returns them: positions column -> JSON key. The keys are
+# the frontend's field names; district has always been served under its column name.
+POSITION_FIELDS = [
+    ("code", "职位代码"),
+    ("name", "职位名称"),
+    ("org", "招录机关"),
+    ("unit", "用人单位"),
+    ("quota", "招录人数"),
+    ("city", "城市"),
+    ("district", "district"),
+    ("education", "学历"),
+    ("degree", "学位"),
+    ("major_pg", "研究生专业"),
+    ("major_ug", "本科专业"),
+    ("target", "招录对象"),
+    ("notes", "备注"),
+    ("intro", "职位简介"),
+]
+# Per-date stats appended to each record: (SQL expression, JSON key)
+STAT_FIELDS = [
+    ("COALESCE(a.applicants, 0)", "报名人数"),
+    ("COALESCE(a.passed, 0)", "审核通过人数"),
+    ("COALESCE(ROUND(CAST(COALESCE(a.applicants, 0) AS FLOAT) / CASE WHEN p.quota = 0 THEN 1 ELSE p.quota END, 1), '')", "竞争比"),
+]
+
+RECORD_KEYS = [key for _, key in POSITION_FIELDS] + [key for _, key in STAT_FIELDS]
+
+def record_select(with_passed=True):
+    """SELECT list that yields API records directly; NULL columns come back as "" """
+    fields = [f"COALESCE(p.{col}, '') AS \"{key}\"" for col, key in POSITION_FIELDS]
+    fields += [f'{expr} AS "{key}"' for expr, key in STAT_FIELDS if with_passed or key != "审核通过人数"]
+    return ",\n               ".join(fields)
+
+def fetch_records(conn, query, params=()):
+    """Rows as a list of dicts keyed by column name, without building a DataFrame"""
     cursor = conn.cursor()
-    cursor.executemany("""
-    INSERT OR REPLACE INTO applications (code, date, applicants, passed)
-    VALUES (?, ?, ?, ?)
-    """, data)
-    
-    conn.commit()
-    conn.close()
+    cursor.row_factory = None
+    cursor.execute(query, params)
+    keys = [d[0] for d in cursor.description]
+    return [dict(zip(keys, row)) for row in cursor]
 
-def get_positions_with_stats(date=None, city=None, education=None, target=None, keyword=None, district=None, limit=1000, offset=0):
-    """Unified query for positions and stats"""
-    conn = get_db_connection()
+def get_positions_with_stats(date=None, city=None, education=None, target=None, keyword=None, district=None, limit=1000, offset=0, after=None):
+    """Unified query for positions and stats.
+
+    Pages either by `offset` or, when `after` is given, by keyset cursor.
+    Returns (records, total, date, next_after); records use the API field names.
+    """
+    with db_connection() as conn:
     
-    # If date is not provided, get the latest one
-    if not date:
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(date) FROM applications")
-        date = cursor.fetchone()[0]
+        # If date is not provided, get the latest one
+        if not date:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(date) FROM applications")
+            date = cursor.fetchone()[0]
     
-    query = """
-    SELECT p.*, 
-           COALESCE(a.applicants, 0) as applicants, 
-           COALESCE(a.passed, 0) as passed,
-           ROUND(CAST(COALESCE(a.applicants, 0) AS FLOAT) / CASE WHEN p.quota = 0 THEN 1 ELSE p.quota END, 1) as competition_ratio
-    FROM positions p
-    LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    WHERE 1=1
-    """
-    params = [date]
+        query = """
+        SELECT {fields}{rank}
+        FROM positions p
+        LEFT JOIN applications a ON p.code = a.code AND a.date = ?{joins}
+        WHERE 1=1
+        """
+        params = [date]
+        joins = ""
+        rank = ""
+        # Total order: ties on applicants are broken by code so pages never overlap
+        order_keys = [("COALESCE(a.applicants, 0)", "DESC"), ("p.code", "ASC")]
     
-    if city:
-        query += " AND p.city LIKE ?"
-        params.append(f"%{city}%")
-    if district:
-        query += " AND p.district = ?"
-        params.append(district)
-    if education:
-        query += " AND p.education LIKE ?"
-        params.append(f"%{education}%")
-    if target:
-        query += " AND p.target LIKE ?"
-        params.append(f"%{target}%")
-    if keyword:
-        query += """ AND (
-            p.code LIKE ? OR p.name LIKE ? OR p.org LIKE ? OR p.unit LIKE ? OR 
-            p.city LIKE ? OR p.district LIKE ? OR p.education LIKE ? OR p.degree LIKE ? OR
-            p.major_pg LIKE ? OR p.major_ug LIKE ? OR p.target LIKE ? OR 
-            p.intro LIKE ? OR p.notes LIKE ?
-        )"""
-        k = f"%{keyword}%"
-        params.extend([k] * 13)
+        if city:
+            query += " AND p.city LIKE ?"
+            params.append(f"%{city}%")
+        if district:
+            query += " AND p.district = ?"
+            params.append(district)
+        if education:
+            query += " AND p.education LIKE ?"
+            params.append(f"%{education}%")
+        if target:
+            query += " AND p.target LIKE ?"
+            params.append(f"%{target}%")
+        if keyword and len(keyword) >= FTS_MIN_KEYWORD and has_fts(conn):
+            # Trigram index: same substring semantics as LIKE '%kw%', ranked by relevance
+            relevance = f"bm25(positions_fts, {FTS_WEIGHTS})"
+            joins = "\n        JOIN positions_fts ON positions_fts.rowid = p.rowid"
+            rank = f",\n               {relevance} as _rank"
+            query += " AND positions_fts MATCH ?"
+            params.append(fts_phrase(keyword))
+            order_keys.insert(0, (relevance, "ASC"))
+        elif keyword:
+            query += """ AND (
+                p.code LIKE ? OR p.name LIKE ? OR p.org LIKE ? OR p.unit LIKE ? OR 
+                p.city LIKE ? OR p.district LIKE ? OR p.education LIKE ? OR p.degree LIKE ? OR
+                p.major_pg LIKE ? OR p.major_ug LIKE ? OR p.target LIKE ? OR 
+                p.intro LIKE ? OR p.notes LIKE ?
+            )"""
+            k = f"%{keyword}%"
+            params.extend([k] * 13)
+        query = query.format(fields=record_select(), joins=joins, rank=rank)
         
-    # Count total for pagination
-    count_query = f"SELECT COUNT(*) FROM ({query})"
-    cursor = conn.cursor()
-    cursor.execute(count_query, params)
-    total = cursor.fetchone()[0]
+        # Count total for pagination (cached per date + filters)
+        count_query = f"SELECT COUNT(*) FROM ({query})"
+        total = _cached_total(conn, (date, city, district, education, target, keyword), count_query, params)
+    
+        # Keyset pagination: continue after the last row of the previous page
+        if after:
+            condition, cursor_params = _keyset_condition(order_keys, decode_cursor(after, len(order_keys)))
+            query += f" AND {condition}"
+            params.extend(cursor_params)
+            offset = 0
     
-    # Add ordering and limit
-    query += " ORDER BY applicants DESC LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
+        # Add ordering and limit
+        order_by = ", ".join(f"{expr} {direction}" for expr, direction in order_keys)
+        query += f" ORDER BY {order_by} LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
     
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
+        records = fetch_records(conn, query, params)
     
-    return df, total, date
+    next_after = None
+    if len(records) == limit and (after or offset + limit < total):
+        last = records[-1]
+        values = [int(last['报名人数']), str(last['职位代码'])]
+        if rank:
+            values.insert(0, float(last['_rank']))
+        next_after = encode_cursor(values)
+    if rank:
+        for record in records:
+            del record['_rank']
+    
+    return records, total, date, next_after
+
+def latest_report_date(conn):
+    return conn.execute("SELECT MAX(date) FROM rollup_date").fetchone()[0]
+
+def report_dates(conn):
+    """Every report date with application data, ascending"""
+    return [row[0] for row in conn.execute("SELECT date FROM rollup_date ORDER BY date")]
+
+def read_regional_stats(conn, date):
+    """Per-city totals for a date from rollup_city"""
+    df = pd.read_sql_query("""
+    SELECT city as name, positions, quota, applicants, passed
+    FROM rollup_city WHERE date = ? ORDER BY city
+    """, conn, params=[date])
+    if df.empty:
+        # Dates without applications are not rolled up: every position counts 0
+        df = pd.read_sql_query("""
+        SELECT city as name, COUNT(code) as positions, SUM(quota) as quota,
+               0 as applicants, 0 as passed
+        FROM positions GROUP BY city
+        """, conn)
+    return df
+
+def read_wuhan_district_stats(conn, date):
+    """Per-district totals for 武汉市 on a date from rollup_district"""
+    df = pd.read_sql_query("""
+    SELECT district as name, positions, quota, applicants
+    FROM rollup_district WHERE date = ? AND city = '武汉市' ORDER BY district
+    """, conn, params=[date])
+    if df.empty:
+        df = pd.read_sql_query("""
+        SELECT district as name, COUNT(code) as positions, SUM(quota) as quota, 0 as applicants
+        FROM positions WHERE city = '武汉市' GROUP BY district
+        """, conn)
+    return df
 
 def get_regional_stats(date=None):
-    conn = get_db_connection()
-    if not date:
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(date) FROM applications")
-        date = cursor.fetchone()[0]
-        
-    query = """
-    SELECT p.city as name, 
-           COUNT(p.code) as positions, 
-           SUM(p.quota) as quota, 
-           SUM(COALESCE(a.applicants, 0)) as applicants,
-           SUM(COALESCE(a.passed, 0)) as passed
-    FROM positions p
-    LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    GROUP BY p.city
-    """
-    df = pd.read_sql_query(query, conn, params=[date])
-    conn.close()
+    with db_connection() as conn:
+        date = date or latest_report_date(conn)
+        df = read_regional_stats(conn, date)
     return df, date
 
 def get_wuhan_district_stats(date=None):
-    conn = get_db_connection()
-    if not date:
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(date) FROM applications")
-        date = cursor.fetchone()[0]
-        
-    query = """
-    SELECT p.district as name, 
-           COUNT(p.code) as positions, 
-           SUM(p.quota) as quota, 
-           SUM(COALESCE(a.applicants, 0)) as applicants
-    FROM positions p
-    LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    WHERE p.city = '武汉市'
-    GROUP BY p.district
-    """
-    df = pd.read_sql_query(query, conn, params=[date])
-    conn.close()
+    with db_connection() as conn:
+        date = date or latest_report_date(conn)
+        df = read_wuhan_district_stats(conn, date)
     return df, date
 
+def get_trend_cube(conn):
+    """Applicants / passed per (city, district, date) from one grouped pass, as a cube:
+
+        {"dates": [...],
+         "total": {"applicants": [...], "passed": [...]},
+         "cities": {city: {"applicants": [...], "passed": [...],
+                           "districts": {district: {"applicants": [...], "passed": [...]}}}}}
+
+    Series are aligned with dates; null marks a date without application rows for
+    that city / district, which its trend leaves out (as GROUP BY date would).
+    Every city and district with positions is present, applications without a
+    position only count toward the total."""
+    # Grouping by date first lets the covering idx_applications_date drive the scan
+    rows = conn.execute("""
+        SELECT p.city, p.district, a.date, SUM(a.applicants), SUM(a.passed)
+        FROM applications a
+        LEFT JOIN positions p ON a.code = p.code
+        GROUP BY a.date, p.city, p.district
+    """).fetchall()
+    dates = sorted({row[2] for row in rows})
+    column = {date: i for i, date in enumerate(dates)}
+
+    def series():
+        return {"applicants": [None] * len(dates), "passed": [None] * len(dates)}
+
+    def add(node, i, applicants, passed):
+        node["applicants"][i] = (node["applicants"][i] or 0) + (applicants or 0)
+        node["passed"][i] = (node["passed"][i] or 0) + (passed or 0)
+
+    cities = {}
+    for city, district in conn.execute("SELECT DISTINCT city, district FROM positions WHERE city IS NOT NULL AND city != ''"):
+        cities.setdefault(city, {**series(), "districts": {}})["districts"].setdefault(district or "", series())
+
+    total = {"applicants": [0] * len(dates), "passed": [0] * len(dates)}
+    for city, district, date, applicants, passed in rows:
+        i = column[date]
+        add(total, i, applicants, passed)
+        if city:
+            node = cities[city]
+            add(node, i, applicants, passed)
+            add(node["districts"][district or ""], i, applicants, passed)
+    return {"dates": dates, "total": total, "cities": cities}
+
+def trend_records(cube, nodes):
+    """[{date, applicants, passed}] summed over cube nodes, for dates any of them has"""
+    records = []
+    for i, date in enumerate(cube["dates"]):
+        present = [node for node in nodes if node["applicants"][i] is not None]
+        if present:
+            records.append({
+                "date": date,
+                "applicants": sum(node["applicants"][i] for node in present),
+                "passed": sum(node["passed"][i] for node in present),
+            })
+    return records
+
+def city_trend(cube, city):
+    """Trend of the cities matching `p.city LIKE '%city%'`"""
+    needle = city.lower()
+    return trend_records(cube, [node for name, node in cube["cities"].items() if needle in name.lower()])
+
 def get_positions_by_codes(codes, date=None):
-    """Query specific positions by codes with latest stats"""
+    """Query specific positions by codes with latest stats, as API records"""
     if not codes:
-        return pd.DataFrame(), 0, None
+        return [], 0, None
         
-    conn = get_db_connection()
+    with db_connection() as conn:
     
-    if not date:
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(date) FROM applications")
-        date = cursor.fetchone()[0]
+        if not date:
+            cursor = conn.cursor()
+            cursor.execute("SELECT MAX(date) FROM applications")
+            date = cursor.fetchone()[0]
         
-    placeholders = ','.join(['?'] * len(codes))
-    query = f"""
-    SELECT p.*, 
-           COALESCE(a.applicants, 0) as applicants, 
-           COALESCE(a.passed, 0) as passed,
-           ROUND(CAST(COALESCE(a.applicants, 0) AS FLOAT) / CASE WHEN p.quota = 0 THEN 1 ELSE p.quota END, 1) as competition_ratio
-    FROM positions p
-    LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    WHERE p.code IN ({placeholders})
-    ORDER BY applicants DESC
-    """
+        placeholders = ','.join(['?'] * len(codes))
+        query = f"""
+        SELECT {record_select()}
+        FROM positions p
+        LEFT JOIN applications a ON p.code = a.code AND a.date = ?
+        WHERE p.code IN ({placeholders})
+        ORDER BY COALESCE(a.applicants, 0) DESC
+        """
     
-    params = [date] + [str(c) for c in codes]
-    df = pd.read_sql_query(query, conn, params=params)
-    conn.close()
+        params = [date] + [str(c) for c in codes]
+        records = fetch_records(conn, query, params)
     
-    return df, len(df), date
+    return records, len(records), date
 
@@ -1,397 +1,584 @@
-import sqlite3
 import pandas as pd
 import json
 import os
+import re
+import sys
 import datetime
+import hashlib
+import sqlite3
+import struct
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from database import (
+    db_connection, get_db_id, get_scope_versions, get_trend_cube, trend_records,
+    read_regional_stats, read_wuhan_district_stats,
+)
+from columnar import encode_columns
+from compression import COMPRESS_MIN_BYTES, SUFFIXES, available_encodings, compress
 
 # Configuration
-DB_PATH = os.path.join(os.path.dirname(__file__), "data", "exam.db")
 OUTPUT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "frontend", "public", "data"))
+# Input fingerprint of every artifact from the last export, used to skip unchanged ones
+MANIFEST_FILE = "export_manifest.json"
+
+# Granular trends: shard count (codes are hashed into shards) and index file. 32 keeps
+# a .bin shard at ~7 KB for 5k positions x 6 dates (~22 KB at 30 dates) while each new date
+# rewrites 32 files plus their .gz/.br siblings rather than 64.
+TREND_SHARDS = 32
+TREND_INDEX_FILE = "trends_index.json"
+# Superseded granular trend layouts, deleted on export: the monolithic file and JSON shards
+LEGACY_TREND_FILES = re.compile(r'^trends_(granular|shard_\d+)\.json(\.gz|\.br)?$')
+
+# Exporters running at the same time
+EXPORT_WORKERS = 4
 
 # Ensure output directory exists
 os.makedirs(OUTPUT_DIR, exist_ok=True)
 
-def get_db_connection():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    return conn
+# Files written by the current thread since its last reset ({filename: content hash}),
+# so export_all can record each exporter's outputs
+_written = threading.local()
+_manifest_lock = threading.Lock()
+# Content hash of every file as of the last export, so identical output is not
+# rewritten or recompressed
+_content_hashes = {}
+
+
+class ExportSnapshot:
+    """Point-in-time in-memory copy of the database (sqlite backup API), taken once per
+    export run so every artifact reflects the same data even if an upload lands
+    mid-run. Shared inputs (report dates, scope versions) are read from it once."""
+
+    def __init__(self):
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._lock = threading.Lock()
+        with db_connection() as conn:
+            conn.backup(self._db)
+        self.versions = get_scope_versions(self._db)
+        self.db_id = get_db_id(self._db)
+        # Report dates, oldest first
+        self.dates = [r[0] for r in self._db.execute("SELECT DISTINCT date FROM applications ORDER BY date")]
+        self.latest_date = self.dates[-1] if self.dates else None
+
+    def connect(self):
+        """Private in-memory clone of the snapshot, so exporters in different threads
+        query in parallel instead of serializing on one connection"""
+        conn = sqlite3.connect(":memory:")
+        with self._lock:
+            self._db.backup(conn)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @contextmanager
+    def connection(self):
+        conn = self.connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        self._db.close()
+
+def _write_bytes(filename, data):
+    """Atomically replace OUTPUT_DIR/filename: write a temp file beside it, then rename,
+    so readers (and the static site) never see a half-written file."""
+    path = os.path.join(OUTPUT_DIR, filename)
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{filename}.", suffix=".tmp", dir=OUTPUT_DIR)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def _compressed_names(filename, size):
+    """{encoding: sibling filename} an artifact of this size should have"""
+    if size < COMPRESS_MIN_BYTES:
+        return {}
+    return {encoding: filename + SUFFIXES[encoding] for encoding in available_encodings()}
+
+def _write_compressed(filename, body):
+    """Write .gz / .br siblings for a large artifact and drop stale ones; logs size,
+    ratio and time per encoding"""
+    siblings = _compressed_names(filename, len(body))
+    for encoding, suffix in SUFFIXES.items():
+        if encoding not in siblings and os.path.exists(os.path.join(OUTPUT_DIR, filename + suffix)):
+            os.unlink(os.path.join(OUTPUT_DIR, filename + suffix))
+    report = []
+    for encoding, name in siblings.items():
+        start = time.perf_counter()
+        data = compress(body, encoding, static=True)
+        _write_bytes(name, data)
+        report.append(f"{encoding} {len(data) / len(body):.1%} in {(time.perf_counter() - start) * 1000:.0f} ms")
+    if report:
+        print(f"  - {filename}: {len(body)} B, " + ", ".join(report))
+
+def write_json(filename, payload, indent=None, precompress=True):
+    return write_artifact(filename, json.dumps(payload, ensure_ascii=False, indent=indent).encode('utf-8'), precompress)
+
+def write_artifact(filename, body, precompress=True):
+    """Write an artifact (atomically) plus its precompressed siblings; returns its
+    content hash. Output identical to the last export is left untouched."""
+    digest = hashlib.sha256(body).hexdigest()[:16]
+    names = [filename, *(_compressed_names(filename, len(body)).values() if precompress else [])]
+    unchanged = _content_hashes.get(filename) == digest and all(
+        os.path.exists(os.path.join(OUTPUT_DIR, name)) for name in names)
+    if not unchanged:
+        _write_bytes(filename, body)
+        if precompress:
+            _write_compressed(filename, body)
+    files = getattr(_written, "files", None)
+    if files is not None:
+        files[filename] = digest
+    return digest
 
-def export_summary():
+def load_manifest():
+    try:
+        with open(os.path.join(OUTPUT_DIR, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_manifest(manifest):
+    with _manifest_lock:
+        manifest = dict(manifest)
+    write_json(MANIFEST_FILE, manifest, indent=2, precompress=False)
+
+def _fingerprint(snap, scopes):
+    """Input fingerprint: the database id and the data version of each scope ('positions'
+    or a report date) read. Versions restart at 1 when the database is rebuilt (migrate.py),
+    so the id keeps a rebuilt database from matching an older manifest."""
+    if snap.versions is None:
+        return None
+    return ";".join([f"db={snap.db_id}"] + [f"{scope}={snap.versions.get(scope, 0)}" for scope in scopes])
+
+def _is_fresh(manifest, key, fingerprint):
+    entry = manifest.get(key) if manifest is not None else None
+    return (
+        entry is not None
+        and entry["fingerprint"] == fingerprint
+        and all(os.path.exists(os.path.join(OUTPUT_DIR, name)) for name in entry["files"])
+    )
+
+def _record(manifest, key, fingerprint, files):
+    """files: {filename: content hash} of everything the artifact wrote"""
+    if manifest is not None:
+        with _manifest_lock:
+            manifest[key] = {"fingerprint": fingerprint, "files": files}
+
+def export_summary(snap):
     print("Exporting summary...")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get latest date
-    cursor.execute("SELECT MAX(date) FROM applications")
-    latest_date = cursor.fetchone()[0]
-    
-    if not latest_date:
-        print("No data found!")
-        return
-
-    # Total stats for latest date
-    cursor.execute("""
-        SELECT COUNT(p.code) as total_positions, 
-               SUM(p.quota) as total_quota,
-               SUM(a.applicants) as total_applicants,
-               SUM(a.passed) as total_passed
+    with snap.connection() as conn:
+        cursor = conn.cursor()
+        latest_date = snap.latest_date
+    
+        if not latest_date:
+            print("No data found!")
+            return
+
+        # Total stats for latest date, summed over the per-city rollup
+        cursor.execute("""
+            SELECT SUM(positions) as total_positions, 
+                   SUM(quota) as total_quota,
+                   SUM(applicants) as total_applicants,
+                   SUM(passed) as total_passed
+            FROM rollup_city WHERE date = ?
+        """, (latest_date,))
+        row = cursor.fetchone()
+    
+        summary = {
+            "total_positions": row['total_positions'] or 0,
+            "total_quota": row['total_quota'],
+            "total_applicants": row['total_applicants'] or 0,
+            "total_passed": row['total_passed'] or 0,
+            "date": latest_date,
+            "daily_files": snap.dates
+        }
+    
+    write_json("summary.json", summary, indent=2)
+
+def export_trend(snap):
+    """trend_cube.json (city x district x date totals from one grouped pass), plus the
+    global trend.json and one trend_<city>.json per city as views over it"""
+    print("Exporting trend...")
+    with snap.connection() as conn:
+        cube = get_trend_cube(conn)
+    
+    write_json("trend_cube.json", cube)
+    write_json("trend.json", {"data": trend_records(cube, [cube["total"]])}, indent=2)
+    
+    for city, node in cube["cities"].items():
+        # Chinese file names (trend_武汉市.json) work on modern OS/web servers
+        write_json(f"trend_{city}.json", {"data": trend_records(cube, [node])}, indent=2)
+
+
+def positions_table(df):
+    """Columnar table (same encoder as the API's format=columnar); frontend decodes it with decodeRows"""
+    df = df.fillna("")
+    return encode_columns({col: df[col].tolist() for col in df.columns})
+
+# Static position columns, exported once to CATALOG_FILE in code order
+CATALOG_QUERY = """
+SELECT code as "职位代码", 
+       name as "职位名称", 
+       org as "招录机关", 
+       unit as "用人单位", 
+       quota as "招录人数", 
+       city as "城市", 
+       district as "district",
+       education as "学历", 
+       degree as "学位", 
+       major_pg as "研究生专业", 
+       major_ug as "本科专业", 
+       target as "招录对象", 
+       notes as "备注", 
+       intro as "职位简介"
+FROM positions
+ORDER BY code
+"""
+CATALOG_FILE = "positions_catalog.json"
+# Per-date numeric columns, as arrays aligned with the catalog rows
+COUNT_COLUMNS = ["报名人数", "审核通过人数"]
+# Bumped when the layout of the position files changes, so the manifest treats old ones as stale
+POSITIONS_FORMAT = 2
+
+def catalog_key(codes):
+    """Short hash of the catalog's code order; per-date files carry it so a loader can
+    tell when it holds a catalog they do not line up with"""
+    return hashlib.sha1("\n".join(codes).encode("utf-8")).hexdigest()[:12]
+
+def export_positions(snap, manifest=None):
+    """positions_catalog.json with the static columns of every position, plus one small
+    positions_<date>.json per date (positions.json for the latest) holding only the
+    counts, in catalog order; frontend/src/utils/staticPositions.ts joins them.
+    Given a manifest and scope versions, files whose inputs are unchanged are skipped."""
+    print("Exporting positions...")
+    with snap.connection() as conn:
+        cursor = conn.cursor()
+        dates = snap.dates
+    
+        if not dates:
+            print("No application dates found!")
+            return
+    
+        latest_date = snap.latest_date
+        codes = [r[0] for r in cursor.execute("SELECT code FROM positions ORDER BY code")]
+        key = catalog_key(codes)
+    
+        fingerprint = f"format={POSITIONS_FORMAT};{_fingerprint(snap, ['positions'])}"
+        if not _is_fresh(manifest, CATALOG_FILE, fingerprint):
+            df = pd.read_sql_query(CATALOG_QUERY, conn)
+            data = positions_table(df)
+            digest = write_json(CATALOG_FILE, {"data": data, "catalog": key, "total": data["length"]})
+            _record(manifest, CATALOG_FILE, fingerprint, {CATALOG_FILE: digest})
+            print(f"  - Exported {CATALOG_FILE}")
+    
+        query = """
+        SELECT COALESCE(a.applicants, 0), COALESCE(a.passed, 0)
         FROM positions p
         LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    """, (latest_date,))
-    row = cursor.fetchone()
-    
-    summary = {
-        "total_positions": row['total_positions'],
-        "total_quota": row['total_quota'],
-        "total_applicants": row['total_applicants'] or 0,
-        "total_passed": row['total_passed'] or 0,
-        "date": latest_date,
-        "daily_files": [] # We will populate this from trend query
-    }
-    
-    # Get all available dates for trend/files
-    cursor.execute("SELECT DISTINCT date FROM applications ORDER BY date")
-    dates = [r[0] for r in cursor.fetchall()]
-    summary["daily_files"] = dates
-    
-    with open(os.path.join(OUTPUT_DIR, "summary.json"), 'w', encoding='utf-8') as f:
-        json.dump(summary, f, ensure_ascii=False, indent=2)
-
-def export_trend():
-    print("Exporting trend...")
-    conn = get_db_connection()
-    
-    # 1. Global Trend
-    query = """
-    SELECT date, 
-           SUM(applicants) as applicants, 
-           SUM(passed) as passed
-    FROM applications
-    GROUP BY date
-    ORDER BY date
-    """
-    df = pd.read_sql_query(query, conn)
-    trend_data = df.to_dict(orient='records')
-    
-    with open(os.path.join(OUTPUT_DIR, "trend.json"), 'w', encoding='utf-8') as f:
-        json.dump({"data": trend_data}, f, ensure_ascii=False, indent=2)
-
-    # 2. City-specific Trends
-    # Get all cities first
-    city_cursor = conn.cursor()
-    city_cursor.execute("SELECT DISTINCT city FROM positions WHERE city IS NOT NULL AND city != ''")
-    cities = [r[0] for r in city_cursor.fetchall()]
-    
-    for city in cities:
-        # Query for specific city
-        # Join positions to filter by city, then group by date
-        city_query = """
-        SELECT a.date, 
-               SUM(a.applicants) as applicants, 
-               SUM(a.passed) as passed
-        FROM applications a
-        JOIN positions p ON a.code = p.code
-        WHERE p.city = ?
-        GROUP BY a.date
-        ORDER BY a.date
+        ORDER BY p.code
         """
-        df_city = pd.read_sql_query(city_query, conn, params=(city,))
-        city_trend_data = df_city.to_dict(orient='records')
+    
+        # Export for each date; the latest also goes to 'positions.json' for default/backwards compat
+        for target_date in dates:
+            filename = f"positions_{target_date}.json"
+            targets = [filename] + (["positions.json"] if target_date == latest_date else [])
+            fingerprint = f"format={POSITIONS_FORMAT};{_fingerprint(snap, ['positions', target_date])}"
+            stale = [name for name in targets if not _is_fresh(manifest, name, fingerprint)]
+            if not stale:
+                continue
         
-        # Save to file, e.g., trend_武汉市.json
-        # Check for filename safety if needed, but Chinese usually works on modern OS/web servers
-        filename = f"trend_{city}.json"
-        with open(os.path.join(OUTPUT_DIR, filename), 'w', encoding='utf-8') as f:
-            json.dump({"data": city_trend_data}, f, ensure_ascii=False, indent=2)
+            rows = cursor.execute(query, (target_date,)).fetchall()
+            counts = encode_columns({col: [row[i] for row in rows] for i, col in enumerate(COUNT_COLUMNS)})
+        
+            for name in stale:
+                digest = write_json(name, {"counts": counts, "catalog": key, "date": target_date, "total": len(rows)})
+                _record(manifest, name, fingerprint, {name: digest})
+                print(f"  - Exported {name}")
 
-    conn.close()
 
-def export_positions():
-    print("Exporting positions...")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get all available dates
-    cursor.execute("SELECT DISTINCT date FROM applications ORDER BY date")
-    dates = [r[0] for r in cursor.fetchall()]
-    
-    if not dates:
-        print("No application dates found!")
-        conn.close()
-        return
-    
-    latest_date = dates[-1]
-    
-    # We rename columns here to match what frontend expects locally or mapped in python
-    query = """
-    SELECT p.code as "职位代码", 
-           p.name as "职位名称", 
-           p.org as "招录机关", 
-           p.unit as "用人单位", 
-           p.quota as "招录人数", 
-           p.city as "城市", 
-           p.district as "district",
-           p.education as "学历", 
-           p.degree as "学位", 
-           p.major_pg as "研究生专业", 
-           p.major_ug as "本科专业", 
-           p.target as "招录对象", 
-           p.notes as "备注", 
-           p.intro as "职位简介",
-           COALESCE(a.applicants, 0) as "报名人数", 
-           COALESCE(a.passed, 0) as "审核通过人数"
-    FROM positions p
-    LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    """
-    
-    # Export for each date
-    for target_date in dates:
-        df = pd.read_sql_query(query, conn, params=(target_date,))
-        df['竞争比'] = df.apply(lambda row: round(row['报名人数'] / max(row['招录人数'], 1), 1), axis=1)
-        data = df.fillna("").to_dict(orient='records')
-        
-        # Save per-date file
-        filename = f"positions_{target_date}.json"
-        with open(os.path.join(OUTPUT_DIR, filename), 'w', encoding='utf-8') as f:
-            json.dump({"data": data, "date": target_date, "total": len(data)}, f, ensure_ascii=False)
-        print(f"  - Exported {filename}")
-    
-    # Also save the latest as 'positions.json' for default/backwards compat
-    df = pd.read_sql_query(query, conn, params=(latest_date,))
-    df['竞争比'] = df.apply(lambda row: round(row['报名人数'] / max(row['招录人数'], 1), 1), axis=1)
-    data = df.fillna("").to_dict(orient='records')
-    with open(os.path.join(OUTPUT_DIR, "positions.json"), 'w', encoding='utf-8') as f:
-        json.dump({"data": data, "date": latest_date, "total": len(data)}, f, ensure_ascii=False)
-
-    conn.close()
-
-def export_filters():
+def export_filters(snap):
     print("Exporting filters...")
-    conn = get_db_connection()
+    with snap.connection() as conn:
     
-    # Cities (From main.py map logic + DB distinct)
-    # We will trust DB content since we normalized it
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT city FROM positions WHERE city IS NOT NULL AND city != '' ORDER BY city")
-    cities = [r[0] for r in cursor.fetchall()]
+        # Cities (From main.py map logic + DB distinct)
+        # We will trust DB content since we normalized it
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT city FROM positions WHERE city IS NOT NULL AND city != '' ORDER BY city")
+        cities = [r[0] for r in cursor.fetchall()]
     
-    # Add '省直' if missing and sort (usually handled in DB, but let's ensure '省直' is at top or handled)
-    if "省直" in cities:
-        cities.remove("省直")
-        cities.insert(0, "省直")
+        # Add '省直' if missing and sort (usually handled in DB, but let's ensure '省直' is at top or handled)
+        if "省直" in cities:
+            cities.remove("省直")
+            cities.insert(0, "省直")
     
-    cursor.execute("SELECT DISTINCT education FROM positions WHERE education IS NOT NULL AND education != '' ORDER BY education")
-    education = [r[0] for r in cursor.fetchall()]
+        cursor.execute("SELECT DISTINCT education FROM positions WHERE education IS NOT NULL AND education != '' ORDER BY education")
+        education = [r[0] for r in cursor.fetchall()]
     
-    cursor.execute("SELECT DISTINCT degree FROM positions WHERE degree IS NOT NULL AND degree != '' ORDER BY degree")
-    degree = [r[0] for r in cursor.fetchall()]
+        cursor.execute("SELECT DISTINCT degree FROM positions WHERE degree IS NOT NULL AND degree != '' ORDER BY degree")
+        degree = [r[0] for r in cursor.fetchall()]
 
-    cursor.execute("SELECT DISTINCT target FROM positions WHERE target IS NOT NULL AND target != '' ORDER BY target")
-    targets = [r[0] for r in cursor.fetchall()]
+        cursor.execute("SELECT DISTINCT target FROM positions WHERE target IS NOT NULL AND target != '' ORDER BY target")
+        targets = [r[0] for r in cursor.fetchall()]
     
-    filters = {
-        "cities": cities,
-        "education": education,
-        "degree": degree,
-        "targets": targets
-    }
+        filters = {
+            "cities": cities,
+            "education": education,
+            "degree": degree,
+            "targets": targets
+        }
     
-    with open(os.path.join(OUTPUT_DIR, "filters.json"), 'w', encoding='utf-8') as f:
-        json.dump(filters, f, ensure_ascii=False, indent=2)
+        write_json("filters.json", filters, indent=2)
         
-    conn.close()
 
-def export_maps():
+def export_maps(snap):
     print("Exporting map data...")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT MAX(date) FROM applications")
-    latest_date = cursor.fetchone()[0]
-    
-    # Province Map Data
-    query_prov = """
-    SELECT p.city as name, 
-           COUNT(p.code) as positions, 
-           SUM(p.quota) as quota, 
-           SUM(COALESCE(a.applicants, 0)) as applicants
-    FROM positions p
-    LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    GROUP BY p.city
-    """
-    df_prov = pd.read_sql_query(query_prov, conn, params=(latest_date,))
-    
-    # Wuhan District Data
-    query_wuhan = """
-    SELECT p.district as name, 
-           COUNT(p.code) as positions, 
-           SUM(p.quota) as quota, 
-           SUM(COALESCE(a.applicants, 0)) as applicants
-    FROM positions p
-    LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    WHERE p.city = '武汉市'
-    GROUP BY p.district
-    """
-    df_wuhan = pd.read_sql_query(query_wuhan, conn, params=(latest_date,))
-    
-    # Calculate competition ratios
-    df_prov['competition_ratio'] = (df_prov['applicants'] / df_prov['quota'].replace(0, 1)).round(1)
-    df_wuhan['competition_ratio'] = (df_wuhan['applicants'] / df_wuhan['quota'].replace(0, 1)).round(1)
-    
-    map_data = {
-        "province": df_prov.fillna(0).to_dict(orient='records'),
-        "wuhan": df_wuhan.fillna(0).to_dict(orient='records'),
-        "date": latest_date
-    }
-    
-    with open(os.path.join(OUTPUT_DIR, "map_data.json"), 'w', encoding='utf-8') as f:
-        json.dump(map_data, f, ensure_ascii=False, indent=2)
+    with snap.connection() as conn:
+        latest_date = snap.latest_date
+    
+        # Province and Wuhan district data from the ingest-time rollups
+        df_prov = read_regional_stats(conn, latest_date).drop(columns='passed')
+        df_wuhan = read_wuhan_district_stats(conn, latest_date)
+    
+        # Calculate competition ratios
+        df_prov['competition_ratio'] = (df_prov['applicants'] / df_prov['quota'].replace(0, 1)).round(1)
+        df_wuhan['competition_ratio'] = (df_wuhan['applicants'] / df_wuhan['quota'].replace(0, 1)).round(1)
+    
+        map_data = {
+            "province": df_prov.fillna(0).to_dict(orient='records'),
+            "wuhan": df_wuhan.fillna(0).to_dict(orient='records'),
+            "date": latest_date
+        }
+    
+        write_json("map_data.json", map_data, indent=2)
         
-    conn.close()
 
-def export_surge():
+def export_surge(snap):
     """Export top surge positions (biggest daily increase)"""
     print("Exporting surge data...")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get latest two dates
-    cursor.execute("SELECT DISTINCT date FROM applications ORDER BY date DESC LIMIT 2")
-    dates = [r[0] for r in cursor.fetchall()]
-    
-    if len(dates) < 2:
-        print("Not enough dates for surge calculation, skipping...")
-        # Still create empty file
-        with open(os.path.join(OUTPUT_DIR, "surge.json"), 'w', encoding='utf-8') as f:
-            json.dump({"data": [], "date": dates[0] if dates else None, "prev_date": None}, f, ensure_ascii=False)
-        conn.close()
-        return
-    
-    latest_date = dates[0]
-    prev_date = dates[1]
-    
-    # Query to get delta between two dates
-    query = """
-    SELECT p.code as code,
-           p.name as name,
-           p.unit as unit,
-           p.city as city,
-           p.quota as quota,
-           COALESCE(a_today.applicants, 0) as applicants_today,
-           COALESCE(a_prev.applicants, 0) as applicants_prev,
-           COALESCE(a_today.applicants, 0) - COALESCE(a_prev.applicants, 0) as delta
-    FROM positions p
-    LEFT JOIN applications a_today ON p.code = a_today.code AND a_today.date = ?
-    LEFT JOIN applications a_prev ON p.code = a_prev.code AND a_prev.date = ?
-    ORDER BY delta DESC
-    LIMIT 30
-    """
-    df = pd.read_sql_query(query, conn, params=(latest_date, prev_date))
-    
-    # Filter only positive deltas (actual surges)
-    df = df[df['delta'] > 0]
-    
-    surge_data = df.to_dict(orient='records')
-    
-    # Also calculate for Wuhan specifically
-    query_wuhan = """
-    SELECT p.code as code,
-           p.name as name,
-           p.unit as unit,
-           p.district as district,
-           p.quota as quota,
-           COALESCE(a_today.applicants, 0) as applicants_today,
-           COALESCE(a_prev.applicants, 0) as applicants_prev,
-           COALESCE(a_today.applicants, 0) - COALESCE(a_prev.applicants, 0) as delta
-    FROM positions p
-    LEFT JOIN applications a_today ON p.code = a_today.code AND a_today.date = ?
-    LEFT JOIN applications a_prev ON p.code = a_prev.code AND a_prev.date = ?
-    WHERE p.city = '武汉市'
-    ORDER BY delta DESC
-    LIMIT 20
-    """
-    df_wuhan = pd.read_sql_query(query_wuhan, conn, params=(latest_date, prev_date))
-    df_wuhan = df_wuhan[df_wuhan['delta'] > 0]
-    surge_wuhan = df_wuhan.to_dict(orient='records')
-    
-    result = {
-        "data": surge_data,
-        "wuhan": surge_wuhan,
-        "date": latest_date,
-        "prev_date": prev_date
-    }
-    
-    with open(os.path.join(OUTPUT_DIR, "surge.json"), 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False, indent=2)
-    
-    conn.close()
-
-def export_granular_trend():
-    """Export trends for EACH position (code -> history) for static lookups"""
+    with snap.connection() as conn:
+        # Latest two dates, newest first
+        dates = snap.dates[::-1][:2]
+    
+        if len(dates) < 2:
+            print("Not enough dates for surge calculation, skipping...")
+            # Still create empty file
+            write_json("surge.json", {"data": [], "date": dates[0] if dates else None, "prev_date": None})
+            return
+    
+        latest_date = dates[0]
+        prev_date = dates[1]
+    
+        # Query to get delta between two dates
+        query = """
+        SELECT p.code as code,
+               p.name as name,
+               p.unit as unit,
+               p.city as city,
+               p.quota as quota,
+               COALESCE(a_today.applicants, 0) as applicants_today,
+               COALESCE(a_prev.applicants, 0) as applicants_prev,
+               COALESCE(a_today.applicants, 0) - COALESCE(a_prev.applicants, 0) as delta
+        FROM positions p
+        LEFT JOIN applications a_today ON p.code = a_today.code AND a_today.date = ?
+        LEFT JOIN applications a_prev ON p.code = a_prev.code AND a_prev.date = ?
+        ORDER BY delta DESC
+        LIMIT 30
+        """
+        df = pd.read_sql_query(query, conn, params=(latest_date, prev_date))
+    
+        # Filter only positive deltas (actual surges)
+        df = df[df['delta'] > 0]
+    
+        surge_data = df.to_dict(orient='records')
+    
+        # Also calculate for Wuhan specifically
+        query_wuhan = """
+        SELECT p.code as code,
+               p.name as name,
+               p.unit as unit,
+               p.district as district,
+               p.quota as quota,
+               COALESCE(a_today.applicants, 0) as applicants_today,
+               COALESCE(a_prev.applicants, 0) as applicants_prev,
+               COALESCE(a_today.applicants, 0) - COALESCE(a_prev.applicants, 0) as delta
+        FROM positions p
+        LEFT JOIN applications a_today ON p.code = a_today.code AND a_today.date = ?
+        LEFT JOIN applications a_prev ON p.code = a_prev.code AND a_prev.date = ?
+        WHERE p.city = '武汉市'
+        ORDER BY delta DESC
+        LIMIT 20
+        """
+        df_wuhan = pd.read_sql_query(query_wuhan, conn, params=(latest_date, prev_date))
+        df_wuhan = df_wuhan[df_wuhan['delta'] > 0]
+        surge_wuhan = df_wuhan.to_dict(orient='records')
+    
+        result = {
+            "data": surge_data,
+            "wuhan": surge_wuhan,
+            "date": latest_date,
+            "prev_date": prev_date
+        }
+    
+        write_json("surge.json", result, indent=2)
+    
+
+def trend_shard(code, shards=TREND_SHARDS):
+    """Shard of a position code: 32-bit FNV-1a of its UTF-8 bytes, mod shards.
+    frontend/src/utils/staticTrends.ts computes the same function."""
+    h = 0x811c9dc5
+    for byte in code.encode("utf-8"):
+        h = ((h ^ byte) * 0x01000193) & 0xffffffff
+    return h % shards
+
+def trend_shard_binary(trends, num_dates):
+    """Int32 little-endian encoding of one shard: header [codes, dates, code width],
+    then each code as ASCII padded with NULs to the width (a multiple of 4, so the
+    values stay aligned for an Int32Array), then the codes x dates matrix row by row"""
+    codes = list(trends)
+    width = -(-max((len(code.encode("utf-8")) for code in codes), default=0) // 4) * 4
+    header = struct.pack("<3i", len(codes), num_dates, width)
+    names = b"".join(code.encode("utf-8").ljust(width, b"\0") for code in codes)
+    values = struct.pack(f"<{len(codes) * num_dates}i", *(v for code in codes for v in trends[code]))
+    return header + names + values
+
+def export_granular_trend(snap):
+    """Export trends for EACH position (code -> history) for static lookups, sharded by a
+    hash of the code so a lookup only fetches the few KB holding that code.
+    TREND_INDEX_FILE lists the dates and shard files; each shard is a compact Int32 .bin.
+    Files of the earlier layouts (LEGACY_TREND_FILES) and surplus shards are removed."""
     print("Exporting granular trend data...")
-    conn = get_db_connection()
-    
-    # Check if we have enough data
-    cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT date FROM applications ORDER BY date")
-    dates = [r[0] for r in cursor.fetchall()]
-    
-    if not dates:
-        print("No dates found, skipping granular trend export")
-        conn.close()
-        return
-
-    # We need to build a map: code -> [applicants on date1, applicants on date2, ...]
-    # This could be large, but for ~5000 positions * ~10 days it's fine (~50k integers).
-    # If it gets huge, we might need to split files, but for now single file is OK.
-    
-    query = """
-    SELECT code, date, applicants
-    FROM applications
-    ORDER BY date
-    """
-    df = pd.read_sql_query(query, conn)
-    
-    # Pivot: index=code, columns=date, values=applicants
-    # We want to ensure all dates are present for each code? 
-    # Or just sparse? Frontend needs to align with `dates`.
-    # Let's align with `dates`.
-    
-    if df.empty:
-         trend_map = {}
-    else:
-        pivot = df.pivot(index='code', columns='date', values='applicants').fillna(0).astype(int)
-        # Ensure all columns exist
-        for d in dates:
-            if d not in pivot.columns:
-                pivot[d] = 0
-        
-        # Sort columns by date
-        pivot = pivot[dates]
+    with snap.connection() as conn:
+    
+        dates = snap.dates
+    
+        if not dates:
+            print("No dates found, skipping granular trend export")
+            return
+    
+        query = """
+        SELECT code, date, applicants
+        FROM applications
+        ORDER BY date
+        """
+        df = pd.read_sql_query(query, conn)
+    
+        # Pivot: index=code, columns=date, values=applicants, aligned with `dates`
+        if df.empty:
+             trend_map = {}
+        else:
+            pivot = df.pivot(index='code', columns='date', values='applicants').fillna(0).astype(int)
+            # Ensure all columns exist
+            for d in dates:
+                if d not in pivot.columns:
+                    pivot[d] = 0
         
-        # Convert to dict: code -> list of ints
-        trend_map = pivot.T.to_dict(orient='list')
+            # Sort columns by date
+            pivot = pivot[dates]
         
-    result = {
-        "dates": dates,
-        "trends": trend_map
-    }
-    
-    with open(os.path.join(OUTPUT_DIR, "trends_granular.json"), 'w', encoding='utf-8') as f:
-        json.dump(result, f, ensure_ascii=False) # remove indent for size
+            # Convert to dict: code -> list of ints
+            trend_map = pivot.T.to_dict(orient='list')
+    
+        shards = [{} for _ in range(TREND_SHARDS)]
+        for code in sorted(trend_map):
+            shards[trend_shard(code)][code] = trend_map[code]
+    
+        files = []
+        for i, trends in enumerate(shards):
+            name = f"trends_shard_{i:02d}"
+            write_artifact(f"{name}.bin", trend_shard_binary(trends, len(dates)))
+            files.append(name)
+    
+        write_json(TREND_INDEX_FILE, {
+            "dates": dates,
+            "hash": "fnv1a32",
+            "shards": TREND_SHARDS,
+            "files": files,
+        })
+
+        current = {f"{name}.bin" for name in files}
+        for filename in os.listdir(OUTPUT_DIR):
+            shard = re.match(r'^(trends_shard_\d+\.bin)(\.gz|\.br)?$', filename)
+            if LEGACY_TREND_FILES.match(filename) or (shard and shard.group(1) not in current):
+                os.unlink(os.path.join(OUTPUT_DIR, filename))
+                print(f"  - Removed {filename}")
         
-    conn.close()
 
-def export_all():
-    """Execute all export functions"""
+# Artifacts besides the per-date position files: (manifest key, exporter, scopes it reads
+# given the sorted report dates). Exporters writing several files are tracked as one.
+ARTIFACTS = [
+    ("summary", export_summary, lambda dates: ["positions", *dates]),
+    ("trend", export_trend, lambda dates: ["positions", *dates]),
+    ("filters", export_filters, lambda dates: ["positions"]),
+    ("maps", export_maps, lambda dates: ["positions", *dates[-1:]]),
+    ("surge", export_surge, lambda dates: ["positions", *dates[-2:]]),
+    ("granular_trend", export_granular_trend, lambda dates: dates),
+]
+
+def _run_stage(func, *args):
+    """Run one exporter, returning (files it wrote, seconds taken)"""
+    _written.files = {}
+    start = time.perf_counter()
+    try:
+        func(*args)
+        return _written.files, time.perf_counter() - start
+    finally:
+        _written.files = None
+
+def export_all(force=False, timings=None):
+    """Regenerate the artifacts whose inputs changed since the last export (all with force=True).
+    Stale exporters run in parallel against one ExportSnapshot; seconds per stage are
+    printed and, if a dict is passed as timings, stored in it."""
+    timings = {} if timings is None else timings
     try:
         print(f"Exporting static data to {OUTPUT_DIR}...")
-        export_summary()
-        export_trend()
-        export_positions()
-        export_filters()
-        export_maps()
-        export_surge()
-        export_granular_trend()
+        run_start = time.perf_counter()
+        stage_start = time.perf_counter()
+        snap = ExportSnapshot()
+        timings["snapshot"] = time.perf_counter() - stage_start
+        manifest = {} if force else load_manifest()
+        _content_hashes.clear()
+        for entry in manifest.values():
+            if isinstance(entry.get("files"), dict):
+                _content_hashes.update(entry["files"])
+    
+        try:
+            with ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix="export") as pool:
+                # (manifest key, fingerprint, future); export_positions records its own files
+                stages = [("positions", None, pool.submit(_run_stage, export_positions, snap, manifest))]
+                for key, exporter, scopes in ARTIFACTS:
+                    fingerprint = _fingerprint(snap, scopes(snap.dates))
+                    if _is_fresh(manifest, key, fingerprint):
+                        print(f"Skipping {key} (up to date)")
+                        continue
+                    stages.append((key, fingerprint, pool.submit(_run_stage, exporter, snap)))
+            
+                # Record each artifact once it is written, so one failing stage keeps the others' work
+                failures = []
+                for key, fingerprint, future in stages:
+                    try:
+                        files, timings[key] = future.result()
+                    except Exception as e:
+                        failures.append(f"{key}: {e}")
+                        continue
+                    if key != "positions":
+                        _record(manifest, key, fingerprint, files)
+                    save_manifest(manifest)
+        finally:
+            snap.close()
+    
+        timings["total"] = time.perf_counter() - run_start
+        for key, seconds in timings.items():
+            print(f"  {key:<16} {seconds * 1000:8.1f} ms")
+        if failures:
+            raise RuntimeError("; ".join(failures))
         print("Static data export completed!")
         return True
     except Exception as e:
@@ -399,4 +586,4 @@ def export_all():
         return False
 
 if __name__ == "__main__":
-    export_all()
+    export_all(force="--force" in sys.argv[1:])
@@ -0,0 +1,184 @@
+"""
+Background publishing for uploads.
+
+An upload parses the sheet and writes SQLite inside the request, then hands a Job
+to the JobQueue and returns its id. One worker thread does everything that follows
+a write: it rebuilds the in-memory snapshot and runs the static export. Uploads
+arriving while the worker is busy, or within COALESCE_DELAY of each other, are
+published together by a single export. That export reads the latest committed data,
+so it covers every write in the batch, and only one export ever runs at a time.
+
+Each job records its stages (status and seconds), including the per-artifact
+timings of export_all; GET /jobs/{id} returns Job.to_dict().
+"""
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Seconds the worker waits for more uploads before publishing a batch
+COALESCE_DELAY = 0.5
+# Finished jobs kept for /jobs lookups (oldest dropped first)
+JOBS_KEPT = 200
+
+
+class Job:
+    def __init__(self, job_id, kind):
+        self.id = job_id
+        self.kind = kind
+        self.status = "running"   # running -> queued -> publishing -> done / failed
+        self.created = time.time()
+        self.finished = None
+        self.error = None
+        self.stats = None
+        self.batch = [job_id]     # ids of the jobs published by the same export
+        self.stages = OrderedDict()
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage; an exception marks the stage and the job failed and propagates"""
+        entry = self.stages[name] = {"status": "running", "seconds": None}
+        start = time.perf_counter()
+        try:
+            yield entry
+        except Exception as e:
+            entry["status"] = "failed"
+            entry["error"] = str(e)
+            self.fail(f"{name}: {e}")
+            raise
+        finally:
+            entry["seconds"] = round(time.perf_counter() - start, 4)
+        entry["status"] = "done"
+
+    def queue_stage(self, name):
+        self.stages[name] = {"status": "queued", "seconds": None}
+
+    def fail(self, error):
+        self.status = "failed"
+        self.error = error
+        self.finished = time.time()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "created": self.created,
+            "finished": self.finished,
+            "error": self.error,
+            "stats": self.stats,
+            "batch": self.batch,
+            "stages": {name: dict(entry) for name, entry in self.stages.items()},
+        }
+
+
+def publish(timings):
+    """What follows a write: reload the snapshot, then regenerate stale static artifacts"""
+    from snapshot import refresh_snapshot
+    from export_static import export_all
+
+    start = time.perf_counter()
+    refresh_snapshot()
+    timings["snapshot_reload"] = time.perf_counter() - start
+    if not export_all(timings=timings):
+        raise RuntimeError("static export failed")
+
+
+class JobQueue:
+    """Single background writer: publishes queued jobs in coalesced batches"""
+
+    PUBLISH_STAGES = ("snapshot", "export")
+
+    def __init__(self, publish=publish, coalesce_delay=COALESCE_DELAY):
+        self._publish = publish
+        self._delay = coalesce_delay
+        self._jobs = OrderedDict()
+        self._pending = []
+        self._cond = threading.Condition()
+        self._ids = itertools.count(1)
+        self._worker = None
+        self.batches = 0
+
+    def create(self, kind):
+        with self._cond:
+            job = Job(f"{int(time.time())}-{next(self._ids)}", kind)
+            self._jobs[job.id] = job
+            while len(self._jobs) > JOBS_KEPT:
+                self._jobs.popitem(last=False)
+            return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def submit(self, job):
+        """Queue a job whose write is committed; returns immediately"""
+        with self._cond:
+            job.status = "queued"
+            for name in self.PUBLISH_STAGES:
+                job.queue_stage(name)
+            self._pending.append(job)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="job-worker", daemon=True)
+                self._worker.start()
+            self._cond.notify()
+
+    def _next_batch(self):
+        with self._cond:
+            while not self._pending:
+                self._cond.wait()
+            # Keep collecting while uploads keep arriving
+            while True:
+                count = len(self._pending)
+                self._cond.wait(self._delay)
+                if len(self._pending) == count:
+                    break
+            batch, self._pending = self._pending, []
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            self.batches += 1
+            ids = [job.id for job in batch]
+            for job in batch:
+                job.status = "publishing"
+                job.batch = ids
+                for name in self.PUBLISH_STAGES:
+                    job.stages[name]["status"] = "running"
+            timings = {}
+            error = None
+            try:
+                self._publish(timings)
+            except Exception as e:
+                error = str(e)
+            self._finish(batch, timings, error)
+
+    def _finish(self, batch, timings, error):
+        reload_seconds = timings.pop("snapshot_reload", None)
+        export = {key: round(seconds, 4) for key, seconds in timings.items()}
+        snapshot = {"status": "done", "seconds": round(reload_seconds, 4)} if reload_seconds is not None \
+            else {"status": "failed", "seconds": None, "error": error}
+        if reload_seconds is None:
+            export_stage = {"status": "skipped", "seconds": None}
+        else:
+            export_stage = {"status": "failed" if error else "done", "seconds": export.get("total"),
+                            "artifacts": export}
+            if error:
+                export_stage["error"] = error
+        for job in batch:
+            job.stages["snapshot"] = dict(snapshot)
+            job.stages["export"] = dict(export_stage)
+            if error:
+                job.fail(error)
+            else:
+                job.status = "done"
+                job.finished = time.time()
+
+    def stats(self):
+        with self._cond:
+            return {"pending": len(self._pending), "batches": self.batches, "jobs": len(self._jobs)}
+
+
+jobs = JobQueue()
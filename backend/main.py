@@ -6,18 +6,43 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+import numpy as np
 import pandas as pd
 from datetime import date, datetime
+from functools import lru_cache
 import os
 import json
+import tempfile
+import threading
 from typing import Optional, List
 import re
-from database import init_db, save_positions, save_applications, get_positions_with_stats, get_regional_stats, get_wuhan_district_stats, get_db_connection, get_positions_by_codes as db_get_positions_by_codes
+from database import init_db, save_positions, save_applications, db_connection, get_pool_stats, RECORD_KEYS, get_positions_by_codes as db_get_positions_by_codes, city_trend, get_regional_stats, get_wuhan_district_stats, InvalidCursor, report_dates, close_pool
+from columnar import encode_columnar
+from region_matcher import RegionNormalizer
+from sheet_cache import load_standardized
+from snapshot import get_snapshot, refresh_snapshot, query_positions
+from response_cache import response_cache_middleware, get_cache_stats, forget_data_version
+from async_db import offload, run_db
+from jobs import jobs
 
 # 初始化数据库
 init_db()
 
-app = FastAPI(title="湖北省公务员考试报名数据可视化")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 启动时把职位与报名数据加载为内存快照
+    await run_db(refresh_snapshot, timeout=None)
+    yield
+    # 退出时把 WAL 合并回 exam.db
+    close_pool()
+
+
+app = FastAPI(title="湖北省公务员考试报名数据可视化", lifespan=lifespan)
+
+# GET 响应按 (路由, 参数, 数据版本) 缓存并带 ETag, 按 Accept-Encoding 压缩 (br/gzip); 先注册, 使 CORS 包在外层
+app.middleware("http")(response_cache_middleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -83,74 +108,63 @@ CITY_DISTRICT_MAP = {
     "神农架林区": ["神农架"]
 }
 
+# 匹配规则编译为一个多模式自动机, 见 region_matcher.py
+_region_normalizer = RegionNormalizer(CITY_DISTRICT_MAP)
+
+
 def normalize_city_and_district(org_name: str, raw_city: str = None, raw_district: str = None):
     """
     规整化城市和区县信息
     返回 (city, district)
     """
-    org = str(org_name) if not pd.isna(org_name) else ""
-    city = str(raw_city) if not pd.isna(raw_city) else ""
-    district = str(raw_district) if not pd.isna(raw_district) else ""
-    
-    # 1. 识别省直
-    if "省" in org[:4] or org.startswith("省") or city == "省直":
-        return "省直", "其他"
-    
-    # 2. 如果原始城市名已经在 CITY_DISTRICT_MAP 的 key 里，保持原样
-    if city in CITY_DISTRICT_MAP:
-        # 如果 raw_city 是武汉市，但 raw_district 为空，尝试从 org 提取
-        if not district or district == "其他":
-            for d in CITY_DISTRICT_MAP[city]:
-                if d in org:
-                    district = d
+    return _region_normalizer.normalize(org_name, raw_city, raw_district)
+
+
+# 标准化后的紧凑类型: 低基数文本列用 category, 人数用 int32
+CATEGORY_COLUMNS = ['城市', '区县', '学历', '招录对象']
+COUNT_DTYPE = 'int32'
+
+
+@lru_cache(maxsize=64)
+def _resolve_position_columns(header: tuple) -> tuple:
+    """
+    职位表表头 → ((标准字段, 源列序号), ...)
+    精确匹配优先 (后出现的同名映射覆盖), 否则取第一个包含该字段名的列;
+    每种表头只解析一次
+    """
+    plan = {}
+    for orig_col, std_col in POSITION_FIELD_MAP.items():
+        if orig_col in header:
+            plan[std_col] = header.index(orig_col)
+        elif std_col not in plan:
+            for i, actual_col in enumerate(header):
+                if orig_col in actual_col:
+                    plan[std_col] = i
                     break
-        return city, district or "其他"
-
-    # 3. 如果 org 或 city 中包含明确的市名
-    for main_city in CITY_DISTRICT_MAP.keys():
-        short_city = main_city.replace("市", "").replace("州", "").replace("林区", "")
-        if short_city in city or short_city in org:
-            # 进一步细化区县
-            for d in CITY_DISTRICT_MAP[main_city]:
-                if d in district or d in org or d in city:
-                    return main_city, d
-            return main_city, district or "其他"
-            
-    # 4. 反向搜索：如果 org, city, district 中包含任何已知的区县关键词
-    for main_city, districts in CITY_DISTRICT_MAP.items():
-        for d in districts:
-            # 先尝试全名匹配
-            if d in org or d in city or d in district:
-                 return main_city, d
-            # 再尝试去后缀匹配（仅限长度 >= 2 的词，防止误伤，如“房”县不宜去后缀匹配）
-            short_d = d.replace("区", "").replace("县", "").replace("市", "")
-            if len(short_d) >= 2:
-                if short_d in org or short_d in city or short_d in district:
-                    return main_city, d
-                    
-    # 5. 特殊处理：以“市”开头的机关（通常是武汉市直）
-    if org.startswith("市") or city.startswith("市"):
-        return "武汉市", "市直"
-        
-    # 6. 最后保底模糊识别
-    if "武汉" in org or "武汉" in city: return "武汉市", "市直"
-    if "黄石" in org: return "黄石市", "其他"
-    if "十堰" in org: return "十堰市", "其他"
-    if "宜昌" in org: return "宜昌市", "其他"
-    if "襄阳" in org: return "襄阳市", "其他"
-    if "荆门" in org: return "荆门市", "其他"
-    if "荆州" in org: return "荆州市", "其他"
-    if "黄冈" in org: return "黄冈市", "其他"
-    if "孝感" in org: return "孝感市", "其他"
-    if "咸宁" in org: return "咸宁市", "其他"
-    if "随州" in org: return "随州市", "其他"
-    if "恩施" in org: return "恩施土家族苗族自治州", "其他"
-    if "仙桃" in org or "仙桃" in city: return "仙桃市", "仙桃"
-    if "潜江" in org or "潜江" in city: return "潜江市", "潜江"
-    if "天门" in org or "天门" in city: return "天门市", "天门"
-    if "神农架" in org or "神农架" in city: return "神农架林区", "神农架"
-    
-    return city or "未知", district or "其他"
+    return tuple(plan.items())
+
+
+@lru_cache(maxsize=64)
+def _resolve_daily_columns(header: tuple) -> tuple:
+    """每日报名表表头 → ((标准字段, 源列序号), ...), 同一字段取最后一个匹配列"""
+    plan = {}
+    for i, col in enumerate(header):
+        if '职位代码' in col:
+            plan['职位代码'] = i
+        elif '报考人数' in col or '报名人数' in col:
+            plan['报名人数'] = i
+        elif '审核' in col and '人数' in col:
+            plan['审核通过人数'] = i
+    return tuple(plan.items())
+
+
+def _count_column(values: pd.Series, default: int) -> pd.Series:
+    """人数列 → int32; 取值重复度高, 只对去重后的取值做数值转换"""
+    codes, uniques = pd.factorize(values)
+    numbers = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').fillna(default)
+    # 缺失值的 code 为 -1, 取到末尾的默认值
+    lookup = np.append(numbers.to_numpy(dtype='float64'), default)
+    return pd.Series(lookup[codes], index=values.index).astype(COUNT_DTYPE)
 
 
 def standardize_position_df(df: pd.DataFrame) -> pd.DataFrame:
@@ -158,175 +172,183 @@ def standardize_position_df(df: pd.DataFrame) -> pd.DataFrame:
     # 清理列名（去除空格、换行符）
     df.columns = [str(c).strip() for c in df.columns]
     
-    # 创建新的标准化DataFrame
-    std_df = pd.DataFrame()
+    # 1. 按表头解析字段映射 (缓存), 整列取出
+    plan = _resolve_position_columns(tuple(df.columns))
+    std_df = pd.DataFrame({std_col: df.iloc[:, i] for std_col, i in plan}, index=df.index)
     
-    # 1. 尝试直接映射已知字段
-    for orig_col, std_col in POSITION_FIELD_MAP.items():
-        if orig_col in df.columns:
-            std_df[std_col] = df[orig_col]
-        # 模糊匹配
-        else:
-            for actual_col in df.columns:
-                if orig_col in actual_col and std_col not in std_df.columns:
-                    std_df[std_col] = df[actual_col]
-                    break
-    
-    # 2. 特殊处理：如果 std_df 还是缺某些关键列，从 df 中同名列补充
-    for col in ['职位代码', '招录机关', '用人单位', '职位名称', '招录人数', '学历', '学位', '城市', '区县']:
-        if col not in std_df.columns and col in df.columns:
-            std_df[col] = df[col]
-
-    # 3. 确保关键字段存在
+    # 2. 确保关键字段存在
     if '职位代码' not in std_df.columns:
         std_df['职位代码'] = range(1, len(df) + 1)
     
     if '招录人数' not in std_df.columns:
-        std_df['招录人数'] = 1
+        std_df['招录人数'] = pd.Series(1, index=std_df.index, dtype=COUNT_DTYPE)
     else:
-        std_df['招录人数'] = pd.to_numeric(std_df['招录人数'], errors='coerce').fillna(1)
-    
-    # 4. 提取或填充城市信息
-    std_df['norm_info'] = std_df.apply(
-        lambda x: normalize_city_and_district(
-            x.get('招录机关', ''), 
-            x.get('城市', None), 
-            x.get('区县', None)
-        ), axis=1
+        std_df['招录人数'] = _count_column(std_df['招录人数'], 1)
+    
+    # 3. 提取或填充城市信息
+    missing = pd.Series([None] * len(std_df), index=std_df.index)
+    std_df['城市'], std_df['区县'] = _region_normalizer.normalize_many(
+        std_df.get('招录机关', pd.Series([''] * len(std_df), index=std_df.index)),
+        std_df.get('城市', missing),
+        std_df.get('区县', missing),
     )
     
-    std_df['城市'] = std_df['norm_info'].apply(lambda x: x[0])
-    std_df['区县'] = std_df['norm_info'].apply(lambda x: x[1])
-    std_df.drop(columns=['norm_info'], inplace=True)
-    
-    # 6. 处理专业字段合并
+    # 4. 专业字段 (表头里的“专业”已映射为本科专业)
     if '研究生专业' not in std_df.columns:
         std_df['研究生专业'] = ""
     if '本科专业' not in std_df.columns:
-        # 如果有名为“专业”的列，当作本科专业
-        if '专业' in df.columns:
-            std_df['本科专业'] = df['专业']
-        else:
-            std_df['本科专业'] = ""
+        std_df['本科专业'] = ""
+    
+    for col in CATEGORY_COLUMNS:
+        if col in std_df.columns:
+            std_df[col] = std_df[col].astype('category')
             
     return std_df
 
 
 def standardize_daily_df(df: pd.DataFrame) -> pd.DataFrame:
     """标准化每日报名数据字段"""
-    std_df = pd.DataFrame()
-    
     # 检查是否需要跳过标题行（第一行是中文描述）
-    if df.columns[0].startswith('湖北省') or '统计表' in str(df.columns[0]):
+    if str(df.columns[0]).startswith('湖北省') or '统计表' in str(df.columns[0]):
         # 使用第一行数据作为列名
         df.columns = df.iloc[0]
         df = df.iloc[1:].reset_index(drop=True)
     
-    # 映射字段
-    for col in df.columns:
-        if '职位代码' in str(col):
-            std_df['职位代码'] = df[col]
-        elif '报考人数' in str(col) or '报名人数' in str(col):
-            std_df['报名人数'] = pd.to_numeric(df[col], errors='coerce').fillna(0)
-        elif '审核' in str(col) and '人数' in str(col):
-            std_df['审核通过人数'] = pd.to_numeric(df[col], errors='coerce').fillna(0)
+    # 映射字段 (按表头缓存)
+    std_df = pd.DataFrame(index=df.index)
+    for std_col, i in _resolve_daily_columns(tuple(str(c) for c in df.columns)):
+        if std_col == '职位代码':
+            std_df[std_col] = df.iloc[:, i]
+        else:
+            std_df[std_col] = _count_column(df.iloc[:, i], 0)
     
     if '审核通过人数' not in std_df.columns:
-        std_df['审核通过人数'] = 0
+        std_df['审核通过人数'] = pd.Series(0, index=std_df.index, dtype=COUNT_DTYPE)
     
     return std_df
 
 
+def render_rows(records, fmt):
+    """format=columnar 时返回列式表 (列名只出现一次, 低基数字段字典编码), 否则返回行数组"""
+    if fmt == "columnar":
+        return encode_columnar(records, RECORD_KEYS)
+    return records
+
+
 @app.get("/")
 async def root():
     return {"message": "湖北省公务员考试报名数据可视化API"}
 
 
+# 同一时刻只有一个上传在写备份与数据库, 发布 (快照与静态导出) 交给后台任务队列
+_upload_lock = threading.Lock()
+
+
+def _write_backup(std_df: pd.DataFrame, path: str):
+    """先写临时文件再替换, 备份文件不会是半成品"""
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".xlsx")
+    os.close(fd)
+    try:
+        std_df.to_excel(tmp, index=False)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
 @app.post("/upload/positions")
-async def upload_positions(file: UploadFile = File(...)):
-    """上传职位表并同步到数据库"""
+@offload(timeout=None)
+def upload_positions(file: UploadFile = File(...)):
+    """上传职位表并写入数据库; 静态数据由后台任务更新, 进度见 /jobs/{job_id}"""
+    job = jobs.create("positions")
     try:
-        df = pd.read_excel(file.file, dtype=str)
-        
-        # 标准化字段
-        std_df = standardize_position_df(df)
+        # 解析并标准化 (同一文件再次上传时直接读缓存)
+        with job.stage("parse"):
+            std_df = load_standardized(file.file, standardize_position_df)
         
-        # 保存到 Excel (备份)
-        std_df.to_excel(POSITION_FILE, index=False)
-        
-        # 保存到数据库
-        save_positions(std_df)
+        with _upload_lock:
+            # 保存到 Excel (备份)
+            with job.stage("backup"):
+                _write_backup(std_df, POSITION_FILE)
+            
+            # 保存到数据库
+            with job.stage("save"):
+                save_positions(std_df)
+        forget_data_version()
         
         # 获取基本统计
-        stats = {
+        job.stats = {
             "total_positions": len(std_df),
             "total_quota": int(std_df['招录人数'].sum()),
             "columns": list(std_df.columns),
             "cities": sorted(std_df['城市'].unique().tolist()),
         }
         
-        # 触发静态数据导出
-        try:
-            from export_static import export_all
-            export_all()
-        except Exception as e:
-            print(f"Warning: Static export failed: {e}")
-            
-        return {"status": "success", "message": "职位表上传并入库成功，静态数据已更新", "stats": stats}
+        # 快照刷新与静态导出在后台进行
+        jobs.submit(job)
+        return {"status": "success", "message": "职位表上传并入库成功，静态数据正在后台更新",
+                "stats": job.stats, "job_id": job.id}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"上传失败: {str(e)}")
 
 
 @app.post("/upload/daily")
-async def upload_daily(
+@offload(timeout=None)
+def upload_daily(
     file: UploadFile = File(...),
     report_date: Optional[str] = Query(None, description="报名日期 YYYY-MM-DD, 默认今天")
 ):
-    """上传每日报名数据并同步到数据库"""
+    """上传每日报名数据并写入数据库; 静态数据由后台任务更新, 进度见 /jobs/{job_id}"""
+    job = jobs.create("daily")
     try:
         if report_date is None:
             report_date = date.today().isoformat()
         
-        df = pd.read_excel(file.file, dtype=str)
-        
-        # 标准化字段
-        std_df = standardize_daily_df(df)
-        
-        # 保存到 Excel (备份)
-        daily_path = os.path.join(DAILY_DIR, f"{report_date}.xlsx")
-        std_df.to_excel(daily_path, index=False)
+        # 解析并标准化 (同一文件再次上传时直接读缓存)
+        with job.stage("parse"):
+            std_df = load_standardized(file.file, standardize_daily_df)
         
-        # 保存到数据库
-        save_applications(std_df, report_date)
+        with _upload_lock:
+            # 保存到 Excel (备份)
+            with job.stage("backup"):
+                _write_backup(std_df, os.path.join(DAILY_DIR, f"{report_date}.xlsx"))
+            
+            # 保存到数据库
+            with job.stage("save"):
+                save_applications(std_df, report_date)
+        forget_data_version()
         
-        stats = {
+        job.stats = {
             "date": report_date,
             "total_positions": len(std_df),
             "total_applicants": int(std_df['报名人数'].sum()),
         }
         
-        # 触发静态数据导出
-        try:
-            from export_static import export_all
-            export_all()
-        except Exception as e:
-            print(f"Warning: Static export failed: {e}")
-
-        return {"status": "success", "message": f"{report_date} 报名数据上传并入库成功，静态数据已更新", "stats": stats}
+        # 快照刷新与静态导出在后台进行
+        jobs.submit(job)
+        return {"status": "success", "message": f"{report_date} 报名数据上传并入库成功，静态数据正在后台更新",
+                "stats": job.stats, "job_id": job.id}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"上传失败: {str(e)}")
 
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """上传任务状态: 各阶段 (parse/backup/save/snapshot/export) 的状态与耗时"""
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在或已过期")
+    return job.to_dict()
+
+
 @app.get("/stats/dates")
-async def get_available_dates():
+@offload()
+def get_available_dates():
     """获取所有可用的报名数据日期列表"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT date FROM applications ORDER BY date ASC")
-        dates = [row[0] for row in cursor.fetchall()]
-        conn.close()
-        return dates
+        # rollup_date 每个日期一行, 不必扫描 applications 的日期索引
+        with db_connection() as conn:
+            return report_dates(conn)
     except Exception as e:
         print(f"Error fetching dates from DB: {e}")
         # Fallback to file system if DB fails
@@ -337,63 +359,53 @@ async def get_available_dates():
 
 
 @app.get("/positions")
-async def get_positions(
+@offload()
+def get_positions(
     city: Optional[str] = None,
     education: Optional[str] = None,
     target: Optional[str] = None,
     keyword: Optional[str] = None,
     date: Optional[str] = None,
     page: int = 1,
-    page_size: int = 50
+    page_size: int = 50,
+    after: Optional[str] = None,
+    fmt: Optional[str] = Query(None, alias="format", description="records (默认) 或 columnar")
 ):
-    """从数据库获取职位列表"""
+    """从数据库获取职位列表 (传入 after 游标时按游标翻页, 忽略 page)"""
     try:
         limit = page_size
         offset = (page - 1) * page_size
         
-        df, total, actual_date = get_positions_with_stats(
+        records, total, actual_date, next_after = query_positions(
             date=date, 
             city=city, 
             education=education, 
             target=target,
             keyword=keyword, 
             limit=limit, 
-            offset=offset
+            offset=offset,
+            after=after
         )
         
-        # 兼容前端字段名
-        result_df = df.rename(columns={
-            'code': '职位代码',
-            'name': '职位名称',
-            'org': '招录机关',
-            'unit': '用人单位',
-            'quota': '招录人数',
-            'city': '城市',
-            'education': '学历',
-            'degree': '学位',
-            'major_pg': '研究生专业',
-            'major_ug': '本科专业',
-            'target': '招录对象',
-            'notes': '备注',
-            'intro': '职位简介',
-            'applicants': '报名人数',
-            'passed': '审核通过人数',
-            'competition_ratio': '竞争比'
-        })
-        
+        # 记录已由 SQL 别名生成前端字段名
         return {
-            "data": result_df.fillna("").to_dict(orient='records'),
+            "data": render_rows(records, fmt),
             "total": total,
             "page": page,
             "page_size": page_size,
-            "date": actual_date
+            "date": actual_date,
+            "next_after": next_after
         }
+    except InvalidCursor as e:
+        # 格式错误或不属于本次查询的游标 (例如去掉 keyword 后沿用搜索结果的游标)
+        raise HTTPException(status_code=400, detail=f"{e}, 请从第一页重新查询")
     except Exception as e:
-        return {"data": [], "total": 0, "message": f"查询失败: {str(e)}"}
+        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
 @app.get("/stats/by-region")
-async def get_stats_by_region(date: Optional[str] = None):
+@offload()
+def get_stats_by_region(date: Optional[str] = None):
     """从数据库获取地区统计数据"""
     try:
         df, actual_date = get_regional_stats(date=date)
@@ -403,11 +415,12 @@ async def get_stats_by_region(date: Optional[str] = None):
             "date": actual_date
         }
     except Exception as e:
-        return {"cities": [], "message": f"查询失败: {str(e)}"}
+        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
 @app.get("/stats/wuhan-districts")
-async def get_wuhan_districts(date: Optional[str] = None):
+@offload()
+def get_wuhan_districts(date: Optional[str] = None):
     """从数据库获取武汉区县统计"""
     try:
         df, actual_date = get_wuhan_district_stats(date=date)
@@ -426,131 +439,106 @@ async def get_wuhan_districts(date: Optional[str] = None):
             "date": actual_date
         }
     except Exception as e:
-        return {"data": [], "message": f"查询失败: {str(e)}"}
+        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
 @app.get("/positions/wuhan")
-async def get_wuhan_positions(
+@offload()
+def get_wuhan_positions(
     district: Optional[str] = None,
     keyword: Optional[str] = None,
     date: Optional[str] = None,
     page: int = 1,
-    page_size: int = 50
+    page_size: int = 50,
+    after: Optional[str] = None,
+    fmt: Optional[str] = Query(None, alias="format", description="records (默认) 或 columnar")
 ):
     """从数据库获取武汉详细职位列表"""
     try:
         limit = page_size
         offset = (page - 1) * page_size
         
-        df, total, actual_date = get_positions_with_stats(
+        records, total, actual_date, next_after = query_positions(
             date=date,
             city="武汉市",
             district=district,
             keyword=keyword,
             limit=limit,
-            offset=offset
+            offset=offset,
+            after=after
         )
         
-        result_df = df.rename(columns={
-            'code': '职位代码',
-            'name': '职位名称',
-            'org': '招录机关',
-            'unit': '用人单位',
-            'quota': '招录人数',
-            'city': '城市',
-            'education': '学历',
-            'degree': '学位',
-            'major_pg': '研究生专业',
-            'major_ug': '本科专业',
-            'target': '招录对象',
-            'notes': '备注',
-            'intro': '职位简介',
-            'applicants': '报名人数',
-            'passed': '审核通过人数',
-            'competition_ratio': '竞争比'
-        })
         
         return {
-            "data": result_df.fillna("").to_dict(orient='records'),
+            "data": render_rows(records, fmt),
             "total": total,
             "page": page,
             "page_size": page_size,
-            "date": actual_date
+            "date": actual_date,
+            "next_after": next_after
         }
+    except InvalidCursor as e:
+        # 格式错误或不属于本次查询的游标 (例如去掉 keyword 后沿用搜索结果的游标)
+        raise HTTPException(status_code=400, detail=f"{e}, 请从第一页重新查询")
     except Exception as e:
-        return {"data": [], "total": 0, "message": f"查询失败: {str(e)}"}
+        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
 @app.post("/positions/by-codes")
-async def get_positions_by_codes(codes: List[str]):
+@offload()
+def get_positions_by_codes(
+    codes: List[str],
+    fmt: Optional[str] = Query(None, alias="format", description="records (默认) 或 columnar")
+):
     """根据职位代码列表查询职位详情 (从数据库查询)"""
     # 去重
     unique_codes = list(set(codes))
     if not unique_codes:
-        return {"data": [], "total": 0, "not_found": [], "latest_date": None}
+        return {"data": render_rows([], fmt), "total": 0, "not_found": [], "latest_date": None}
     
     try:
-        df, total, actual_date = db_get_positions_by_codes(unique_codes)
-        
-        # 兼容前端字段名
-        result_df = df.rename(columns={
-            'code': '职位代码',
-            'name': '职位名称',
-            'org': '招录机关',
-            'unit': '用人单位',
-            'quota': '招录人数',
-            'city': '城市',
-            'education': '学历',
-            'degree': '学位',
-            'major_pg': '研究生专业',
-            'major_ug': '本科专业',
-            'target': '招录对象',
-            'notes': '备注',
-            'intro': '职位简介',
-            'applicants': '报名人数',
-            'passed': '审核通过人数',
-            'competition_ratio': '竞争比'
-        })
+        # 记录已由 SQL 别名生成前端字段名
+        records, total, actual_date = db_get_positions_by_codes(unique_codes)
         
         # 找出未找到的职位代码
-        found_codes = set(df['code'].tolist())
+        found_codes = {r['职位代码'] for r in records}
         not_found = [c for c in unique_codes if c not in found_codes]
         
         return {
-            "data": result_df.fillna("").to_dict(orient='records'),
+            "data": render_rows(records, fmt),
             "total": total,
             "not_found": not_found,
             "latest_date": actual_date
         }
     except Exception as e:
-        return {"data": [], "total": 0, "not_found": unique_codes, "message": f"查询失败: {str(e)}"}
+        raise HTTPException(status_code=500, detail=f"查询失败: {str(e)}")
 
 
 @app.post("/positions/trend-by-codes")
-async def get_trend_by_codes(codes: List[str]):
+@offload()
+def get_trend_by_codes(codes: List[str]):
     """获取指定职位代码列表的多日报名趋势数据"""
     unique_codes = list(set(codes))
     if not unique_codes:
         return {"positions": [], "dates": []}
     
-    conn = get_db_connection()
-    
-    # 1. Get position names
-    placeholders = ',' .join(['?'] * len(unique_codes))
-    query_pos = f"SELECT code, name FROM positions WHERE code IN ({placeholders})"
-    df_pos = pd.read_sql_query(query_pos, conn, params=unique_codes)
-    pos_map = dict(zip(df_pos['code'], df_pos['name']))
-    
-    # 2. Get applications data
-    # We need to make sure we query for these codes and group by date
-    query_app = f"""
-        SELECT code, date, applicants 
-        FROM applications 
-        WHERE code IN ({placeholders})
-        ORDER BY date
-    """
-    df_app = pd.read_sql_query(query_app, conn, params=unique_codes)
-    conn.close()
+    with db_connection() as conn:
+    
+        # 1. Get position names
+        placeholders = ',' .join(['?'] * len(unique_codes))
+        query_pos = f"SELECT code, name FROM positions WHERE code IN ({placeholders})"
+        df_pos = pd.read_sql_query(query_pos, conn, params=unique_codes)
+        pos_map = dict(zip(df_pos['code'], df_pos['name']))
+    
+        # 2. Get applications data
+        # We need to make sure we query for these codes and group by date
+        query_app = f"""
+            SELECT code, date, applicants 
+            FROM applications 
+            WHERE code IN ({placeholders})
+            ORDER BY date
+        """
+        df_app = pd.read_sql_query(query_app, conn, params=unique_codes)
     
     if df_app.empty:
          return {"positions": [], "dates": [], "message": "暂无报名数据"}
@@ -599,162 +587,91 @@ async def get_trend_by_codes(codes: List[str]):
 
 
 @app.get("/stats/trend")
-async def get_trend(
+@offload()
+def get_trend(
     position_code: Optional[str] = None,
     city: Optional[str] = None
 ):
     """获取报名趋势数据"""
-    conn = get_db_connection()
-    
-    if position_code:
-        # Single position trend
-        query = """
-        SELECT date, applicants, passed
-        FROM applications
-        WHERE code = ?
-        ORDER BY date
-        """
-        df = pd.read_sql_query(query, conn, params=[str(position_code)])
-        
-    elif city:
-        # City trend (sum of all positions in city)
-        # Verify join efficiency; if slow, might need optimization, but dataset is small (~5k positions)
-        query = """
-        SELECT a.date, 
-               SUM(a.applicants) as applicants, 
-               SUM(a.passed) as passed
-        FROM applications a
-        JOIN positions p ON a.code = p.code
-        WHERE p.city LIKE ?
-        GROUP BY a.date
-        ORDER BY a.date
-        """
-        df = pd.read_sql_query(query, conn, params=[f"%{city}%"])
-        
-    else:
-        # Global trend
-        query = """
-        SELECT date, 
-               SUM(applicants) as applicants, 
-               SUM(passed) as passed
-        FROM applications
-        GROUP BY date
-        ORDER BY date
-        """
-        df = pd.read_sql_query(query, conn)
-        
-    conn.close()
+    if city and not position_code:
+        # 城市趋势取自快照中的趋势立方体 (与静态导出的 trend_cube.json 同源);
+        # city 与原 SQL 一样按 LIKE '%city%' 匹配
+        return {"data": city_trend(get_snapshot().trend_cube, city)}
+
+    with db_connection() as conn:
+        if position_code:
+            # Single position trend
+            query = """
+            SELECT date, applicants, passed
+            FROM applications
+            WHERE code = ?
+            ORDER BY date
+            """
+            df = pd.read_sql_query(query, conn, params=[str(position_code)])
+        else:
+            # 全省趋势: 入库时维护的每日汇总
+            query = "SELECT date, applicants, passed FROM rollup_date ORDER BY date"
+            df = pd.read_sql_query(query, conn)
     
     return {"data": df.fillna(0).to_dict(orient='records')}
 
 
 @app.get("/stats/hot-positions")
-async def get_hot_positions(limit: int = 10, date: Optional[str] = None):
+@offload()
+def get_hot_positions(limit: int = 10, date: Optional[str] = None):
     """从数据库获取热门岗位"""
-    df, total, actual_date = get_positions_with_stats(date=date, limit=limit)
-    result_df = df.rename(columns={
-        'code': '职位代码',
-        'name': '职位名称',
-        'org': '招录机关',
-        'unit': '用人单位',
-        'quota': '招录人数',
-        'city': '城市',
-        'education': '学历',
-        'degree': '学位',
-        'major_pg': '研究生专业',
-        'major_ug': '本科专业',
-        'target': '招录对象',
-        'notes': '备注',
-        'intro': '职位简介',
-        'applicants': '报名人数',
-        'passed': '审核通过人数',
-        'competition_ratio': '竞争比'
-    })
+    records, total, actual_date, _ = query_positions(date=date, limit=limit)
     return {
-        "data": result_df.fillna("").to_dict(orient='records'),
+        "data": records,
         "date": actual_date
     }
 
 
 @app.get("/stats/cold-positions")
-async def get_cold_positions(limit: int = 10, date: Optional[str] = None):
+@offload()
+def get_cold_positions(limit: int = 10, date: Optional[str] = None):
     """从数据库获取冷门岗位 (报名人数最少)"""
-    # 这里直接复用 get_positions_with_stats 但需要反向排序，简单起见直接用 SQL 或者重新封装一个
-    # 为了演示，我们重新封装一个 sql
-    conn = get_db_connection()
-    if not date:
-        cursor = conn.cursor()
-        cursor.execute("SELECT MAX(date) FROM applications")
-        date = cursor.fetchone()[0]
-    
-    query = """
-    SELECT p.*, 
-           COALESCE(a.applicants, 0) as applicants,
-           ROUND(CAST(COALESCE(a.applicants, 0) AS FLOAT) / CASE WHEN p.quota = 0 THEN 1 ELSE p.quota END, 1) as competition_ratio
-    FROM positions p
-    LEFT JOIN applications a ON p.code = a.code AND a.date = ?
-    ORDER BY applicants ASC, p.quota DESC
-    LIMIT ?
-    """
-    df = pd.read_sql_query(query, conn, params=[date, limit])
-    conn.close()
-    
-    result_df = df.rename(columns={
-        'code': '职位代码',
-        'name': '职位名称',
-        'org': '招录机关',
-        'unit': '用人单位',
-        'quota': '招录人数',
-        'city': '城市',
-        'education': '学历',
-        'degree': '学位',
-        'major_pg': '研究生专业',
-        'major_ug': '本科专业',
-        'target': '招录对象',
-        'notes': '备注',
-        'intro': '职位简介',
-        'applicants': '报名人数',
-        'passed': '审核通过人数',
-        'competition_ratio': '竞争比'
-    })
+    records, date = get_snapshot().cold_positions(date=date, limit=limit)
     return {
-        "data": result_df.fillna("").to_dict(orient='records'),
+        "data": records,
         "date": date
     }
 
 
 @app.get("/stats/summary")
-async def get_summary(date: Optional[str] = None):
+@offload()
+def get_summary(date: Optional[str] = None):
     """获取总体统计摘要"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 基本职位信息
-    cursor.execute("SELECT COUNT(*), SUM(quota) FROM positions")
-    total_pos, total_quota = cursor.fetchone()
+    with db_connection() as conn:
+        cursor = conn.cursor()
     
-    # 城市列表
-    cursor.execute("SELECT DISTINCT city FROM positions WHERE city != '未知' ORDER BY city")
-    cities = [row[0] for row in cursor.fetchall()]
+        # 确定日期 (rollup_date 每个报名日期一行)
+        if not date:
+            cursor.execute("SELECT MAX(date) FROM rollup_date")
+            date = cursor.fetchone()[0]
     
-    # 学历列表
-    cursor.execute("SELECT DISTINCT education FROM positions WHERE education != ''")
-    educations = [row[0] for row in cursor.fetchall()]
+        # 职位数、招录人数与当日报名总人数: 入库时维护的每日汇总
+        cursor.execute("SELECT positions, quota, applicants, passed FROM rollup_date WHERE date = ?", (date,))
+        row = cursor.fetchone()
+        if row:
+            total_pos, total_quota, total_applicants, total_passed = row
+        else:
+            cursor.execute("SELECT COUNT(*), SUM(quota) FROM positions")
+            total_pos, total_quota = cursor.fetchone()
+            total_applicants = total_passed = None
     
-    # 确定日期
-    if not date:
-        cursor.execute("SELECT MAX(date) FROM applications")
-        date = cursor.fetchone()[0]
+        # 城市列表
+        cursor.execute("SELECT DISTINCT city FROM positions WHERE city != '未知' ORDER BY city")
+        cities = [row[0] for row in cursor.fetchall()]
     
-    # 获取该日期的总人数
-    cursor.execute("SELECT SUM(applicants), SUM(passed) FROM applications WHERE date = ?", (date,))
-    total_applicants, total_passed = cursor.fetchone()
+        # 学历列表
+        cursor.execute("SELECT DISTINCT education FROM positions WHERE education != ''")
+        educations = [row[0] for row in cursor.fetchall()]
     
-    # 获取所有日期列表
-    cursor.execute("SELECT DISTINCT date FROM applications ORDER BY date")
-    daily_files = [row[0] for row in cursor.fetchall()]
+        # 获取所有日期列表
+        cursor.execute("SELECT date FROM rollup_date ORDER BY date")
+        daily_files = [row[0] for row in cursor.fetchall()]
     
-    conn.close()
     
     return {
         "has_positions": total_pos > 0,
@@ -770,7 +687,8 @@ async def get_summary(date: Optional[str] = None):
 
 
 @app.get("/filters")
-async def get_filters():
+@offload()
+def get_filters():
     """获取可用的筛选条件"""
     # 优先使用 CITY_DISTRICT_MAP 中的标准城市列表
     cities = ["省直"] + sorted(list(CITY_DISTRICT_MAP.keys()))
@@ -781,22 +699,21 @@ async def get_filters():
     targets = []
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db_connection() as conn:
+            cursor = conn.cursor()
         
-        # 获取所有学历
-        cursor.execute("SELECT DISTINCT education FROM positions WHERE education != '' AND education IS NOT NULL")
-        education = sorted([row[0] for row in cursor.fetchall()])
+            # 获取所有学历
+            cursor.execute("SELECT DISTINCT education FROM positions WHERE education != '' AND education IS NOT NULL")
+            education = sorted([row[0] for row in cursor.fetchall()])
         
-        # 获取所有学位
-        cursor.execute("SELECT DISTINCT degree FROM positions WHERE degree != '' AND degree IS NOT NULL")
-        degree = sorted([row[0] for row in cursor.fetchall()])
+            # 获取所有学位
+            cursor.execute("SELECT DISTINCT degree FROM positions WHERE degree != '' AND degree IS NOT NULL")
+            degree = sorted([row[0] for row in cursor.fetchall()])
 
-        # 获取所有招录对象
-        cursor.execute("SELECT DISTINCT target FROM positions WHERE target != '' AND target IS NOT NULL")
-        targets = sorted([row[0] for row in cursor.fetchall()])
+            # 获取所有招录对象
+            cursor.execute("SELECT DISTINCT target FROM positions WHERE target != '' AND target IS NOT NULL")
+            targets = sorted([row[0] for row in cursor.fetchall()])
         
-        conn.close()
     except Exception as e:
         print(f"Error fetching filters from DB: {e}")
         # 保底方案：如果数据库有问题且 Excel 存在，从 Excel 读取
@@ -818,39 +735,19 @@ async def get_filters():
 
 
 @app.get("/stats/momentum")
-async def get_momentum():
+@offload()
+def get_momentum():
     """计算今日态势数据 - 需要至少两天的报名数据"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 获取最近两天的日期
-    cursor.execute("SELECT DISTINCT date FROM applications ORDER BY date DESC LIMIT 2")
-    dates = [row[0] for row in cursor.fetchall()]
-    
-    if len(dates) < 2:
-        conn.close()
+    # 最近两天的报名数据直接取自内存快照
+    momentum = get_snapshot().momentum()
+    if momentum is None:
         return {
             "surge": {"count": 0, "ids": []},
             "accelerating": {"count": 0, "ids": []},
             "cooling": {"count": 0, "ids": []},
             "message": "需要至少两天的数据才能计算态势"
         }
-    
-    today, yesterday = dates[0], dates[1]
-    
-    # 获取今天和昨天的报名数据
-    query = """
-    SELECT 
-        t.code,
-        t.applicants as today_app,
-        COALESCE(y.applicants, 0) as yesterday_app,
-        (t.applicants - COALESCE(y.applicants, 0)) as growth
-    FROM applications t
-    LEFT JOIN applications y ON t.code = y.code AND y.date = ?
-    WHERE t.date = ?
-    """
-    df = pd.read_sql_query(query, conn, params=[yesterday, today])
-    conn.close()
+    df, today, yesterday = momentum
     
     SURGE_THRESHOLD = 50
     
@@ -867,6 +764,18 @@ async def get_momentum():
     }
 
 
+@app.get("/stats/db-pool")
+async def get_db_pool_stats():
+    """数据库连接池使用情况"""
+    return get_pool_stats()
+
+
+@app.get("/stats/cache")
+async def get_response_cache_stats():
+    """响应缓存命中/未命中/淘汰计数"""
+    return get_cache_stats()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True)
@@ -1,7 +1,7 @@
-import pandas as pd
 import os
 from main import standardize_position_df, standardize_daily_df
-from database import init_db, save_positions, save_applications
+from database import init_db, save_positions, save_applications, close_pool
+from sheet_cache import load_standardized
 
 DATA_DIR = "data"
 POSITION_FILE = os.path.join(DATA_DIR, "positions.xlsx")
@@ -13,8 +13,7 @@ def run_import():
     # 1. Import positions
     if os.path.exists(POSITION_FILE):
         print(f"Importing positions from {POSITION_FILE}...")
-        df = pd.read_excel(POSITION_FILE, dtype=str)
-        std_df = standardize_position_df(df)
+        std_df = load_standardized(POSITION_FILE, standardize_position_df)
         save_positions(std_df)
         print("Positions imported.")
     
@@ -24,10 +23,12 @@ def run_import():
         for f in sorted(files):
             report_date = f.replace('.xlsx', '')
             print(f"Importing daily data for {report_date}...")
-            df = pd.read_excel(os.path.join(DAILY_DIR, f), dtype=str)
-            std_df = standardize_daily_df(df)
+            std_df = load_standardized(os.path.join(DAILY_DIR, f), standardize_daily_df)
             save_applications(std_df, report_date)
             print(f"Daily data for {report_date} imported.")
 
 if __name__ == "__main__":
-    run_import()
+    try:
+        run_import()
+    finally:
+        close_pool()
@@ -0,0 +1,208 @@
+"""
+City / district normalization for position rows, compiled once from CITY_DISTRICT_MAP.
+
+main.normalize_city_and_district used to test every city and district name (full and
+shortened forms) against org, city and district with nested `in` loops, per row. Here
+all those keywords go into one Aho-Corasick automaton: each field is scanned once to
+get the set of keywords it contains, and the original rules are replayed as lookups
+in precomputed priority tables, so the first match in the old loop order still wins.
+Results are memoized per (org, city, district), and normalize_many() factorizes whole
+columns so each distinct triple is matched once.
+
+check_region_match.py compares the output with the original loop implementation.
+"""
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Memoized (org, city, district) triples kept before the memo is reset
+MEMO_MAX = 100000
+# Joins the three fields into one key for factorizing a column (not in real text)
+SEP = "\x1f"
+
+PROVINCIAL = ("省直", "其他")
+CITY_LEVEL = ("武汉市", "市直")
+
+# Last-resort keywords in the original order: (keyword, also searched in city, result)
+FALLBACKS = [
+    ("武汉", True, ("武汉市", "市直")),
+    ("黄石", False, ("黄石市", "其他")),
+    ("十堰", False, ("十堰市", "其他")),
+    ("宜昌", False, ("宜昌市", "其他")),
+    ("襄阳", False, ("襄阳市", "其他")),
+    ("荆门", False, ("荆门市", "其他")),
+    ("荆州", False, ("荆州市", "其他")),
+    ("黄冈", False, ("黄冈市", "其他")),
+    ("孝感", False, ("孝感市", "其他")),
+    ("咸宁", False, ("咸宁市", "其他")),
+    ("随州", False, ("随州市", "其他")),
+    ("恩施", False, ("恩施土家族苗族自治州", "其他")),
+    ("仙桃", True, ("仙桃市", "仙桃")),
+    ("潜江", True, ("潜江市", "潜江")),
+    ("天门", True, ("天门市", "天门")),
+    ("神农架", True, ("神农架林区", "神农架")),
+]
+
+
+class AhoCorasick:
+    """Multi-pattern substring matcher: find_all(text) is the set of patterns in text"""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [set()]
+        for pattern in patterns:
+            if pattern:
+                self._add(pattern)
+        self._link()
+
+    def _add(self, pattern):
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(set())
+            state = nxt
+        self._out[state].add(pattern)
+
+    def _link(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] |= self._out[self._fail[nxt]]
+
+    def find_all(self, text):
+        found = set()
+        state = 0
+        goto, fail, out = self._goto, self._fail, self._out
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found |= out[state]
+        return found
+
+
+def _short_city(name):
+    return name.replace("市", "").replace("州", "").replace("林区", "")
+
+
+def _short_district(name):
+    return name.replace("区", "").replace("县", "").replace("市", "")
+
+
+def _as_text(value):
+    return str(value) if not pd.isna(value) else ""
+
+
+def _text_array(values):
+    """Column version of _as_text: object array of str, missing -> "" """
+    values = pd.Series(values, dtype=object)
+    return values.where(values.notna(), "").astype(str).to_numpy(dtype=object)
+
+
+class RegionNormalizer:
+    """normalize(org, city, district) -> (city, district), same rules as the original loops"""
+
+    def __init__(self, city_district_map):
+        self.cities = city_district_map
+        # Rule 3: (shortened city name, city) in map order
+        self.short_cities = [(_short_city(city), city) for city in city_district_map]
+        # Rule 4: keyword -> first (city index, district index, full=0/short=1) it decides
+        self.district_rank = {}
+        for ci, (city, districts) in enumerate(city_district_map.items()):
+            for di, district in enumerate(districts):
+                forms = [(district, 0)]
+                short = _short_district(district)
+                if len(short) >= 2:
+                    forms.append((short, 1))
+                for keyword, kind in forms:
+                    rank = (ci, di, kind, city, district)
+                    if keyword not in self.district_rank or rank < self.district_rank[keyword]:
+                        self.district_rank[keyword] = rank
+
+        keywords = {short for short, _ in self.short_cities}
+        keywords.update(d for districts in city_district_map.values() for d in districts)
+        keywords.update(self.district_rank)
+        keywords.update(word for word, _, _ in FALLBACKS)
+        self.matcher = AhoCorasick(sorted(keywords))
+        self._memo = {}
+
+    def normalize(self, org_name, raw_city=None, raw_district=None):
+        return self._lookup(_as_text(org_name), _as_text(raw_city), _as_text(raw_district))
+
+    def normalize_many(self, orgs, cities, districts):
+        """Normalize aligned columns with one lookup per distinct triple; returns (cities, districts) categoricals"""
+        columns = [_text_array(values) for values in (orgs, cities, districts)]
+        if not len(columns[0]):
+            return pd.Categorical(columns[1]), pd.Categorical(columns[2])
+        codes, uniques = pd.factorize(columns[0] + SEP + columns[1] + SEP + columns[2])
+        _, first = np.unique(codes, return_index=True)
+        results = [self._lookup(*triple) for triple in zip(*(col[first] for col in columns))]
+        city = pd.Categorical([r[0] for r in results])
+        district = pd.Categorical([r[1] for r in results])
+        return (pd.Categorical.from_codes(city.codes[codes], city.categories),
+                pd.Categorical.from_codes(district.codes[codes], district.categories))
+
+    def _lookup(self, org, city, district):
+        key = (org, city, district)
+        result = self._memo.get(key)
+        if result is None:
+            if len(self._memo) >= MEMO_MAX:
+                self._memo.clear()
+            result = self._memo[key] = self._normalize(org, city, district)
+        return result
+
+    def _normalize(self, org, city, district):
+        # 1. 省直
+        if "省" in org[:4] or city == "省直":
+            return PROVINCIAL
+
+        in_org = self.matcher.find_all(org)
+
+        # 2. 城市已是标准市名: 区县为空时从机关名提取
+        if city in self.cities:
+            if not district or district == "其他":
+                district = next((d for d in self.cities[city] if d in in_org), district)
+            return city, district or "其他"
+
+        in_city = self.matcher.find_all(city)
+        in_district = self.matcher.find_all(district)
+        anywhere = in_org | in_city | in_district
+
+        # 3. org 或 city 中含市名
+        for short, main_city in self.short_cities:
+            if short in in_city or short in in_org:
+                for d in self.cities[main_city]:
+                    if d in anywhere:
+                        return main_city, d
+                return main_city, district or "其他"
+
+        # 4. 反向搜索区县关键词 (全名优先于去后缀)
+        ranks = [self.district_rank[k] for k in anywhere if k in self.district_rank]
+        if ranks:
+            _, _, _, main_city, d = min(ranks)
+            return main_city, d
+
+        # 5. 以"市"开头的机关 (通常是武汉市直)
+        if org.startswith("市") or city.startswith("市"):
+            return CITY_LEVEL
+
+        # 6. 保底模糊识别
+        for word, check_city, result in FALLBACKS:
+            if word in in_org or (check_city and word in in_city):
+                return result
+
+        return city or "未知", district or "其他"
@@ -0,0 +1,229 @@
+"""
+Response cache for the read-only GET endpoints.
+
+The data only changes when an upload or a crawler run writes to SQLite, and every
+write bumps meta.data_version. Rendered response bodies are therefore cached under
+(route, normalized query params, data version) in a size-bounded LRU, and served
+with a strong ETag (a hash of the body) so browsers can revalidate with a 304.
+Bodies are compressed per Accept-Encoding, and each compressed variant is kept in
+the entry so it is reused by later requests (compression.py).
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl
+
+from starlette.responses import Response
+
+from async_db import QueryTimeout, run_db
+from compression import COMPRESS_MIN_BYTES, compress, negotiate
+from database import db_connection, get_data_version
+
+CACHE_MAX_ENTRIES = 1024
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Seconds a looked-up data version is trusted, so cache hits skip the DB pool.
+# Writes from this process call forget_data_version(); other writers (crawler.py)
+# become visible within this window.
+VERSION_TTL = 1.0
+
+# Live counters must never be served from the cache
+UNCACHED_PATHS = {"/stats/db-pool", "/stats/cache"}
+UNCACHED_PREFIXES = ("/jobs/",)
+
+
+def _entry_size(entry):
+    body, _, _, variants = entry
+    return len(body) + sum(len(data) for data in variants.values())
+
+
+class ResponseCache:
+    """LRU of rendered bodies (plus their compressed variants) bounded by entry
+    count and total bytes. Entries are (body, etag, media_type, {encoding: body})."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+        self.compressed = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, entry):
+        size = _entry_size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= _entry_size(old)
+            self._entries[key] = entry
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _entry_size(evicted)
+            self.evictions += 1
+
+    def variant(self, key, entry, encoding):
+        """Body of entry compressed with encoding, compressed at most once per entry"""
+        variants = entry[3]
+        data = variants.get(encoding)
+        if data is not None:
+            return data
+        data = compress(entry[0], encoding)
+        with self._lock:
+            if encoding not in variants:
+                variants[encoding] = data
+                if self._entries.get(key) is entry:
+                    self._bytes += len(data)
+                    self._evict()
+            self.compressed += 1
+        return variants[encoding]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "not_modified": self.not_modified,
+                "compressed": self.compressed,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_cache = ResponseCache()
+
+
+def get_cache_stats():
+    return _cache.stats()
+
+
+def cache_key(path, query_string, version):
+    """Query params are sorted and blank values dropped, which FastAPI treats as absent"""
+    params = tuple(sorted(parse_qsl(query_string, keep_blank_values=False)))
+    return (path, params, version)
+
+
+def make_etag(body):
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+
+def _respond(request, key, entry):
+    body, etag, media_type, _ = entry
+    headers = {"Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    encoding = negotiate(request.headers.get("accept-encoding")) if len(body) >= COMPRESS_MIN_BYTES else None
+    if encoding is not None:
+        # Each representation needs its own strong validator
+        etag = f'{etag[:-1]}-{encoding}"'
+        headers["Content-Encoding"] = encoding
+    headers["ETag"] = etag
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        with _cache._lock:
+            _cache.not_modified += 1
+        headers.pop("Content-Encoding", None)
+        return Response(status_code=304, headers=headers)
+    if encoding is not None:
+        body = _cache.variant(key, entry, encoding)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+
+async def _compress_passthrough(request, response):
+    """Compress an uncached response (POST bodies, live counters) when the client
+    accepts it; it is not reused, so the cheap levels from compression.py apply."""
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding is None or response.status_code != 200 or "content-encoding" in response.headers:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    headers = {k: v for k, v in response.headers.items() if k not in ("content-length", "content-type")}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body = compress(body, encoding)
+        headers["Content-Encoding"] = encoding
+        headers["Vary"] = "Accept-Encoding"
+    return Response(content=body, status_code=response.status_code, headers=headers,
+                    media_type=response.headers.get("content-type"))
+
+
+_version = [None, 0.0]  # [data version, monotonic time it was read]
+
+
+def _read_data_version():
+    with db_connection() as conn:
+        return get_data_version(conn)
+
+
+async def current_data_version():
+    value, checked = _version
+    if value is None or time.monotonic() - checked > VERSION_TTL:
+        value = await run_db(_read_data_version, lane="meta")
+        _version[:] = [value, time.monotonic()]
+    return value
+
+
+def forget_data_version():
+    """Call after writing to the database so the next request re-reads the version"""
+    _version[:] = [None, 0.0]
+
+
+async def response_cache_middleware(request, call_next):
+    """HTTP middleware: serve GETs from the cache, fill it on 200 responses, and
+    compress bodies per Accept-Encoding"""
+    path = request.url.path
+    if request.method != "GET" or path in UNCACHED_PATHS or path.startswith(UNCACHED_PREFIXES):
+        return await _compress_passthrough(request, await call_next(request))
+
+    try:
+        version = await current_data_version()
+    except QueryTimeout:
+        return await _compress_passthrough(request, await call_next(request))
+    key = cache_key(path, request.url.query, version)
+
+    entry = _cache.get(key)
+    if entry is not None:
+        return _respond(request, key, entry)
+
+    response = await call_next(request)
+    if response.status_code != 200:
+        return response
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    etag = make_etag(body)
+    media_type = response.headers.get("content-type", "application/json")
+    entry = (body, etag, media_type, {})
+    _cache.put(key, entry)
+    return _respond(request, key, entry)
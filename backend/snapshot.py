@@ -0,0 +1,244 @@
+"""
+In-memory columnar snapshot of positions x applications for the read endpoints.
+
+Position attributes are held as NumPy arrays (categoricals for the low-cardinality
+filter columns) and applicants / passed as dense codes x dates int32 matrices.
+The snapshot is rebuilt from SQLite whenever the data version changes and swapped
+in atomically, so filtering, sorting, top-K and aggregation never touch the database.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+
+from database import (
+    POSITION_FIELDS, db_connection, get_data_version, get_positions_with_stats,
+    get_trend_cube, decode_cursor, encode_cursor, InvalidCursor,
+)
+
+POSITION_COLUMNS = ['code', 'name', 'org', 'unit', 'quota', 'city', 'district', 'education',
+                    'degree', 'major_pg', 'major_ug', 'target', 'notes', 'intro']
+CATEGORY_COLUMNS = ['city', 'district', 'education', 'target']
+
+
+def _sqlite_round1(values):
+    """ROUND(x, 1) as SQLite computes it (half away from zero) for non-negative x"""
+    return np.floor(values * 10 + 0.5) / 10
+
+
+def _top_k(keys, k):
+    """Indices of the k smallest keys, in ascending key order (keys are unique)"""
+    if k < len(keys):
+        part = np.argpartition(keys, k)[:k]
+        return part[np.argsort(keys[part], kind='stable')]
+    return np.argsort(keys, kind='stable')
+
+
+class Snapshot:
+    def __init__(self, version, positions, applications, trend_cube=None):
+        self.version = version
+        # City x district x date totals (database.get_trend_cube), shared with the static export
+        self.trend_cube = trend_cube
+
+        # One row per code seen in either table, sorted by code, so that row order
+        # doubles as the code tie-break of every ORDER BY.
+        self.codes = np.union1d(
+            positions['code'].dropna().to_numpy(dtype=object),
+            applications['code'].dropna().unique().astype(object),
+        )
+        self.index = pd.Index(self.codes)
+        n = len(self.codes)
+
+        rows = self.index.get_indexer(positions['code'])
+        self.is_position = np.zeros(n, dtype=bool)
+        self.is_position[rows] = True
+
+        self.columns = {}
+        for col in POSITION_COLUMNS[1:]:
+            if col == 'quota':
+                quota = np.zeros(n, dtype=np.int32)
+                quota[rows] = pd.to_numeric(positions['quota'], errors='coerce').fillna(0).to_numpy(dtype=np.int32)
+                self.columns[col] = quota
+                continue
+            values = np.full(n, None, dtype=object)
+            values[rows] = positions[col].astype(object).where(positions[col].notna(), None).to_numpy()
+            self.columns[col] = pd.Categorical(values) if col in CATEGORY_COLUMNS else values
+
+        self.dates = sorted(applications['date'].dropna().unique().tolist())
+        shape = (n, len(self.dates))
+        self.applicants = np.zeros(shape, dtype=np.int32)
+        self.passed = np.zeros(shape, dtype=np.int32)
+        self.present = np.zeros(shape, dtype=bool)
+        if len(applications):
+            app = applications.dropna(subset=['code', 'date'])
+            r = self.index.get_indexer(app['code'])
+            c = np.searchsorted(self.dates, app['date'].to_numpy())
+            self.applicants[r, c] = app['applicants'].fillna(0).to_numpy(dtype=np.int32)
+            self.passed[r, c] = app['passed'].fillna(0).to_numpy(dtype=np.int32)
+            self.present[r, c] = True
+
+    @classmethod
+    def load(cls, conn):
+        # One read transaction so the version and both tables agree
+        conn.execute("BEGIN")
+        try:
+            version = get_data_version(conn)
+            positions = pd.read_sql_query(f"SELECT {', '.join(POSITION_COLUMNS)} FROM positions", conn)
+            applications = pd.read_sql_query("SELECT code, date, applicants, passed FROM applications", conn)
+            trend_cube = get_trend_cube(conn)
+        finally:
+            conn.rollback()
+        return cls(version, positions, applications, trend_cube)
+
+    # --- helpers ---
+
+    def latest_date(self):
+        return self.dates[-1] if self.dates else None
+
+    def _day(self, date):
+        """(applicants, passed) vectors for a date; all zeros for unknown dates, like the LEFT JOIN"""
+        if date in self.dates:
+            col = self.dates.index(date)
+            return self.applicants[:, col], self.passed[:, col]
+        zeros = np.zeros(len(self.codes), dtype=np.int32)
+        return zeros, zeros
+
+    def _like(self, col, pattern):
+        """Row mask for `col LIKE '%pattern%'` evaluated once per category"""
+        cat = self.columns[col]
+        needle = pattern.lower()
+        hits = [i for i, value in enumerate(cat.categories) if needle in str(value).lower()]
+        return np.isin(cat.codes, hits)
+
+    def _equals(self, col, value):
+        cat = self.columns[col]
+        if value not in cat.categories:
+            return np.zeros(len(self.codes), dtype=bool)
+        return cat.codes == cat.categories.get_loc(value)
+
+    def _values(self, col, rows):
+        values = self.columns[col]
+        if col not in CATEGORY_COLUMNS:
+            return values[rows]
+        codes = values.codes[rows]
+        out = np.full(len(rows), None, dtype=object)
+        known = codes >= 0
+        out[known] = values.categories.to_numpy(dtype=object)[codes[known]]
+        return out
+
+    def _records(self, rows, applicants, passed, with_passed=True):
+        """Rows as API records, same keys and values as database.record_select()"""
+        columns = {}
+        for col, key in POSITION_FIELDS:
+            values = self.codes[rows] if col == 'code' else self._values(col, rows)
+            columns[key] = ['' if v is None else v for v in values.tolist()]
+        quota = self.columns['quota'][rows]
+        columns['报名人数'] = applicants[rows].tolist()
+        if with_passed:
+            columns['审核通过人数'] = passed[rows].tolist()
+        columns['竞争比'] = _sqlite_round1(applicants[rows] / np.where(quota == 0, 1, quota)).tolist()
+        keys = list(columns)
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
+
+    # --- queries ---
+
+    def positions(self, date=None, city=None, education=None, target=None, district=None,
+                  limit=1000, offset=0, after=None):
+        """Same contract as database.get_positions_with_stats (without keyword)"""
+        date = date or self.latest_date()
+        applicants, passed = self._day(date)
+
+        mask = self.is_position.copy()
+        if city:
+            mask &= self._like('city', city)
+        if district:
+            mask &= self._equals('district', district)
+        if education:
+            mask &= self._like('education', education)
+        if target:
+            mask &= self._like('target', target)
+        rows = np.flatnonzero(mask)
+        total = len(rows)
+
+        # ORDER BY applicants DESC, code ASC as one unique integer key per row
+        keys = -applicants[rows].astype(np.int64) * len(self.codes) + rows
+        if after:
+            last_applicants, last_code = decode_cursor(after, 2)
+            if not isinstance(last_applicants, int) or isinstance(last_applicants, bool):
+                raise InvalidCursor("Invalid pagination cursor")
+            last_row = self.index.searchsorted(str(last_code), side='right')
+            later = (applicants[rows] < last_applicants) | ((applicants[rows] == last_applicants) & (rows >= last_row))
+            rows, keys = rows[later], keys[later]
+            offset = 0
+        page = rows[_top_k(keys, offset + limit)[offset:]]
+
+        records = self._records(page, applicants, passed)
+        next_after = None
+        if len(records) == limit and (after or offset + limit < total):
+            next_after = encode_cursor([records[-1]['报名人数'], records[-1]['职位代码']])
+        return records, total, date, next_after
+
+    def cold_positions(self, date=None, limit=10):
+        """ORDER BY applicants ASC, quota DESC LIMIT ? (code breaks remaining ties)"""
+        date = date or self.latest_date()
+        applicants, passed = self._day(date)
+        rows = np.flatnonzero(self.is_position)
+        order = np.lexsort((rows, -self.columns['quota'][rows], applicants[rows]))[:limit]
+        return self._records(rows[order], applicants, passed, with_passed=False), date
+
+    def momentum(self):
+        """Latest vs previous date for every code reported on the latest date, or None"""
+        if len(self.dates) < 2:
+            return None
+        rows = np.flatnonzero(self.present[:, -1])
+        today = self.applicants[rows, -1].astype(np.int64)
+        yesterday = self.applicants[rows, -2].astype(np.int64)
+        df = pd.DataFrame({
+            'code': self.codes[rows],
+            'today_app': today,
+            'yesterday_app': yesterday,
+            'growth': today - yesterday,
+        })
+        return df, self.dates[-1], self.dates[-2]
+
+
+_current = None
+_reload_lock = threading.Lock()
+
+
+def _reload():
+    global _current
+    with db_connection() as conn:
+        _current = Snapshot.load(conn)
+    return _current
+
+
+def refresh_snapshot():
+    """Rebuild the snapshot from SQLite and swap it in"""
+    with _reload_lock:
+        return _reload()
+
+
+def get_snapshot():
+    """Current snapshot, reloaded first if the data version moved (uploads, crawler runs)"""
+    snapshot = _current
+    with db_connection() as conn:
+        version = get_data_version(conn)
+    if snapshot is not None and snapshot.version == version:
+        return snapshot
+    with _reload_lock:
+        snapshot = _current
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        return _reload()
+
+
+def query_positions(date=None, city=None, education=None, target=None, keyword=None, district=None,
+                    limit=1000, offset=0, after=None):
+    """Position listing; keyword searches go to the FTS index, everything else to the snapshot"""
+    if keyword:
+        return get_positions_with_stats(date=date, city=city, education=education, target=target,
+                                        keyword=keyword, district=district, limit=limit,
+                                        offset=offset, after=after)
+    return get_snapshot().positions(date=date, city=city, education=education, target=target,
+                                    district=district, limit=limit, offset=offset, after=after)
@@ -1,6 +1,8 @@
 import axios, { AxiosInstance, AxiosResponse } from 'axios'
 import { DATA_KEYS } from './constants'
 import type { Position, FilterParams, PaginatedResult, RegionStats, Summary, FilterOptions, DistrictStats } from './types'
+import { loadStaticPositionsFile } from './utils/staticPositions'
+import { loadStaticTrendsFor } from './utils/staticTrends'
 
 // --- 配置区域 ---
 // 如果部署到 GitHub Pages (build 模式)，则为 true；本地开发 (dev 模式) 为 false
@@ -82,11 +84,6 @@ interface TrendByCodesResponse {
     dates: string[]
 }
 
-interface TrendsGranularData {
-    dates: string[]
-    trends: Record<string, number[]>
-}
-
 interface CodeListCache {
     key: string | null
     data: Position[] | null
@@ -95,7 +92,6 @@ interface CodeListCache {
 
 // --- 静态模式辅助函数 ---
 const positionsPromiseCache: Record<string, Promise<Position[]> | undefined> = {}
-let trendPromise: Promise<TrendsGranularData> | null = null
 
 export const loadStaticPositions = (date: string | null = null): Promise<Position[]> => {
     // If no date specified, use '' as key for default/latest
@@ -108,8 +104,7 @@ export const loadStaticPositions = (date: string | null = null): Promise<Positio
         try {
             // Load date-specific file if date provided, else load default
             const filename = date ? `positions_${date}.json` : 'positions.json'
-            const res = await axios.get<PositionsResponse>(`${import.meta.env.BASE_URL}data/${filename}?t=${new Date().getTime()}`)
-            return res.data.data
+            return await loadStaticPositionsFile(filename)
         } catch (e) {
             console.error("Failed to load static positions", e)
             // Fallback to default if date-specific file doesn't exist
@@ -117,10 +112,7 @@ export const loadStaticPositions = (date: string | null = null): Promise<Positio
                 // Check if default is already loading/loaded
                 if (!positionsPromiseCache['']) {
                     // Initiate default load if not available
-                    positionsPromiseCache[''] = (async () => {
-                        const res = await axios.get<PositionsResponse>(`${import.meta.env.BASE_URL}data/positions.json?t=${new Date().getTime()}`)
-                        return res.data.data
-                    })()
+                    positionsPromiseCache[''] = loadStaticPositionsFile('positions.json')
                 }
                 return positionsPromiseCache['']
             }
@@ -132,22 +124,6 @@ export const loadStaticPositions = (date: string | null = null): Promise<Positio
     return promise
 }
 
-const loadStaticTrends = (): Promise<TrendsGranularData> => {
-    if (trendPromise) return trendPromise
-
-    trendPromise = (async (): Promise<TrendsGranularData> => {
-        try {
-            const res = await axios.get<TrendsGranularData>(`${import.meta.env.BASE_URL}data/trends_granular.json?t=${new Date().getTime()}`)
-            return res.data
-        } catch (e) {
-            console.error("Failed to load static trends", e)
-            return { dates: [], trends: {} }
-        }
-    })()
-
-    return trendPromise
-}
-
 // Helper for safe string comparison
 const safeStr = (val: unknown): string => String(val || '').toLowerCase()
 
@@ -533,7 +509,7 @@ export const getPositionsByCodes = async (codes: string[]): Promise<PositionsByC
 export const getTrendByCodes = async (codes: string[]): Promise<TrendByCodesResponse> => {
     if (USE_STATIC_DATA) {
         const uniqueCodes = [...new Set(codes)]
-        const trendData = await loadStaticTrends()
+        const trendData = await loadStaticTrendsFor(uniqueCodes)
         const allPositions = await loadStaticPositions()
 
         const dates = trendData.dates || []
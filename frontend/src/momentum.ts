@@ -3,6 +3,7 @@
 import axios from 'axios'
 import { DATA_KEYS } from './constants'
 import type { Position } from './types'
+import { loadStaticPositionsFile } from './utils/staticPositions'
 
 const USE_STATIC_DATA = import.meta.env.PROD
 const API_BASE_URL = 'http://localhost:8000'
@@ -73,26 +74,14 @@ export const getDailyMomentum = async (
                 return { ...EMPTY_MOMENTUM }
             }
 
-            let todayUrl = import.meta.env.BASE_URL + 
-                (currentTodayDate ? `data/positions_${currentTodayDate}.json` : 'data/positions.json')
-            let yesterdayUrl = import.meta.env.BASE_URL + `data/positions_${actualYesterday}.json`
+            const todayFile = currentTodayDate ? `positions_${currentTodayDate}.json` : 'positions.json'
+            const yesterdayFile = `positions_${actualYesterday}.json`
 
-            // Add cache buster
-            todayUrl += `?t=${new Date().getTime()}`
-            yesterdayUrl += `?t=${new Date().getTime()}`
-
-            interface PositionsResponse {
-                data: Position[]
-            }
-
-            const [todayRes, yesterdayRes] = await Promise.all([
-                axios.get<PositionsResponse>(todayUrl),
-                axios.get<PositionsResponse>(yesterdayUrl)
+            const [todayPositions, yesterdayPositions] = await Promise.all([
+                loadStaticPositionsFile(todayFile),
+                loadStaticPositionsFile(yesterdayFile)
             ])
 
-            const todayPositions = todayRes.data.data
-            const yesterdayPositions = yesterdayRes.data.data
-
             const yesterdayMap = new Map<string, number>()
             yesterdayPositions.forEach(p => {
                 const code = p[DATA_KEYS.CODE as keyof Position] as string
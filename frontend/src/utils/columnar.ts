@@ -0,0 +1,36 @@
+import type { Position } from '../types'
+
+/** 字典编码列: 去重值表 + 每行下标 */
+export interface DictionaryColumn {
+    dictionary: Array<string | number>
+    indices: number[]
+}
+
+/** 列式表 (backend/columnar.py 生成): 列名只出现一次, 每列一个数组 */
+export interface ColumnarTable {
+    columns: string[]
+    length: number
+    values: Array<Array<string | number> | DictionaryColumn>
+}
+
+export const isColumnarTable = (data: unknown): data is ColumnarTable =>
+    !!data && !Array.isArray(data) && Array.isArray((data as ColumnarTable).columns)
+
+/** 还原为行对象数组; 旧格式 (本身就是行数组) 原样返回 */
+export const decodeRows = (data: Position[] | ColumnarTable | null | undefined): Position[] => {
+    if (!data) return []
+    if (!isColumnarTable(data)) return data
+
+    const { columns, length, values } = data
+    const plain = values.map(col => (Array.isArray(col) ? col : null))
+    const rows: Position[] = new Array(length)
+    for (let i = 0; i < length; i++) {
+        const row: Record<string, string | number> = {}
+        for (let c = 0; c < columns.length; c++) {
+            const col = plain[c]
+            row[columns[c]] = col ? col[i] : (values[c] as DictionaryColumn).dictionary[(values[c] as DictionaryColumn).indices[i]]
+        }
+        rows[i] = row as Position
+    }
+    return rows
+}
@@ -0,0 +1,79 @@
+import axios from 'axios'
+import { DATA_KEYS } from '../constants'
+import type { Position } from '../types'
+import { decodeRows, type ColumnarTable } from './columnar'
+
+/** positions_catalog.json (backend/export_static.py): 全部职位的静态字段, 按职位代码排序 */
+interface StaticCatalogFile {
+    data: ColumnarTable
+    catalog: string
+    total: number
+}
+
+/**
+ * positions_<date>.json / positions.json
+ * 新格式: counts 为与目录同序的数值列 (报名人数, 审核通过人数), catalog 为目录版本;
+ * 旧格式: data 为完整职位表 (列式表或行数组)
+ */
+export interface StaticPositionsFile {
+    counts?: ColumnarTable
+    catalog?: string
+    data?: Position[] | ColumnarTable
+    date?: string
+    total?: number
+}
+
+let catalogPromise: Promise<StaticCatalogFile> | null = null
+
+const fetchCatalog = async (): Promise<StaticCatalogFile> => {
+    const res = await axios.get<StaticCatalogFile>(`${import.meta.env.BASE_URL}data/positions_catalog.json?t=${new Date().getTime()}`)
+    return res.data
+}
+
+/** 目录只下载一次; 日期文件的目录版本不一致时 (导出后目录已更新) 重新下载 */
+const loadCatalog = async (key: string): Promise<StaticCatalogFile> => {
+    if (!catalogPromise) catalogPromise = fetchCatalog()
+    let catalog: StaticCatalogFile
+    try {
+        catalog = await catalogPromise
+    } catch (e) {
+        catalogPromise = null
+        throw e
+    }
+    if (catalog.catalog !== key) {
+        catalogPromise = fetchCatalog()
+        catalog = await catalogPromise
+    }
+    return catalog
+}
+
+let catalogRowsCache: { key: string; rows: Position[] } | null = null
+
+/** 静态字段 + 当日数值列 → 完整职位行, 竞争比在此计算 (与导出前一致, 保留一位小数) */
+const joinCounts = (catalog: StaticCatalogFile, counts: ColumnarTable): Position[] => {
+    if (!catalogRowsCache || catalogRowsCache.key !== catalog.catalog) {
+        catalogRowsCache = { key: catalog.catalog, rows: decodeRows(catalog.data) }
+    }
+    const base = catalogRowsCache.rows
+    const dailyRows = decodeRows(counts)
+    return base.map((row, i) => {
+        const merged: Record<string, string | number | undefined> = { ...row, ...dailyRows[i] }
+        const quota = Number(merged[DATA_KEYS.QUOTA]) || 0
+        const applicants = Number(merged[DATA_KEYS.APPLICANTS]) || 0
+        merged[DATA_KEYS.RATIO] = Math.round((applicants / Math.max(quota, 1)) * 10) / 10
+        return merged as Position
+    })
+}
+
+/** 读取一个静态职位文件 (如 positions_2026-01-18.json), 新旧格式均还原为行数组 */
+export const loadStaticPositionsFile = async (filename: string): Promise<Position[]> => {
+    const res = await axios.get<StaticPositionsFile>(`${import.meta.env.BASE_URL}data/${filename}?t=${new Date().getTime()}`)
+    const file = res.data
+    if (!file.counts) return decodeRows(file.data)
+
+    const catalog = await loadCatalog(file.catalog || '')
+    if (catalog.catalog !== file.catalog) {
+        throw new Error(`positions catalog ${catalog.catalog} does not match ${filename} (${file.catalog})`)
+    }
+    return joinCounts(catalog, file.counts)
+}
@@ -0,0 +1,84 @@
+import axios from 'axios'
+
+/** 职位代码 → 每日报名人数 (与 dates 对齐) */
+export interface TrendsGranularData {
+    dates: string[]
+    trends: Record<string, number[]>
+}
+
+/** trends_index.json (backend/export_static.py): 日期列表与分片文件 */
+interface TrendsIndex {
+    dates: string[]
+    hash: string
+    shards: number
+    files: string[]
+}
+
+const dataUrl = (filename: string) => `${import.meta.env.BASE_URL}data/${filename}?t=${new Date().getTime()}`
+
+let indexPromise: Promise<TrendsIndex> | null = null
+const shardPromises: Record<number, Promise<Record<string, number[]>> | undefined> = {}
+
+/** 32 位 FNV-1a (UTF-8 字节) 取模, 与 export_static.trend_shard 一致 */
+export const trendShard = (code: string, shards: number): number => {
+    let h = 0x811c9dc5
+    for (const byte of new TextEncoder().encode(code)) {
+        h = Math.imul(h ^ byte, 0x01000193) >>> 0
+    }
+    return h % shards
+}
+
+/**
+ * Int32 小端: [职位数, 日期数, 代码宽度], 再是按宽度补 0 的 ASCII 代码,
+ * 最后是 职位 × 日期 的报名人数矩阵 (见 export_static.trend_shard_binary)
+ */
+const decodeShardBinary = (buffer: ArrayBuffer): Record<string, number[]> => {
+    const [count, numDates, width] = new Int32Array(buffer, 0, 3)
+    const names = new Uint8Array(buffer, 12, count * width)
+    const values = new Int32Array(buffer, 12 + count * width, count * numDates)
+    const decoder = new TextDecoder()
+    const trends: Record<string, number[]> = {}
+    for (let i = 0; i < count; i++) {
+        const raw = names.subarray(i * width, (i + 1) * width)
+        const end = raw.indexOf(0)
+        const code = decoder.decode(end === -1 ? raw : raw.subarray(0, end))
+        trends[code] = Array.from(values.subarray(i * numDates, (i + 1) * numDates))
+    }
+    return trends
+}
+
+const loadIndex = (): Promise<TrendsIndex> => {
+    if (!indexPromise) {
+        indexPromise = axios.get<TrendsIndex>(dataUrl('trends_index.json')).then(res => res.data)
+        indexPromise.catch(() => { indexPromise = null })
+    }
+    return indexPromise
+}
+
+const loadShard = (index: TrendsIndex, shard: number): Promise<Record<string, number[]>> => {
+    if (!shardPromises[shard]) {
+        const name = index.files[shard]
+        shardPromises[shard] = axios.get<ArrayBuffer>(dataUrl(`${name}.bin`), { responseType: 'arraybuffer' })
+            .then(res => decodeShardBinary(res.data))
+        shardPromises[shard]!.catch(() => { shardPromises[shard] = undefined })
+    }
+    return shardPromises[shard]!
+}
+
+/** 只下载这些职位代码所在的分片, 返回它们的趋势 */
+export const loadStaticTrendsFor = async (codes: string[]): Promise<TrendsGranularData> => {
+    try {
+        const index = await loadIndex()
+        const shards = [...new Set(codes.map(code => trendShard(code, index.shards)))]
+        const loaded = await Promise.all(shards.map(shard => loadShard(index, shard)))
+        const trends: Record<string, number[]> = {}
+        for (const code of codes) {
+            const shard = loaded[shards.indexOf(trendShard(code, index.shards))]
+            if (shard[code]) trends[code] = shard[code]
+        }
+        return { dates: index.dates, trends }
+    } catch (e) {
+        console.error("Failed to load static trends", e)
+        return { dates: [], trends: {} }
+    }
+}